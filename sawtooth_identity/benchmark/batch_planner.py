@@ -0,0 +1,166 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Compares the dependency-aware batch planner against naive sequential
+batching, where every transaction is sent in its own BatchList one request
+at a time (the way IdentityClient._send_identity_txn does it).
+
+Nothing is sent over the network; the benchmark reports build time, the
+number of REST API requests, bytes on the wire and the number of scheduling
+rounds each approach implies.
+
+    python -m sawtooth_identity.benchmark.batch_planner -n 2000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sawtooth_signing import create_context
+
+from sawtooth_identity.identity_batch_planner import IdentityBatchPlanner
+from sawtooth_identity.identity_batch_planner import IdentityOperation
+from sawtooth_identity.identity_client import IdentityClient
+
+
+def create_client(base_url='http://127.0.0.1:8008', read_cache=None,
+                  tracer=None):
+    """Returns an IdentityClient signing with a freshly generated key."""
+    private_key = create_context('secp256k1').new_random_private_key()
+
+    fd, keyfile = tempfile.mkstemp(suffix='.priv')
+    try:
+        with os.fdopen(fd, 'w') as key_fd:
+            key_fd.write(private_key.as_hex())
+        return IdentityClient(
+            base_url=base_url, keyfile=keyfile, read_cache=read_cache,
+            tracer=tracer)
+    finally:
+        os.remove(keyfile)
+
+
+def create_operations(count, repeat_ratio, seed=0):
+    """Returns count create/update operations where roughly repeat_ratio of
+    them touch a name that an earlier operation already touched.
+    """
+    rng = random.Random(seed)
+    names = []
+    operations = []
+
+    for i in range(count):
+        if names and rng.random() < repeat_ratio:
+            name = rng.choice(names)
+            operations.append(
+                IdentityOperation('update', name, '1990-01-01', 'f'))
+        else:
+            name = 'identity-{}'.format(i)
+            names.append(name)
+            operations.append(
+                IdentityOperation('create', name, '1990-01-01', 'm'))
+
+    return operations
+
+
+def run_naive(client, operations):
+    start = time.perf_counter()
+    batch_lists = [
+        client._create_batch_list([
+            client._create_identity_txn(
+                operation.action,
+                operation.name,
+                date_of_birth=operation.date_of_birth,
+                gender=operation.gender)
+        ])
+        for operation in operations
+    ]
+    elapsed = time.perf_counter() - start
+
+    return {
+        'build_seconds': elapsed,
+        'requests': len(batch_lists),
+        'bytes': sum(batch_list.ByteSize() for batch_list in batch_lists),
+        # Each request is sent only after the previous one returns.
+        'rounds': len(batch_lists),
+    }
+
+
+def run_planned(client, operations):
+    planner = IdentityBatchPlanner(client)
+
+    start = time.perf_counter()
+    plan = planner.plan(operations)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'build_seconds': elapsed,
+        'requests': len(plan.batch_lists),
+        'bytes': sum(batch_list.ByteSize() for batch_list in plan.batch_lists),
+        'rounds': plan.max_chain_length,
+    }
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the identity batch planner against naive '
+        'sequential batching.')
+
+    parser.add_argument(
+        '-n', '--count',
+        type=int,
+        default=1000,
+        help='number of operations to plan')
+
+    parser.add_argument(
+        '--repeat-ratio',
+        type=float,
+        default=0.1,
+        help='fraction of operations that touch an already used name')
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed for the generated operations')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    client = create_client()
+    operations = create_operations(opts.count, opts.repeat_ratio, opts.seed)
+
+    print('{:<10} {:>14} {:>10} {:>12} {:>10}'.format(
+        'strategy', 'build (tx/s)', 'requests', 'bytes', 'rounds'))
+    for strategy, run in (('naive', run_naive), ('planned', run_planned)):
+        result = run(client, operations)
+        print('{:<10} {:>14.1f} {:>10} {:>12} {:>10}'.format(
+            strategy,
+            len(operations) / result['build_seconds'],
+            result['requests'],
+            result['bytes'],
+            result['rounds']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""The hot paths measured by the benchmark runner.
+
+Each case is a setup function registered with @benchmark. It is called once
+with the runner's options and returns the zero argument function that is
+timed.
+"""
+
+import collections
+import hashlib
+import itertools
+import pickle
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_dry_run import LocalStateContext
+from sawtooth_identity.identity_workload import IdentityWorkloadGenerator
+from sawtooth_identity.identity_workload import WorkloadConfig
+from sawtooth_identity.identity_workload import read_workload
+from sawtooth_identity.processor.bucket_cache import BucketCache
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+from sawtooth_identity.processor.identity_payload import IdentityPayload
+from sawtooth_identity.processor.identity_state import Identity
+from sawtooth_identity.processor.identity_state import IdentityState
+from sawtooth_identity.processor.identity_state import _make_identity_address
+from sawtooth_identity.processor.payload_cache import PayloadCache
+
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _payload_bytes(action='create', name='alice', date_of_birth='1990-01-01',
+                   gender='f'):
+    return pickle.dumps({
+        'Action': action,
+        'Name': name,
+        'Date_of_birth': date_of_birth,
+        'Gender': gender
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# Identities per bucket in the state benchmarks, the same for all of them
+# so their results compare
+_BUCKET_SIZE = 4
+
+
+def _identities(count):
+    return {
+        'identity-{}'.format(i): Identity(
+            name='identity-{}'.format(i),
+            date_of_birth='1990-01-01',
+            gender='f',
+            owner='02' + 'ab' * 32)
+        for i in range(count)
+    }
+
+
+@benchmark('payload_decode')
+def payload_decode(opts):
+    payload = _payload_bytes()
+    return lambda: IdentityPayload.from_bytes(payload)
+
+
+@benchmark('address_derivation')
+def address_derivation(opts):
+    names = itertools.cycle(['identity-{}'.format(i) for i in range(1024)])
+    return lambda: _make_identity_address(next(names))
+
+
+@benchmark('state_serialize')
+def state_serialize(opts):
+    state = IdentityState(context=None)
+    identities = _identities(_BUCKET_SIZE)
+    return lambda: state._serialize(identities)
+
+
+@benchmark('state_deserialize')
+def state_deserialize(opts):
+    state = IdentityState(context=None)
+    data = state._serialize(_identities(_BUCKET_SIZE))
+    return lambda: state._deserialize(data)
+
+
+@benchmark('state_deserialize_cached')
+def state_deserialize_cached(opts):
+    # A hot bucket, decoded once and then served from the bucket cache
+    state = IdentityState(context=None, bucket_cache=BucketCache())
+    data = state._serialize(_identities(_BUCKET_SIZE))
+    return lambda: state._deserialize(data)
+
+
+@benchmark('handler_apply')
+def handler_apply(opts):
+    # Without payload and bucket caches, so every apply decodes its payload
+    # and state like a transaction seen for the first time would.
+    handler = IdentityTransactionHandler(
+        payload_cache=PayloadCache(size=0),
+        bucket_cache=BucketCache(max_bytes=0))
+    signer = '02' + 'ab' * 32
+    context = LocalStateContext()
+
+    create = _payload_bytes(action='create')
+    handler.apply(
+        TpProcessRequest(
+            header=TransactionHeader(
+                signer_public_key=signer,
+                payload_sha512=hashlib.sha512(create).hexdigest()),
+            payload=create),
+        context)
+    context.commit()
+
+    update = _payload_bytes(action='update', gender='m')
+    request = TpProcessRequest(
+        header=TransactionHeader(
+            signer_public_key=signer,
+            payload_sha512=hashlib.sha512(update).hexdigest()),
+        payload=update)
+
+    def apply():
+        handler.apply(request, context)
+        context.rollback()
+
+    return apply
+
+
+@benchmark('client_build_sign')
+def client_build_sign(opts):
+    client = create_client()
+
+    def build():
+        transaction = client._create_identity_txn(
+            'create', 'alice', date_of_birth='1990-01-01', gender='f')
+        return client._create_batch_list([transaction])
+
+    return build
+
+
+@benchmark('workload_replay')
+def workload_replay(opts):
+    # Replays a generated workload through the handler, including the
+    # transactions it rejects. Uses --workload if given, otherwise a small
+    # workload generated in memory.
+    if opts.workload is not None:
+        header, messages = read_workload(opts.workload)
+        if header['format'] == 'batches':
+            requests = [
+                _to_request(transaction)
+                for batch in messages
+                for transaction in batch.transactions
+            ]
+        else:
+            requests = list(messages)
+    else:
+        requests = list(IdentityWorkloadGenerator(
+            WorkloadConfig(count=2000, signers=4)).requests())
+
+    handler = IdentityTransactionHandler()
+    state = {'context': LocalStateContext(), 'next': 0}
+
+    def replay():
+        # Start over from empty state once the workload is exhausted
+        if state['next'] == len(requests):
+            state['context'] = LocalStateContext()
+            state['next'] = 0
+
+        context = state['context']
+        try:
+            handler.apply(requests[state['next']], context)
+            context.commit()
+        except InvalidTransaction:
+            context.rollback()
+        state['next'] += 1
+
+    return replay
+
+
+def _to_request(transaction):
+    header = TransactionHeader()
+    header.ParseFromString(transaction.header)
+    return TpProcessRequest(
+        header=header,
+        payload=transaction.payload,
+        signature=transaction.header_signature)
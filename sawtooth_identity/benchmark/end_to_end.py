@@ -0,0 +1,234 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Measures IdentityClient throughput end to end against the local REST API
+stand-in, with batches applied by IdentityTransactionHandler in-process.
+
+    python -m sawtooth_identity.benchmark.end_to_end -n 2000 --latency 0.001
+
+show_again repeats show, which with --read-cache measures cached reads.
+With --trace DIR the client and the handler write client.jsonl and
+tp.jsonl to DIR, for identity-trace.
+
+Every scenario goes through HTTP, so the numbers include request encoding,
+signing, the server and transaction processing, but no validator.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.benchmark.rest_api import StandInRestApi
+from sawtooth_identity.identity_batch_planner import IdentityBatchPlanner
+from sawtooth_identity.identity_batch_planner import IdentityOperation
+from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_read_cache import IdentityReadCache
+from sawtooth_identity.identity_tracing import TraceWriter
+
+
+def run_create(client, count):
+    errors = 0
+    for i in range(count):
+        try:
+            client.create('create-{}'.format(i), '1990-01-01', 'f')
+        except IdentityException:
+            errors += 1
+    return count, errors
+
+
+def run_show(client, count):
+    errors = 0
+    for i in range(count):
+        if client.show('create-{}'.format(i)) is None:
+            errors += 1
+    return count, errors
+
+
+def run_show_many(client, count):
+    errors = 0
+    seen = 0
+    try:
+        for _, identity in client.show_many(
+                'create-{}'.format(i) for i in range(count)):
+            seen += 1
+            if identity is None:
+                errors += 1
+    except IdentityException:
+        # A failed request, e.g. a 429, ends the stream
+        errors += count - seen
+    return count, errors
+
+
+def run_list(client, count):
+    # One full read of the namespace, measured per identity read
+    identities = client.list()
+    if identities is None:
+        return count, count
+    return sum(len(bucket) for bucket in identities), 0
+
+
+def run_import(client, count):
+    operations = [
+        IdentityOperation('create', 'import-{}'.format(i), '1990-01-01', 'm')
+        for i in range(count)
+    ]
+    try:
+        IdentityBatchPlanner(client).submit(operations)
+    except IdentityException:
+        return count, count
+    return count, 0
+
+
+SCENARIOS = collections.OrderedDict([
+    ('create', run_create),
+    ('show', run_show),
+    ('show_again', run_show),
+    ('show_many', run_show_many),
+    ('list', run_list),
+    ('import', run_import),
+])
+
+
+def run(opts):
+    client_tracer = tp_tracer = None
+    if opts.trace is not None:
+        os.makedirs(opts.trace, exist_ok=True)
+        client_tracer = TraceWriter(
+            os.path.join(opts.trace, 'client.jsonl'), source='client')
+        tp_tracer = TraceWriter(
+            os.path.join(opts.trace, 'tp.jsonl'), source='tp')
+
+    api = StandInRestApi(
+        apply_batches=not opts.no_apply,
+        latency=opts.latency,
+        throttle_rate=opts.throttle_rate,
+        seed=opts.seed,
+        tracer=tp_tracer)
+    api.start()
+
+    results = collections.OrderedDict()
+    try:
+        read_cache = IdentityReadCache(
+            size=opts.read_cache, ttl=opts.read_cache_ttl) \
+            if opts.read_cache else None
+        client = create_client(
+            base_url=api.url, read_cache=read_cache, tracer=client_tracer)
+        # Scenarios run in order: show and list read what create wrote
+        for name, scenario in SCENARIOS.items():
+            start = time.perf_counter()
+            operations, errors = scenario(client, opts.count)
+            elapsed = time.perf_counter() - start
+            results[name] = collections.OrderedDict([
+                ('operations', operations),
+                ('errors', errors),
+                ('seconds', elapsed),
+                ('ops_per_sec', operations / elapsed if elapsed else 0.0),
+            ])
+            print('{:<12} {:>14.1f} ops/s {:>8} ops {:>6} errors'.format(
+                name, results[name]['ops_per_sec'], operations, errors))
+    finally:
+        api.stop()
+        for tracer in (client_tracer, tp_tracer):
+            if tracer is not None:
+                tracer.close()
+
+    print('server: {}'.format(api.stats()))
+    if client.read_cache is not None:
+        print('read cache: {}'.format(dict(client.read_cache.stats())))
+    return results
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark IdentityClient against a local REST API '
+        'stand-in.')
+
+    parser.add_argument(
+        '-n', '--count',
+        type=int,
+        default=1000,
+        help='number of operations per scenario (default: 1000)')
+
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='seconds the server adds to every response (default: 0)')
+
+    parser.add_argument(
+        '--throttle-rate',
+        type=float,
+        default=0.0,
+        help='fraction of requests answered with 429 (default: 0)')
+
+    parser.add_argument(
+        '--no-apply',
+        action='store_true',
+        help='do not apply submitted batches to state')
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed for the throttled requests (default: 0)')
+
+    parser.add_argument(
+        '--read-cache',
+        type=int,
+        default=0,
+        metavar='SIZE',
+        help='cache up to SIZE state reads in the client (default: 0, '
+        'disabled)')
+
+    parser.add_argument(
+        '--read-cache-ttl',
+        type=float,
+        default=5.0,
+        help='seconds a cached read is served before it is revalidated '
+        '(default: 5)')
+
+    parser.add_argument(
+        '--trace',
+        metavar='DIR',
+        help='write client and transaction processor spans to DIR')
+
+    parser.add_argument(
+        '--save',
+        metavar='FILE',
+        help='write the results to FILE as JSON')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    results = run(opts)
+
+    if opts.save is not None:
+        with open(opts.save, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""A local stand-in for the Sawtooth REST API, for benchmarking and testing
+clients without a validator.
+
+It serves /batches, paginated /state, /state/{address}, /batch_statuses
+and the chain head from /blocks from an in-memory store. Submitted batches are applied in-process with
+IdentityTransactionHandler, each batch committing as a block of its own, or
+only recorded when applying is turned off. Latency and 429 Too Many
+Requests responses can be injected.
+
+    python -m sawtooth_identity.benchmark.rest_api --port 8008 --latency 0.002
+
+The stand-in keeps no history: every request is served from the latest
+state whatever head it asks for, and /blocks lists no blocks.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+import sys
+import threading
+
+from aiohttp import web
+
+from sawtooth_sdk.processor.exceptions import InternalError
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.identity_dry_run import LocalStateContext
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+
+
+DEFAULT_PAGE_LIMIT = 1000
+MAX_PAGE_LIMIT = 1000
+
+
+class StandInRestApi(object):
+    def __init__(self, apply_batches=True, latency=0.0, throttle_rate=0.0,
+                 seed=0, tracer=None):
+        """Constructor.
+
+        Args:
+            apply_batches (bool): Apply submitted batches to state with
+                IdentityTransactionHandler. If False, batches are only
+                recorded as committed.
+            latency (float): Seconds added to every response.
+            throttle_rate (float): Fraction of requests answered with 429.
+            seed (int): Seed for choosing the throttled requests.
+            tracer (TraceWriter): Given to the handler, to trace the
+                transactions it applies.
+        """
+        self._apply_batches = apply_batches
+        self._latency = latency
+        self._throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+
+        self._context = LocalStateContext()
+        self._handler = IdentityTransactionHandler(tracer=tracer)
+        self._statuses = {}
+        self._block_num = 0
+        self._head = _block_id(0)
+
+        self._requests = 0
+        self._throttled = 0
+
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._port = None
+
+    @property
+    def entries(self):
+        return self._context.entries
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._port)
+
+    def stats(self):
+        return {
+            'requests': self._requests,
+            'throttled': self._throttled,
+            'entries': len(self._context.entries),
+            'block_num': self._block_num,
+        }
+
+    def create_app(self):
+        app = web.Application(
+            middlewares=[self._inject_faults],
+            client_max_size=16 * 1024 * 1024)
+        app.router.add_post('/batches', self._post_batches)
+        app.router.add_get('/state', self._list_state)
+        app.router.add_get('/state/{address}', self._get_state)
+        app.router.add_get('/batch_statuses', self._get_batch_statuses)
+        app.router.add_get('/blocks', self._list_blocks)
+        return app
+
+    def start(self, port=0):
+        """Serves on 127.0.0.1:port from a background thread. Port 0 picks
+        a free port; the url property gives the address to use.
+        """
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        async def setup():
+            self._runner = web.AppRunner(self.create_app())
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, '127.0.0.1', port)
+            await site.start()
+            self._port = self._runner.addresses[0][1]
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(setup())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(
+            target=serve, name='rest-api-stand-in', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    @web.middleware
+    async def _inject_faults(self, request, handler):
+        self._requests += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        if self._throttle_rate and self._rng.random() < self._throttle_rate:
+            self._throttled += 1
+            return _error(429, 'Too many requests')
+        return await handler(request)
+
+    async def _post_batches(self, request):
+        batch_list = BatchList()
+        try:
+            batch_list.ParseFromString(await request.read())
+        except Exception:  # pylint: disable=broad-except
+            return _error(400, 'Submitted batches were malformed')
+
+        ids = []
+        for batch in batch_list.batches:
+            ids.append(batch.header_signature)
+            self._statuses[batch.header_signature] = self._apply(batch)
+
+        return web.json_response(
+            {'link': '{}/batch_statuses?id={}'.format(
+                _base(request), ','.join(ids))},
+            status=202)
+
+    async def _list_state(self, request):
+        prefix = request.query.get('address', '')
+        start = request.query.get('start')
+        try:
+            limit = min(
+                int(request.query.get('limit', DEFAULT_PAGE_LIMIT)),
+                MAX_PAGE_LIMIT)
+        except ValueError:
+            return _error(400, 'Paging request failed as written')
+
+        addresses = sorted(
+            address for address in self._context.entries
+            if address.startswith(prefix))
+
+        # As in the REST API, start is the address of the first entry
+        position = 0
+        if start is not None:
+            try:
+                position = addresses.index(start)
+            except ValueError:
+                return _error(400, 'Invalid paging start')
+
+        page = addresses[position:position + limit]
+        paging = {'start': start, 'limit': limit}
+        if position + limit < len(addresses):
+            paging['next_position'] = addresses[position + limit]
+            paging['next'] = '{}/state?address={}&limit={}&start={}'.format(
+                _base(request), prefix, limit, paging['next_position'])
+
+        return web.json_response({
+            'data': [
+                {'address': address,
+                 'data': _encode(self._context.entries[address])}
+                for address in page
+            ],
+            'head': self._head,
+            'link': str(request.url),
+            'paging': paging,
+        })
+
+    async def _get_state(self, request):
+        data = self._context.entries.get(request.match_info['address'])
+        if data is None:
+            return _error(404, 'There is no resource at the identifier')
+
+        return web.json_response({
+            'data': _encode(data),
+            'head': self._head,
+            'link': str(request.url),
+        })
+
+    async def _get_batch_statuses(self, request):
+        ids = [id for id in request.query.get('id', '').split(',') if id]
+        if not ids:
+            return _error(400, 'No batch ids given')
+
+        return web.json_response({
+            'data': [
+                {'id': id,
+                 'status': self._statuses.get(id, 'UNKNOWN'),
+                 'invalid_transactions': []}
+                for id in ids
+            ],
+            'link': str(request.url),
+        })
+
+    async def _list_blocks(self, request):
+        # Only the head is known, which is what clients poll /blocks for
+        return web.json_response({
+            'data': [],
+            'head': self._head,
+            'link': str(request.url),
+            'paging': {'limit': None, 'start': None},
+        })
+
+    def _apply(self, batch):
+        if not self._apply_batches:
+            return 'COMMITTED'
+
+        for transaction in batch.transactions:
+            header = TransactionHeader()
+            header.ParseFromString(transaction.header)
+            try:
+                self._handler.apply(
+                    TpProcessRequest(
+                        header=header,
+                        payload=transaction.payload,
+                        signature=transaction.header_signature),
+                    self._context)
+            except (InvalidTransaction, InternalError):
+                # A batch is atomic, none of its transactions apply
+                self._context.rollback()
+                return 'INVALID'
+
+        self._context.commit()
+        self._block_num += 1
+        self._head = _block_id(self._block_num)
+        return 'COMMITTED'
+
+
+def _block_id(block_num):
+    return hashlib.sha512(str(block_num).encode()).hexdigest()
+
+
+def _encode(data):
+    return base64.b64encode(data).decode()
+
+
+def _base(request):
+    return '{}://{}'.format(request.scheme, request.host)
+
+
+def _error(status, title):
+    return web.json_response(
+        {'error': {'code': status, 'title': title}}, status=status)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Serve an in-memory stand-in for the Sawtooth REST API.')
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8008,
+        help='port to listen on (default: 8008)')
+
+    parser.add_argument(
+        '--no-apply',
+        action='store_true',
+        help='record submitted batches without applying them to state')
+
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='seconds added to every response (default: 0)')
+
+    parser.add_argument(
+        '--throttle-rate',
+        type=float,
+        default=0.0,
+        help='fraction of requests answered with 429 (default: 0)')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    api = StandInRestApi(
+        apply_batches=not opts.no_apply,
+        latency=opts.latency,
+        throttle_rate=opts.throttle_rate)
+    web.run_app(
+        api.create_app(), host='127.0.0.1', port=opts.port, print=print)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Runs the identity benchmarks, stores the results as a JSON baseline and
+compares a run against a stored baseline.
+
+    identity-bench --save baseline.json
+    identity-bench --compare baseline.json --tolerance 0.2
+
+--compare without a file compares against BASELINE_FILE, the baseline
+shipped with the package. Timings depend on the machine, so it is a
+reference point rather than a pass mark: save a baseline on the machine
+the comparisons run on.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import platform
+import sys
+import time
+
+from sawtooth_identity.benchmark.cases import BENCHMARKS
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def measure(func, min_time, repeat):
+    """Returns the best time per call of func, in seconds, over repeat
+    rounds that each run for at least min_time seconds.
+    """
+    # Find a loop count that takes long enough to time reliably
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+
+    return best
+
+
+def run(names, opts):
+    results = collections.OrderedDict()
+    for name in names:
+        seconds = measure(BENCHMARKS[name](opts), opts.min_time, opts.repeat)
+        results[name] = collections.OrderedDict([
+            ('seconds_per_op', seconds),
+            ('ops_per_sec', 1.0 / seconds),
+        ])
+        print('{:<24} {:>14.1f} ops/s {:>12.2f} us/op'.format(
+            name, 1.0 / seconds, seconds * 1e6))
+
+    return collections.OrderedDict([
+        ('python', platform.python_version()),
+        ('machine', platform.machine()),
+        ('timestamp', int(time.time())),
+        ('results', results),
+    ])
+
+
+def compare(current, baseline, tolerance):
+    """Returns the names of the benchmarks that are slower than baseline by
+    more than tolerance (a fraction, e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        try:
+            expected = baseline['results'][name]['seconds_per_op']
+        except KeyError:
+            print('{:<24} no baseline'.format(name))
+            continue
+
+        change = result['seconds_per_op'] / expected - 1.0
+        status = 'ok'
+        if change > tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        print('{:<24} {:>+8.1%}  {}'.format(name, change, status))
+
+    return regressions
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Run the identity benchmarks.')
+
+    parser.add_argument(
+        'benchmarks',
+        nargs='*',
+        help='benchmarks to run, all of them by default: {}'.format(
+            ', '.join(BENCHMARKS)))
+
+    parser.add_argument(
+        '--save',
+        metavar='FILE',
+        help='write the results to FILE as a JSON baseline')
+
+    parser.add_argument(
+        '--compare',
+        metavar='FILE',
+        nargs='?',
+        const=BASELINE_FILE,
+        help='compare the results against the JSON baseline in FILE, the '
+        'baseline shipped with the package if not given')
+
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.2,
+        help='allowed slowdown against the baseline, as a fraction '
+        '(default: 0.2)')
+
+    parser.add_argument(
+        '--workload',
+        metavar='FILE',
+        help='workload file from identity-workload to replay in the '
+        'workload_replay benchmark')
+
+    parser.add_argument(
+        '--min-time',
+        type=float,
+        default=0.2,
+        help='minimum seconds per measurement round (default: 0.2)')
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='measurement rounds per benchmark, the best is kept '
+        '(default: 5)')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    unknown = set(opts.benchmarks).difference(BENCHMARKS)
+    if unknown:
+        print('Unknown benchmarks: {}'.format(', '.join(sorted(unknown))),
+              file=sys.stderr)
+        sys.exit(2)
+
+    current = run(opts.benchmarks or list(BENCHMARKS), opts)
+
+    if opts.save is not None:
+        with open(opts.save, 'w') as fd:
+            json.dump(current, fd, indent=2)
+
+    if opts.compare is not None:
+        with open(opts.compare) as fd:
+            baseline = json.load(fd)
+        regressions = compare(current, baseline, opts.tolerance)
+        if regressions:
+            print('Regressions: {}'.format(', '.join(regressions)),
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Measures how many identity transactions can be built per second, with a
+TransactionHeader message built per transaction as the client used to, and
+with IdentityTransactionBuilder.
+
+    python -m sawtooth_identity.benchmark.txn_builder --nonces 100000
+
+Headers are timed without signing, which costs the same either way, and
+transactions with signing. The clock based nonces the client used to
+generate are also checked for collisions.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import itertools
+import pickle
+import sys
+import time
+
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.benchmark.runner import measure
+from sawtooth_identity.identity_txn_builder import FAMILY_NAME
+from sawtooth_identity.identity_txn_builder import identity_address
+
+
+def _payload(name):
+    return pickle.dumps({
+        'Action': 'create',
+        'Name': name,
+        'Date_of_birth': '1990-01-01',
+        'Gender': 'f'
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def message_header(signer, payload_bytes, addresses):
+    # How headers were built before IdentityTransactionBuilder
+    return TransactionHeader(
+        signer_public_key=signer.get_public_key().as_hex(),
+        family_name=FAMILY_NAME,
+        family_version='0.1',
+        inputs=addresses,
+        outputs=addresses,
+        dependencies=[],
+        payload_sha512=hashlib.sha512(payload_bytes).hexdigest(),
+        batcher_public_key=signer.get_public_key().as_hex(),
+        nonce=time.time().hex()
+    ).SerializeToString()
+
+
+def count_clock_nonce_collisions(count):
+    """Returns how many of count clock based nonces generated back to back
+    repeat an earlier one.
+    """
+    nonces = set()
+    for _ in range(count):
+        nonces.add(time.time().hex())
+    return count - len(nonces)
+
+
+def run(min_time, repeat, nonces):
+    client = create_client()
+    signer = client._signer
+    builder = client._get_builder()
+    names = itertools.cycle(['identity-{}'.format(i) for i in range(1000)])
+
+    def message():
+        name = next(names)
+        message_header(signer, _payload(name), [identity_address(name)])
+
+    def builder_header():
+        name = next(names)
+        builder.header_bytes(_payload(name), [identity_address(name)])
+
+    def message_signed():
+        name = next(names)
+        signer.sign(message_header(
+            signer, _payload(name), [identity_address(name)]))
+
+    def builder_signed():
+        builder.build('create', next(names), '1990-01-01', 'f')
+
+    print('{:<18} {:>14} {:>10}'.format('case', 'txns/s', 'us/txn'))
+    for name, func in (('header_message', message),
+                       ('header_builder', builder_header),
+                       ('signed_message', message_signed),
+                       ('signed_builder', builder_signed)):
+        seconds = measure(func, min_time, repeat)
+        print('{:<18} {:>14.0f} {:>10.2f}'.format(
+            name, 1 / seconds, seconds * 1e6))
+
+    if nonces:
+        print('clock nonce collisions: {} of {}'.format(
+            count_clock_nonce_collisions(nonces), nonces))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark identity transaction building.')
+
+    parser.add_argument(
+        '--min-time',
+        type=float,
+        default=0.2,
+        help='minimum seconds per measurement round (default: 0.2)')
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='measurement rounds, the best is kept (default: 3)')
+
+    parser.add_argument(
+        '--nonces',
+        type=int,
+        default=100000,
+        help='clock based nonces to check for collisions, 0 to skip '
+        '(default: 100000)')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+    run(opts.min_time, opts.repeat, opts.nonces)
+
+
+if __name__ == '__main__':
+    main()
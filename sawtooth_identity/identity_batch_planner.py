@@ -0,0 +1,235 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import logging
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+
+from sawtooth_identity.identity_exceptions import IdentityException
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The REST API rejects request bodies larger than its client_max_size,
+# which defaults to 10 MiB.
+MAX_BATCH_LIST_BYTES = 10 * 1024 * 1024
+
+
+class IdentityOperation(object):
+    """A single identity transaction to be planned, e.g.
+    IdentityOperation('create', 'alice', '1990-01-01', 'f') or
+    IdentityOperation('rename', 'alice', new_name='alicia').
+    """
+
+    __slots__ = ('action', 'name', 'date_of_birth', 'gender', 'new_name')
+
+    def __init__(self, action, name, date_of_birth='', gender='',
+                 new_name=''):
+        self.action = action
+        self.name = name
+        self.date_of_birth = date_of_birth
+        self.gender = gender
+        self.new_name = new_name
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {!r}, {!r}, new_name={!r})".format(
+            self.__class__.__name__,
+            self.action,
+            self.name,
+            self.date_of_birth,
+            self.gender,
+            self.new_name)
+
+
+class IdentityBatchPlan(object):
+    """The result of planning: the BatchLists to submit, in order, and the
+    shape of the dependency graph between their transactions.
+    """
+
+    def __init__(self, batch_lists, transaction_count, max_chain_length,
+                 rejected=None):
+        self._batch_lists = batch_lists
+        self._transaction_count = transaction_count
+        self._max_chain_length = max_chain_length
+        self._rejected = rejected or []
+
+    @property
+    def batch_lists(self):
+        return self._batch_lists
+
+    @property
+    def transaction_count(self):
+        return self._transaction_count
+
+    @property
+    def max_chain_length(self):
+        """The longest chain of same-address transactions. This is the
+        minimum number of rounds the validator's parallel scheduler needs.
+        """
+        return self._max_chain_length
+
+    @property
+    def rejected(self):
+        """The (IdentityOperation, reason) pairs that a dry run filtered
+        out before submission.
+        """
+        return self._rejected
+
+
+class IdentityBatchPlanner(object):
+    """Builds BatchLists for bulk identity operations so that the validator's
+    parallel scheduler can run as much of the work concurrently as possible.
+
+    Every transaction is placed in a batch of its own, so transactions that
+    touch disjoint addresses never wait on one another. A transaction that
+    touches an address written by an earlier operation lists the last such
+    transaction in its header dependencies, which keeps same-address
+    operations in submission order. Batches are then packed, in order, into
+    as few BatchLists as fit under max_batch_list_bytes.
+
+    If a dry run is given, every transaction is first applied to its local
+    view of state and the ones that would be rejected are dropped.
+    """
+
+    def __init__(self, client, max_batch_list_bytes=MAX_BATCH_LIST_BYTES,
+                 dry_run=None):
+        """Constructor.
+
+        Args:
+            client (IdentityClient): A client with a signer, used to build
+                and sign transactions and batches and to submit them.
+            max_batch_list_bytes (int): The maximum serialized size of a
+                single BatchList.
+            dry_run (IdentityDryRun): Optional, used to filter out
+                transactions that would be rejected.
+        """
+        self._client = client
+        self._max_batch_list_bytes = max_batch_list_bytes
+        self._dry_run = dry_run
+
+    def plan(self, operations):
+        """Build and sign the transactions for operations.
+
+        Args:
+            operations (iterable of IdentityOperation): The operations, in
+                the order they must take effect.
+
+        Returns:
+            (IdentityBatchPlan): The planned BatchLists.
+        """
+        # address -> (header signature, chain length) of the last
+        # transaction that touched it
+        last_writers = {}
+        batches = []
+        rejected = []
+        max_chain_length = 0
+
+        for operation in operations:
+            addresses = self._client._get_identity_addresses(
+                operation.action, operation.name, operation.new_name)
+
+            dependencies = []
+            chain_length = 1
+            for address in addresses:
+                if address in last_writers:
+                    signature, length = last_writers[address]
+                    if signature not in dependencies:
+                        dependencies.append(signature)
+                    chain_length = max(chain_length, length + 1)
+
+            transaction = self._client._create_identity_txn(
+                operation.action,
+                operation.name,
+                date_of_birth=operation.date_of_birth,
+                gender=operation.gender,
+                new_name=operation.new_name,
+                dependencies=dependencies)
+
+            if self._dry_run is not None:
+                reason = self._dry_run.check(transaction)
+                if reason is not None:
+                    rejected.append((operation, reason))
+                    continue
+
+            for address in addresses:
+                last_writers[address] = \
+                    (transaction.header_signature, chain_length)
+            max_chain_length = max(max_chain_length, chain_length)
+
+            batches.extend(
+                self._client._create_batch_list([transaction]).batches)
+
+        return IdentityBatchPlan(
+            batch_lists=self._pack(batches),
+            transaction_count=len(batches),
+            max_chain_length=max_chain_length,
+            rejected=rejected)
+
+    def submit(self, operations, auth_user=None, auth_password=None):
+        """Plan operations and send the resulting BatchLists to the REST API.
+
+        Returns:
+            (list of str): The REST API response for each BatchList.
+        """
+        plan = self.plan(operations)
+        if plan.rejected:
+            LOGGER.warning(
+                "Dry run filtered out %s transactions that would be "
+                "rejected", len(plan.rejected))
+            for operation, reason in plan.rejected:
+                LOGGER.debug("Filtered %s: %s", operation, reason)
+
+        LOGGER.info(
+            "Submitting %s transactions in %s batch lists "
+            "(longest dependency chain: %s)",
+            plan.transaction_count,
+            len(plan.batch_lists),
+            plan.max_chain_length)
+
+        return [
+            self._client._send_batch_list(
+                batch_list,
+                auth_user=auth_user,
+                auth_password=auth_password)
+            for batch_list in plan.batch_lists
+        ]
+
+    def _pack(self, batches):
+        batch_lists = []
+        current = []
+        current_size = 0
+
+        for batch in batches:
+            # Each repeated field entry costs its size plus a tag and a
+            # length prefix of at most a few bytes.
+            size = batch.ByteSize() + 6
+            if size > self._max_batch_list_bytes:
+                raise IdentityException(
+                    "Batch {} is larger than the batch list size limit "
+                    "of {} bytes".format(
+                        batch.header_signature, self._max_batch_list_bytes))
+
+            if current and current_size + size > self._max_batch_list_bytes:
+                batch_lists.append(BatchList(batches=current))
+                current = []
+                current_size = 0
+
+            current.append(batch)
+            current_size += size
+
+        if current:
+            batch_lists.append(BatchList(batches=current))
+
+        return batch_lists
@@ -16,6 +16,7 @@
 from __future__ import print_function
 import argparse
 import getpass
+import json
 import logging
 import os
 import traceback
@@ -24,8 +25,19 @@ import pkg_resources
 
 from colorlog import ColoredFormatter
 
+from sawtooth_identity.identity_client import DEFAULT_SHOW_CONCURRENCY
 from sawtooth_identity.identity_client import IdentityClient
+from sawtooth_identity.identity_codec import decode_identities
 from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_export import EXPORT_FORMATS
+from sawtooth_identity.identity_export import IdentityExporter
+from sawtooth_identity.identity_workload import write_history
+from sawtooth_identity.identity_migration import DEFAULT_MIGRATION_BATCH_SIZE
+from sawtooth_identity.identity_migration import DEFAULT_MIGRATION_RATE
+from sawtooth_identity.identity_migration import IdentityMigrator
+from sawtooth_identity.identity_stats import compute_stats
+from sawtooth_identity.identity_stats import load_table
+from sawtooth_identity.identity_tracing import TraceWriter
 
 
 DISTRIBUTION_NAME = 'sawtooth-identity'
@@ -100,8 +112,13 @@ def create_parser(prog_name):
     add_create_parser(subparsers, parent_parser)
     add_delete_parser(subparsers, parent_parser)
     add_update_parser(subparsers, parent_parser)
+    add_rename_parser(subparsers, parent_parser)
     add_list_parser(subparsers, parent_parser)
     add_show_parser(subparsers, parent_parser)
+    add_export_parser(subparsers, parent_parser)
+    add_history_parser(subparsers, parent_parser)
+    add_stats_parser(subparsers, parent_parser)
+    add_migrate_parser(subparsers, parent_parser)
 
     return parser
 
@@ -148,6 +165,20 @@ def add_create_parser(subparsers, parent_parser):
         type=str,
         help="identify directory of user's private key file")
 
+    parser.add_argument(
+        '--wait',
+        nargs='?',
+        const=sys.maxsize,
+        type=int,
+        help='set time, in seconds, to wait for the transaction to commit')
+
+    parser.add_argument(
+        '--trace',
+        type=str,
+        metavar='FILE',
+        help='append the timing spans of the transaction to FILE, '
+        'see identity-trace')
+
     parser.add_argument(
         '--auth-user',
         type=str,
@@ -167,12 +198,14 @@ def do_create(args):
     keyfile = _get_keyfile(args)
     auth_user, auth_password = _get_auth_info(args)
 
-    client = IdentityClient(base_url=url, keyfile=keyfile)
+    client = IdentityClient(
+        base_url=url, keyfile=keyfile, tracer=_get_tracer(args))
 
     response = client.create(
         name,
         date_of_birth=date_of_birth,
         gender=gender,
+        wait=args.wait,
         auth_user=auth_user,
         auth_password=auth_password)
 
@@ -206,6 +239,20 @@ def add_delete_parser(subparsers, parent_parser):
         type=str,
         help="identify directory of user's private key file")
 
+    parser.add_argument(
+        '--wait',
+        nargs='?',
+        const=sys.maxsize,
+        type=int,
+        help='set time, in seconds, to wait for the transaction to commit')
+
+    parser.add_argument(
+        '--trace',
+        type=str,
+        metavar='FILE',
+        help='append the timing spans of the transaction to FILE, '
+        'see identity-trace')
+
     parser.add_argument(
         '--auth-user',
         type=str,
@@ -225,10 +272,12 @@ def do_delete(args):
     keyfile = _get_keyfile(args)
     auth_user, auth_password = _get_auth_info(args)
 
-    client = IdentityClient(base_url=url, keyfile=keyfile)
+    client = IdentityClient(
+        base_url=url, keyfile=keyfile, tracer=_get_tracer(args))
 
     response = client.delete(
         name,
+        wait=args.wait,
         auth_user=auth_user,
         auth_password=auth_password)    
 
@@ -258,6 +307,12 @@ def add_update_parser(subparsers, parent_parser):
         type=str,
         help='Update the parameter with this value')
 
+    parser.add_argument(
+        '--expected-version',
+        type=int,
+        help='only apply the update if the identity is at this version, '
+        'as printed by show')
+
     parser.add_argument(
         '--url',
         type=str,
@@ -273,6 +328,20 @@ def add_update_parser(subparsers, parent_parser):
         type=str,
         help="identify directory of user's private key file")
 
+    parser.add_argument(
+        '--wait',
+        nargs='?',
+        const=sys.maxsize,
+        type=int,
+        help='set time, in seconds, to wait for the transaction to commit')
+
+    parser.add_argument(
+        '--trace',
+        type=str,
+        metavar='FILE',
+        help='append the timing spans of the transaction to FILE, '
+        'see identity-trace')
+
     parser.add_argument(
         '--auth-user',
         type=str,
@@ -292,12 +361,94 @@ def do_update(args):
     keyfile = _get_keyfile(args)
     auth_user, auth_password = _get_auth_info(args)
 
-    client = IdentityClient(base_url=url, keyfile=keyfile)
+    client = IdentityClient(
+        base_url=url, keyfile=keyfile, tracer=_get_tracer(args))
 
     response = client.update(
         name,
         parameter,
         value,
+        expected_version=args.expected_version,
+        wait=args.wait,
+        auth_user=auth_user,
+        auth_password=auth_password)
+
+    print("Response: {}".format(response))
+
+def add_rename_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'rename',
+        help='Renames an existing identity',
+        description='Rename an existing identity for the specified user /'
+        ' private key in a single transaction. Please provide the following:'
+        ' <name>, <new_name>.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'name',
+        type=str,
+        help='Current name of this identity')
+
+    parser.add_argument(
+        'new_name',
+        type=str,
+        help='New name of this identity')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--username',
+        type=str,
+        help="identify name of user's private key file")
+
+    parser.add_argument(
+        '--key-dir',
+        type=str,
+        help="identify directory of user's private key file")
+
+    parser.add_argument(
+        '--wait',
+        nargs='?',
+        const=sys.maxsize,
+        type=int,
+        help='set time, in seconds, to wait for the transaction to commit')
+
+    parser.add_argument(
+        '--trace',
+        type=str,
+        metavar='FILE',
+        help='append the timing spans of the transaction to FILE, '
+        'see identity-trace')
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+def do_rename(args):
+    name, new_name = args.name, args.new_name
+
+    url = _get_url(args)
+    keyfile = _get_keyfile(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = IdentityClient(
+        base_url=url, keyfile=keyfile, tracer=_get_tracer(args))
+
+    response = client.rename(
+        name,
+        new_name,
+        wait=args.wait,
         auth_user=auth_user,
         auth_password=auth_password)
 
@@ -308,9 +459,17 @@ def add_list_parser(subparsers, parent_parser):
         'list',
         help='Displays information for all identities',
         description='Displays information for all identities in state, showing '
-        'the <name>, <date_of_birth> and <gender> for each identity.',
+        'the <name>, <date_of_birth>, <gender>, version and owner for each '
+        'identity.',
         parents=[parent_parser])
 
+    parser.add_argument(
+        '--since',
+        type=str,
+        metavar='HEAD',
+        help='only list identities created, updated or deleted after the '
+        'block HEAD, e.g. the head printed by a previous list')
+
     parser.add_argument(
         '--url',
         type=str,
@@ -343,26 +502,70 @@ def do_list(args):
     auth_user, auth_password = _get_auth_info(args)
 
     client = IdentityClient(base_url=url, keyfile=None)
-    identities = client.list(auth_user, auth_password)
 
-    for identity in identities:
-        # this will print out 4 key-value pairs representing the action, name, DOB, gender
-        for key, value in identity.items():
-            print('{}: {}'.format(key, value))
+    if args.since is not None:
+        delta = client.list_changes(
+            args.since,
+            auth_user=auth_user,
+            auth_password=auth_password)
+
+        for address, data in delta.changes.items():
+            if data is None:
+                print('deleted: {}'.format(address))
+                continue
+            for identity in decode_identities(data):
+                _print_identity(identity)
+
+        print('head: {}'.format(delta.head))
+        return
+
+    # The head the pages were read at is where a later --since resumes
+    head = None
+    for page in client.iter_state_pages(
+            auth_user=auth_user,
+            auth_password=auth_password):
+        head = page.head
+        for _, data in page.entries:
+            for identity in decode_identities(data):
+                _print_identity(identity)
+
+    print('head: {}'.format(head))
+
+def _print_identity(identity):
+    # The version is what update --expected-version is checked against,
+    # and only the owner may update, rename or delete the identity
+    print('{}: {}, {}, version {}, owner {}'.format(
+        identity.name, identity.date_of_birth, identity.gender,
+        identity.version, identity.owner))
 
 def add_show_parser(subparsers, parent_parser):
     parser = subparsers.add_parser(
         'show',
         help='Displays information about an identity',
         description='Displays information for the identity with <name>,'
-        ' showing the <name>, <date_of_birth> and <gender>.',
+        ' showing the <name>, <date_of_birth>, <gender>, version and owner.',
         parents=[parent_parser])
 
     parser.add_argument(
         'name',
         type=str,
+        nargs='?',
         help='name of the identity to show')
 
+    parser.add_argument(
+        '--from-file',
+        type=str,
+        metavar='FILE',
+        help='show the identities named in FILE, one name per line, or '
+        'read from stdin if FILE is -')
+
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_SHOW_CONCURRENCY,
+        help='maximum number of concurrent requests with --from-file '
+        '(default: {})'.format(DEFAULT_SHOW_CONCURRENCY))
+
     parser.add_argument(
         '--url',
         type=str,
@@ -391,15 +594,330 @@ def add_show_parser(subparsers, parent_parser):
         'is using Basic Auth')
 
 def do_show(args):
-    name = args.name
+    if (args.name is None) == (args.from_file is None):
+        raise IdentityException('Specify either a name or --from-file')
+
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = IdentityClient(base_url=url, keyfile=None)
+
+    if args.from_file is None:
+        identity = client.show(
+            args.name, auth_user=auth_user, auth_password=auth_password)
+        if identity is None:
+            raise IdentityException('No such identity: {}'.format(args.name))
+        _print_identity(identity)
+        return
+
+    if args.from_file == '-':
+        names = _read_names(sys.stdin)
+    else:
+        with open(args.from_file) as fd:
+            names = _read_names(fd)
+
+    for name, identity in client.show_many(
+            names,
+            concurrency=args.concurrency,
+            auth_user=auth_user,
+            auth_password=auth_password):
+        if identity is None:
+            print('{}: not found'.format(name))
+        else:
+            _print_identity(identity)
+
+def _read_names(fd):
+    return [line.strip() for line in fd if line.strip()]
+
+
+def add_export_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'export',
+        help='Exports all identities to a compressed file',
+        description='Streams every identity in state to a gzip compressed '
+        'JSONL or CSV file with the <address>, <owner>, <name>, '
+        '<date_of_birth> and <gender> of each identity.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'output',
+        type=str,
+        help='path of the gzip file to write')
+
+    parser.add_argument(
+        '--format',
+        choices=EXPORT_FORMATS,
+        default='jsonl',
+        help='output format (default: jsonl)')
+
+    parser.add_argument(
+        '--cursor',
+        type=str,
+        help='file to save the paging cursor in; an interrupted export '
+        'resumes from it, in the same --format')
+
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=1000,
+        help='number of state entries fetched per request (default: 1000)')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+def do_export(args):
     url = _get_url(args)
     auth_user, auth_password = _get_auth_info(args)
 
     client = IdentityClient(base_url=url, keyfile=None)
-    identity = client.show(name, auth_user=auth_user, auth_password=auth_password)
+    exporter = IdentityExporter(
+        client,
+        args.output,
+        export_format=args.format,
+        cursor_file=args.cursor,
+        page_size=args.page_size)
 
-    for key, value in identity.items():
-            print('{}: {}'.format(key, value))
+    result = exporter.run(auth_user=auth_user, auth_password=auth_password)
+
+    print("Exported {} identities in {:.1f}s ({:.0f} records/s)".format(
+        result.records, result.seconds, result.records_per_second))
+
+
+def add_history_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'history',
+        help='Exports the committed identity batches',
+        description='Walks the committed blocks and writes their identity '
+        'batches, oldest first, to a file that identity-rebuild replays.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'output',
+        type=str,
+        help='path of the file to write')
+
+    parser.add_argument(
+        '--since',
+        type=str,
+        metavar='BLOCK',
+        help='only export the batches committed after BLOCK, e.g. the head '
+        'of a previous history, to replay on top of its snapshot')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+def do_history(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = IdentityClient(base_url=url, keyfile=None)
+    head, batches = client.get_committed_batches(
+        since=args.since,
+        auth_user=auth_user,
+        auth_password=auth_password)
+
+    count = write_history(args.output, batches, head, since=args.since)
+    print('Wrote {} batches to {}'.format(count, args.output))
+    print('head: {}'.format(head))
+
+
+def add_stats_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'stats',
+        help='Displays aggregates over all identities',
+        description='Displays the number of identities by gender, the '
+        'owners with the most identities and an age histogram, read from '
+        'the REST API or from a local export.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        '--export-file',
+        type=str,
+        metavar='FILE',
+        help='read identities from a file written by identity export '
+        'instead of the REST API')
+
+    parser.add_argument(
+        '--snapshot',
+        type=str,
+        metavar='FILE',
+        help='read identities from a snapshot written by identity-rebuild '
+        'instead of the REST API')
+
+    parser.add_argument(
+        '--bin-width',
+        type=int,
+        default=10,
+        help='width of the age histogram bins in years (default: 10)')
+
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='number of owners with the most identities to show '
+        '(default: 10)')
+
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='print the aggregates as JSON')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+def do_stats(args):
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = None
+    if args.export_file is None and args.snapshot is None:
+        client = IdentityClient(base_url=_get_url(args), keyfile=None)
+
+    table = load_table(
+        client=client,
+        export_file=args.export_file,
+        snapshot_file=args.snapshot,
+        auth_user=auth_user,
+        auth_password=auth_password)
+    stats = compute_stats(
+        table, bin_width=args.bin_width, top_owners=args.top)
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+
+    print('total: {}'.format(stats['total']))
+    print('owners: {}'.format(stats['owners']))
+    print('unknown date of birth: {}'.format(
+        stats['unknown_date_of_birth']))
+    for title in ('by_gender', 'top_owners', 'age_histogram'):
+        print('{}:'.format(title.replace('_', ' ')))
+        for key, count in stats[title].items():
+            print('  {}: {}'.format(key, count))
+
+
+def add_migrate_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'migrate',
+        help='Migrates identity state to the compact encoding',
+        description='Rewrites every pickled identity bucket in the compact '
+        'encoding with rate-limited family version 0.2 migrate transactions. '
+        'Every transaction processor must support version 0.2.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=DEFAULT_MIGRATION_RATE,
+        help='most migrate transactions sent per second (default: '
+        '{})'.format(DEFAULT_MIGRATION_RATE))
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_MIGRATION_BATCH_SIZE,
+        help='transactions sent per request (default: {})'.format(
+            DEFAULT_MIGRATION_BATCH_SIZE))
+
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=1000,
+        help='number of state entries read per request (default: 1000)')
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='only count the buckets left to migrate')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--username',
+        type=str,
+        help="identify name of user's private key file")
+
+    parser.add_argument(
+        '--key-dir',
+        type=str,
+        help="identify directory of user's private key file")
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+def do_migrate(args):
+    url = _get_url(args)
+    keyfile = _get_keyfile(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = IdentityClient(base_url=url, keyfile=keyfile)
+
+    result = IdentityMigrator(
+        client,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        page_size=args.page_size).run(
+            dry_run=args.dry_run,
+            auth_user=auth_user,
+            auth_password=auth_password)
+
+    print('Scanned {} buckets, {} legacy, {} migrations sent, {} failed '
+          'in {:.1f}s'.format(
+              result.scanned, result.legacy, result.submitted,
+              result.failed, result.seconds))
 
 
 # might need this for update, add the corresponding parser and add it into
@@ -446,6 +964,11 @@ def _get_keyfile(args):
 
     return '{}/{}.priv'.format(key_dir, username)
 
+def _get_tracer(args):
+    if args.trace is None:
+        return None
+    return TraceWriter(args.trace, source='client')
+
 # Only the XO file has this function so done.
 def _get_auth_info(args):
     auth_user = args.auth_user
@@ -476,6 +999,18 @@ def main(prog_name=os.path.basename(sys.argv[0]), args=None):
         do_show(args)
     elif args.command == 'delete':
         do_delete(args)
+    elif args.command == 'update':
+        do_update(args)
+    elif args.command == 'rename':
+        do_rename(args)
+    elif args.command == 'export':
+        do_export(args)
+    elif args.command == 'history':
+        do_history(args)
+    elif args.command == 'stats':
+        do_stats(args)
+    elif args.command == 'migrate':
+        do_migrate(args)
     else:
         raise IdentityException("invalid command: {}".format(args.command))
 
@@ -13,42 +13,129 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
-import hashlib
 import base64
+import collections
+import concurrent.futures
 from base64 import b64encode
+import json
 import time
 import requests
+import requests.adapters
 import yaml
-import pickle
 
 from sawtooth_signing import create_context
 from sawtooth_signing import CryptoFactory
 from sawtooth_signing import ParseError
 from sawtooth_signing.secp256k1 import Secp256k1PrivateKey
 
-from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader, Transaction
-from sawtooth_sdk.protobuf.batch_pb2 import BatchList, BatchHeader, Batch
+from google.protobuf import json_format
 
+from sawtooth_sdk.protobuf.batch_pb2 import Batch
+from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader
+from sawtooth_sdk.protobuf.transaction_pb2 import Transaction
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.identity_codec import decode_identities
 from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_table import IdentityTable
+from sawtooth_identity.identity_txn_builder import FAMILY_NAME
+from sawtooth_identity.identity_txn_builder import IDENTITY_PREFIX
+from sawtooth_identity.identity_txn_builder import IdentityTransactionBuilder
+from sawtooth_identity.identity_txn_builder import identity_address
+
+DEFAULT_SHOW_CONCURRENCY = 16
+
+def _find_identity(name, data):
+    # Several names can share an address, find the one asked for
+    for identity in decode_identities(data):
+        if identity.name == name:
+            return identity
+    return None
+
+
+class StatePage(object):
+    """One page of the identity namespace, read at block head. entries is
+    a list of (address, serialized identities) pairs; next_position is the
+    paging position of the following page, or None for the last page.
+    """
+
+    __slots__ = ('head', 'entries', 'next_position')
+
+    def __init__(self, head, entries, next_position):
+        self.head = head
+        self.entries = entries
+        self.next_position = next_position
+
+
+class StateDelta(object):
+    """The identity state changes between two block heads. changes maps
+    each address written since the old head to its serialized identities
+    at the new head, or to None if the address was deleted.
+    """
+
+    __slots__ = ('since', 'head', 'changes')
+
+    def __init__(self, since, head, changes):
+        self.since = since
+        self.head = head
+        self.changes = changes
+
+
+def _batch_from_json(batch, family_name):
+    # A Batch of the transactions of family_name in a REST API batch
+    transactions = []
+    try:
+        for transaction in batch["transactions"]:
+            if transaction["header"]["family_name"] != family_name:
+                continue
+            transactions.append(Transaction(
+                header=json_format.ParseDict(
+                    transaction["header"], TransactionHeader(),
+                    ignore_unknown_fields=True).SerializeToString(),
+                header_signature=transaction["header_signature"],
+                payload=base64.b64decode(transaction["payload"])))
+
+        header = json_format.ParseDict(
+            batch["header"], BatchHeader(), ignore_unknown_fields=True)
+    except (KeyError, TypeError, ValueError,
+            json_format.ParseError) as err:
+        raise IdentityException('Failed to decode batch: {}'.format(err))
+
+    return Batch(
+        header=header.SerializeToString(),
+        header_signature=batch["header_signature"],
+        transactions=transactions)
+
 
-# The Transaction Family Name
-FAMILY_NAME='identity'
+class IdentityClient:
+    def __init__(self, base_url, keyfile=None, signer=None, read_cache=None,
+                 tracer=None, family_version=LEGACY_FAMILY_VERSION):
 
-def _sha512(data):
-    return hashlib.sha512(data).hexdigest()
+        # Base url of http address
+        self._base_url = base_url
 
+        # An IdentityReadCache serves repeated show calls without a request
+        self._read_cache = read_cache
 
-class IdentityClient:
-    def __init__(self, base_url, keyfile=None):
+        # Builds the transactions of the signer, created on first use.
+        # Version 0.2 needs transaction processors that register it.
+        self._builder = None
+        self._family_version = family_version
+
+        # A TraceWriter records where the time of each transaction goes
+        self._tracer = tracer
+
+        # A signer may be given directly, e.g. by tools that generate keys
+        if signer is not None:
+            self._signer = signer
+            return
 
         # Checks to see if keyfile is provided
         if keyfile is None:
             self._signer = None
             return
 
-        # Base url of http address
-        self._base_url = base_url
-
         # Open keyfile to read private key
         try:
             with open(keyfile) as fd:
@@ -78,54 +165,74 @@ class IdentityClient:
     # 2. Create a transaction and a batch
     # 3. Send to rest-api
 
-    def create(self, name, date_of_birth, gender, auth_user=None, auth_password=None):
+    def create(self, name, date_of_birth, gender, wait=None, auth_user=None,
+               auth_password=None):
         return self._send_identity_txn(
             "create",
             name,
             date_of_birth=date_of_birth,
             gender=gender,
+            wait=wait,
             auth_user=auth_user,
             auth_password=auth_password)
 
-    def delete(self, name, auth_user=None, auth_password=None):
+    def delete(self, name, wait=None, auth_user=None, auth_password=None):
         return self._send_identity_txn(
             "delete",
             name,
+            wait=wait,
+            auth_user=auth_user,
+            auth_password=auth_password)
+
+    def rename(self, name, new_name, wait=None, auth_user=None,
+               auth_password=None):
+        return self._send_identity_txn(
+            "rename",
+            name,
+            new_name=new_name,
+            wait=wait,
             auth_user=auth_user,
             auth_password=auth_password)
 
-    def update(self, name, parameter, value, auth_user=None, auth_password=None):
-        # Retrieving the current payload with the provided name
-        old_payload = self.show(name)
-
-        if old_payload is not None:
-            if parameter == 'name':
-                name = value
-                date_of_birth = old_payload["Date_of_birth"]
-                gender = old_payload["Gender"]
-            elif parameter == 'date_of_birth':
-                name = name
-                date_of_birth = value
-                gender = old_payload["Gender"]
-            elif parameter = 'gender':
-                name = name
-                date_of_birth = old_payload["Date_of_birth"]
-                gender = value
+    def update(self, name, parameter, value, expected_version=None,
+               wait=None, auth_user=None, auth_password=None):
+        # The new name maps to a different address, so a name change is
+        # a rename of the record rather than an update in place
+        if parameter == 'name':
+            return self.rename(
+                name,
+                value,
+                wait=wait,
+                auth_user=auth_user,
+                auth_password=auth_password)
+
+        # Only the changed field is sent, the transaction processor merges
+        # it into the identity in state, so there is no need to read it
+        # first.
+        if parameter == 'date_of_birth':
+            date_of_birth, gender = value, ''
+        elif parameter == 'gender':
+            date_of_birth, gender = '', value
         else:
             raise IdentityException("Invalid parameter provided: {}".format(parameter))
 
-        # Return new payload
         return self._send_identity_txn(
             "update",
             name,
             date_of_birth,
             gender,
+            expected_version=expected_version,
+            wait=wait,
             auth_user=auth_user,
             auth_password=auth_password)
 
-    # List all addresses starting with the identity prefix
+    @property
+    def read_cache(self):
+        return self._read_cache
+
+    # Lists the identities at all addresses starting with the identity
+    # prefix, as one list of Identity objects per address
     def list(self, auth_user=None, auth_password=None):
-        identity_prefix = self._get_prefix()
 
         # this is like doing curl http://rest-api:8008/state?address=....
         # the result will be a dictionary that contains a data, head, link and paging.
@@ -151,26 +258,246 @@ class IdentityClient:
         #     "start": null
         #   }
         # }
-        result = self._send_request(
-            "state?address={}".format(identity_prefix),
-            auth_user=auth_user,
-            auth_password=auth_password)
-
         try:
-            # this will retrieve the value with the "data" key.
-            encoded_entries = yaml.safe_load(result)["data"]
-
             return [
-                # returns a list of dicts (payload)
-                pickle.loads(base64.b64decode(entry["data"]))
-                for entry in encoded_entries
+                # one list of Identity objects per address
+                decode_identities(data)
+                for data in self.get_state_entries(
+                    auth_user=auth_user,
+                    auth_password=auth_password).values()
             ]
 
         except BaseException:
             return None
 
-    # Show the address that is tied to this public key
-    def show(self, name, auth_user=None, auth_password=None):
+    # All identities as a compact IdentityTable, built page by page so
+    # the decoded state is never held as objects
+    def list_table(self, auth_user=None, auth_password=None):
+        return IdentityTable.from_pages(
+            self.iter_state_pages(
+                auth_user=auth_user,
+                auth_password=auth_password))
+
+    # Raw state of the identity namespace, e.g. to seed an IdentityDryRun
+    def get_state_entries(self, auth_user=None, auth_password=None):
+        # returns a dict of address, serialized identities pairs
+        return {
+            address: data
+            for page in self.iter_state_pages(
+                auth_user=auth_user,
+                auth_password=auth_password)
+            for address, data in page.entries
+        }
+
+    # Walk the identity namespace one page at a time, so callers never
+    # hold more than a page of state in memory
+    def iter_state_pages(self, start=None, head=None, limit=1000,
+                         auth_user=None, auth_password=None):
+        """Yields the identity namespace as StatePages.
+
+        Args:
+            start (str): Paging position to resume from, the next_position
+                of a previously returned page.
+            head (str): Block id to read state at. If not given, the head
+                of the first page is used for every following page, so the
+                pages are a consistent view of state.
+            limit (int): Number of entries per page.
+        """
+        while True:
+            query = "state?address={}&limit={}".format(
+                self._get_prefix(), limit)
+            if head is not None:
+                query += "&head={}".format(head)
+            if start is not None:
+                query += "&start={}".format(start)
+
+            result = self._send_request(
+                query,
+                auth_user=auth_user,
+                auth_password=auth_password)
+
+            try:
+                # The REST API returns JSON, which json parses far faster
+                # than yaml for large pages
+                response = json.loads(result)
+                page = StatePage(
+                    head=response["head"],
+                    entries=[
+                        (entry["address"], base64.b64decode(entry["data"]))
+                        for entry in response["data"]
+                    ],
+                    next_position=response.get(
+                        "paging", {}).get("next_position"))
+            except (ValueError, KeyError, TypeError) as err:
+                raise IdentityException(
+                    'Failed to decode state page: {}'.format(err))
+
+            yield page
+
+            if page.next_position is None:
+                return
+            head = page.head
+            start = page.next_position
+
+    # List only the identities changed since an earlier head, so callers
+    # that poll pay for the changes rather than for the whole namespace
+    def list_changes(self, since, head=None, auth_user=None,
+                     auth_password=None):
+        """Returns the identity state changes between two heads.
+
+        The blocks from head back to since are walked, and the receipts of
+        their identity transactions give the state changes; the last
+        change to each address wins.
+
+        Args:
+            since (str): Block id of the earlier head, e.g. the head of a
+                previous list or list_changes call.
+            head (str): Block id of the later head. The current chain head
+                if not given.
+
+        Returns:
+            (StateDelta): The changes, and the head they were read at.
+
+        Raises:
+            IdentityException: If since is not an ancestor of head, or the
+                receipt of a transaction in between is missing, e.g.
+                pruned by the validator: the changes would be incomplete.
+        """
+        blocks = []
+        head_id = None
+        for block_head, block in self._iter_blocks(
+                head=head,
+                auth_user=auth_user,
+                auth_password=auth_password):
+            if head_id is None:
+                head_id = block_head
+            if block["header_signature"] == since:
+                break
+            blocks.append(block)
+        else:
+            raise IdentityException(
+                'Block {} is not an ancestor of {}'.format(
+                    since, head_id or head))
+
+        # Blocks were walked newest first, changes must be applied oldest
+        # first
+        txn_ids = [
+            transaction["header_signature"]
+            for block in reversed(blocks)
+            for batch in block["batches"]
+            for transaction in batch["transactions"]
+            if transaction["header"]["family_name"] == FAMILY_NAME
+        ]
+
+        receipts = self._get_receipts(
+            txn_ids,
+            auth_user=auth_user,
+            auth_password=auth_password)
+
+        missing = [txn_id for txn_id in txn_ids if txn_id not in receipts]
+        if missing:
+            raise IdentityException(
+                'Missing receipts of {} transactions since {}, e.g. {}'
+                .format(len(missing), since, missing[0]))
+
+        prefix = self._get_prefix()
+        changes = collections.OrderedDict()
+        for txn_id in txn_ids:
+            for change in receipts[txn_id]:
+                address = change["address"]
+                if not address.startswith(prefix):
+                    continue
+                changes.pop(address, None)
+                if change["type"] == "DELETE":
+                    changes[address] = None
+                else:
+                    changes[address] = base64.b64decode(change["value"])
+
+        delta = StateDelta(since=since, head=head_id, changes=changes)
+
+        if self._read_cache is not None:
+            # Writes of this client committed in these blocks are no longer
+            # pending
+            self._read_cache.settle(
+                batch["header_signature"]
+                for block in blocks
+                for batch in block["batches"])
+            # Only a delta up to the chain head brings cached values up to
+            # date
+            if head is None:
+                self._read_cache.apply_delta(delta)
+
+        return delta
+
+    def get_committed_batches(self, since=None, head=None, auth_user=None,
+                              auth_password=None):
+        """Returns the committed batches of identity transactions, oldest
+        first, e.g. to rebuild state offline with identity-rebuild.
+
+        The REST API returns headers as JSON, so they are serialized again
+        from it. Transactions of other families are left out of their
+        batches, they cannot change identity state.
+
+        Args:
+            since (str): Block id to start after. From genesis if not
+                given.
+            head (str): Block id to end at. The current chain head if not
+                given.
+
+        Returns:
+            (str, list of Batch): The head the blocks were read at, and
+                the batches.
+
+        Raises:
+            IdentityException: If since is not an ancestor of head.
+        """
+        blocks = []
+        head_id = None
+        found = since is None
+        for block_head, block in self._iter_blocks(
+                head=head,
+                auth_user=auth_user,
+                auth_password=auth_password):
+            if head_id is None:
+                head_id = block_head
+            if block["header_signature"] == since:
+                found = True
+                break
+            # Only the identity batches are kept while walking back
+            blocks.append([
+                batch for batch in (
+                    _batch_from_json(batch, FAMILY_NAME)
+                    for batch in block["batches"])
+                if batch.transactions
+            ])
+
+        if not found:
+            raise IdentityException(
+                'Block {} is not an ancestor of {}'.format(
+                    since, head_id or head))
+
+        return head_id, [
+            batch for batches in reversed(blocks) for batch in batches]
+
+    def sync_read_cache(self, auth_user=None, auth_password=None):
+        """Brings the read cache up to the chain head with the changes
+        since the last head a value was read at, instead of letting every
+        entry expire.
+        """
+        cache = self._read_cache
+        if cache is None or cache.head is None:
+            return
+        try:
+            self.list_changes(
+                cache.head,
+                auth_user=auth_user,
+                auth_password=auth_password)
+        except IdentityException:
+            # The cached head is no longer on the chain, e.g. after a fork
+            cache.clear()
+
+    # Show the identity with this name
+    def show(self, name, fresh=False, auth_user=None, auth_password=None):
 
         # this follows a similar format to the one above however
         # the data key has the encoded payload as its corresponding value
@@ -179,69 +506,256 @@ class IdentityClient:
         #   "head": "3c4960bc71ceb625ff71318aec932708046b0efd8e1a33b322...",
         #   "link": "http://rest-api:8008/state/1cf1261883383c17490deb8...",
         # }
+        # fresh bypasses the read cache, e.g. to read back a write
+        try:
+            data = self._read_state(
+                self._get_address(name),
+                fresh=fresh,
+                auth_user=auth_user,
+                auth_password=auth_password)
+
+            return _find_identity(name, data)
+
+        except BaseException:
+            return None
+
+    def show_many(self, names, concurrency=DEFAULT_SHOW_CONCURRENCY,
+                  fresh=False, auth_user=None, auth_password=None):
+        """Looks up many identities concurrently.
+
+        Requests share one pooled connection per worker, and at most
+        concurrency of them are in flight at a time.
+
+        Args:
+            names (iterable of str): Names of the identities to show.
+            concurrency (int): Maximum number of concurrent requests.
+            fresh (bool): Read every identity from the REST API, bypassing
+                the read cache.
+
+        Yields:
+            (str, Identity): Each name and its identity, or None if there
+                is no identity with that name, in the order of names.
+        """
+        names = list(names)
+        addresses = [self._get_address(name) for name in names]
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        def fetch(name, address):
+            try:
+                data = self._read_state(
+                    address,
+                    fresh=fresh,
+                    auth_user=auth_user,
+                    auth_password=auth_password,
+                    session=session)
+            except IdentityException as err:
+                # A name that was never created has no state
+                if getattr(err, 'status_code', None) == 404:
+                    return None
+                raise
+            return _find_identity(name, data)
+
+        with session, concurrent.futures.ThreadPoolExecutor(
+                max_workers=concurrency) as executor:
+            # Keep a bounded window of requests ahead of the consumer, so
+            # results stream out in order without queueing every name
+            pending = collections.deque()
+            position = 0
+            while position < len(names) or pending:
+                while position < len(names) and \
+                        len(pending) < 2 * concurrency:
+                    name = names[position]
+                    pending.append((name, executor.submit(
+                        fetch, name, addresses[position])))
+                    position += 1
+
+                name, future = pending.popleft()
+                yield name, future.result()
+
+    def _get_status(self, batch_id, wait, auth_user=None, auth_password=None):
         result = self._send_request(
-            "state/{}".format(self._get_address(name)),
+            'batch_statuses?id={}&wait={}'.format(batch_id, wait),
             auth_user=auth_user,
             auth_password=auth_password)
+        try:
+            return json.loads(result)['data'][0]
+        except (ValueError, KeyError, IndexError, TypeError) as err:
+            raise IdentityException(
+                'Failed to decode batch status: {}'.format(err))
+
+    def _wait_for_batch(self, batch_id, wait, auth_user=None,
+                        auth_password=None):
+        # Returns the status of the batch once it is no longer pending, or
+        # PENDING if it still is after wait seconds
+        wait_time = 0
+        start_time = time.time()
+        while True:
+            status = self._get_status(
+                batch_id,
+                max(1, int(wait - wait_time)),
+                auth_user=auth_user,
+                auth_password=auth_password)
+            wait_time = time.time() - start_time
+
+            # Reads of the addresses written may be cached again, they
+            # either have the new values or never will
+            if status['status'] != 'PENDING' and \
+                    self._read_cache is not None:
+                self._read_cache.settle([batch_id])
+
+            if status['status'] == 'INVALID':
+                reasons = [
+                    transaction.get('message', '')
+                    for transaction in status.get('invalid_transactions', [])
+                ]
+                raise IdentityException('Batch {} is invalid: {}'.format(
+                    batch_id, '; '.join(reasons) or 'no reason given'))
+
+            if status['status'] != 'PENDING' or wait_time >= wait:
+                return status['status']
+
+    def _read_state(self, address, fresh=False, auth_user=None,
+                    auth_password=None, session=None):
+        # Returns the serialized identities at address, from the read cache
+        # when it holds a current value
+        cache = self._read_cache
+        if cache is not None and not fresh:
+            entry = cache.get(address)
+            if entry is None and cache.get_stale(address) is not None:
+                # One small request for the chain head tells whether the
+                # stale value may still be served
+                entry = cache.revalidate(address, self._get_head(
+                    auth_user=auth_user,
+                    auth_password=auth_password,
+                    session=session))
+            if entry is not None:
+                return entry.data
+
+        result = self._send_request(
+            "state/{}".format(address),
+            auth_user=auth_user,
+            auth_password=auth_password,
+            session=session)
 
         try:
-            # returns a dict (payload)
-            return pickle.loads(
-                base64.b64decode(
-                    yaml.safe_load(result)["data"]))
+            response = json.loads(result)
+            data = base64.b64decode(response["data"])
+        except (ValueError, KeyError, TypeError) as err:
+            raise IdentityException(
+                'Failed to decode state: {}'.format(err))
 
-        except BaseException:
-            return None
+        if cache is not None:
+            cache.put(address, data, response.get("head"))
+
+        return data
 
-    # def _get_status(self, batch_id, wait, auth_user=None, auth_password=None):
-    #     try:
-    #         result = self._send_request(
-    #             'batch_statuses?id={}&wait={}'.format(batch_id, wait),
-    #             auth_user=auth_user,
-    #             auth_password=auth_password)
-    #         return yaml.safe_load(result)['data'][0]['status']
-    #     except BaseException as err:
-    #         raise IdentityException(err)
+    def _get_head(self, auth_user=None, auth_password=None, session=None):
+        result = self._send_request(
+            "blocks?limit=1",
+            auth_user=auth_user,
+            auth_password=auth_password,
+            session=session)
+        try:
+            return json.loads(result)["head"]
+        except (ValueError, KeyError, TypeError) as err:
+            raise IdentityException(
+                'Failed to decode block page: {}'.format(err))
+
+    def _iter_blocks(self, head=None, limit=100, auth_user=None,
+                     auth_password=None):
+        # Yields (head, block) pairs from head back towards genesis
+        start = None
+        while True:
+            query = "blocks?limit={}".format(limit)
+            if head is not None:
+                query += "&head={}".format(head)
+            if start is not None:
+                query += "&start={}".format(start)
+
+            result = self._send_request(
+                query,
+                auth_user=auth_user,
+                auth_password=auth_password)
+
+            try:
+                response = json.loads(result)
+                head = response["head"]
+                blocks = response["data"]
+                start = response.get("paging", {}).get("next_position")
+            except (ValueError, KeyError, TypeError) as err:
+                raise IdentityException(
+                    'Failed to decode block page: {}'.format(err))
+
+            for block in blocks:
+                yield head, block
+
+            if start is None:
+                return
+
+    def _get_receipts(self, txn_ids, chunk_size=100, auth_user=None,
+                      auth_password=None):
+        # Returns a dict of transaction id, state changes pairs. Ids are
+        # requested in chunks to keep the query string short.
+        receipts = {}
+        for offset in range(0, len(txn_ids), chunk_size):
+            result = self._send_request(
+                "receipts?id={}".format(
+                    ",".join(txn_ids[offset:offset + chunk_size])),
+                auth_user=auth_user,
+                auth_password=auth_password)
+
+            try:
+                for receipt in json.loads(result)["data"]:
+                    receipts[receipt["id"]] = receipt["state_changes"]
+            except (ValueError, KeyError, TypeError) as err:
+                raise IdentityException(
+                    'Failed to decode receipts: {}'.format(err))
+
+        return receipts
 
     def _get_prefix(self):
-        return _sha512(FAMILY_NAME.encode('utf-8'))[0:6]
+        return IDENTITY_PREFIX
 
     def _get_address(self, name):
-        prefix = self._get_prefix()
-        infix = _sha512(name.encode('utf-8'))[0:6]
-        suffix = _sha512(self._signer.get_public_key().as_hex().encode('utf-8'))[-58:]
-        return prefix + infix + suffix
+        # Must match _make_identity_address in the transaction processor
+        return identity_address(name)
 
     def _send_request(self,
                       suffix,
                       data=None,
                       content_type=None,
                       auth_user=None,
-                      auth_password=None):
+                      auth_password=None,
+                      session=None):
         if self._base_url.startswith("http://"):
             url = "{}/{}".format(self._base_url, suffix)
         else:
             url = "http://{}/{}".format(self._base_url, suffix)
 
+        headers = {}
+
         if auth_user is not None:
             auth_string = "{}:{}".format(auth_user, auth_password)
             b64_string = b64encode(auth_string.encode()).decode()
             auth_header = 'Basic {}'.format(b64_string)
             headers['Authorization'] = auth_header
 
-        headers = {}
         if content_type is not None:
             headers['Content-Type'] = content_type
 
+        # A session reuses its connections across requests
+        http = requests if session is None else session
+
         try:
             if data is not None:
-                result = requests.post(url, headers=headers, data=data)
+                result = http.post(url, headers=headers, data=data)
             else:
-                result = requests.get(url, headers=headers)
-
-            if not result.ok:
-                raise IdentityException("Error {}: {}".format(
-                    result.status_code, result.reason))
+                result = http.get(url, headers=headers)
 
         except requests.ConnectionError as err:
             raise IdentityException(
@@ -250,6 +764,12 @@ class IdentityClient:
         except BaseException as err:
             raise IdentityException(err)
 
+        if not result.ok:
+            error = IdentityException("Error {}: {}".format(
+                result.status_code, result.reason))
+            error.status_code = result.status_code
+            raise error
+
         return result.text
 
     def _send_identity_txn(self,
@@ -257,108 +777,120 @@ class IdentityClient:
                            name,
                            date_of_birth='',
                            gender='',
-                           # wait=None,
+                           new_name='',
+                           expected_version=None,
+                           wait=None,
                            auth_user=None,
                            auth_password=None):
 
-        # Payload is a dict with 4 key value pairs
-        payload = {
-            'Action': action
-            'Name': name,
-            'Date_of_birth': date_of_birth,
-            'Gender': gender
-        }
-
-        # Serialisation is via pickle
-        payload_bytes = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
-
-        # Construct the address
-        # In this example, input and output addresses are the same
-        address = self._get_address(name)
-
-        header_bytes = TransactionHeader(
-
-            # Public key of the client that signed this transaction
-            signer_public_key=self._signer.get_public_key().as_hex(),
-            family_name=FAMILY_NAME,
-            family_version="0.1",
-            inputs=[address],
-            outputs=[address],
-            dependencies=[],
-
-            # Payload encrypted with sha512
-            payload_sha512=_sha512(payload_bytes),
-
-            # Public key of the signer that signed the batch which
-            # contains this transaction
-            batcher_public_key=self._signer.get_public_key().as_hex(),
-            nonce=time.time().hex().encode()
-        ).SerializeToString()
+        tracer = self._tracer
+        timings = {} if tracer is not None else None
 
-        # Signing this transaction
-        signature = self._signer.sign(header_bytes)
-
-        transaction = Transaction(
-            header=header_bytes,
-            payload=payload_bytes,
-            header_signature=signature
-        )
+        transaction = self._get_builder().build(
+            action,
+            name,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            new_name=new_name,
+            expected_version=expected_version,
+            timings=timings)
+        trace = transaction.header_signature
 
         batch_list = self._create_batch_list([transaction])
         batch_id = batch_list.batches[0].header_signature
 
-        # If you remove the wait parameter, this section of code
-        # can be removed as well.   
-        # if wait and wait > 0:
-        #     wait_time = 0
-        #     start_time = time.time()
-        #     response = self._send_request(
-        #         "batches", 
-        #         batch_list.SerializeToString(),
-        #         'application/octet-stream',
-        #         auth_user=auth_user,
-        #         auth_password=auth_password)
-        #     while wait_time < wait:
-        #         status = self._get_status(
-        #             batch_id,
-        #             wait - int(wait_time),
-        #             auth_user=auth_user,
-        #             auth_password=auth_password)
-        #         wait_time = time.time() - start_time
-
-        #         if status != 'PENDING':
-        #             return response
-
-        #     return response
-
+        if tracer is None:
+            response = self._send_batch_list(
+                batch_list,
+                auth_user=auth_user,
+                auth_password=auth_password)
+        else:
+            for span, (start, seconds) in timings.items():
+                tracer.record(trace, span, start, seconds, action=action)
+            with tracer.span(trace, 'submit', batch=batch_id):
+                response = self._send_batch_list(
+                    batch_list,
+                    auth_user=auth_user,
+                    auth_password=auth_password)
+
+        # Waiting gives the time until the batch is committed, so the time
+        # spent in the validator shows up in the trace
+        if wait and wait > 0:
+            if tracer is None:
+                self._wait_for_batch(
+                    batch_id, wait,
+                    auth_user=auth_user,
+                    auth_password=auth_password)
+            else:
+                with tracer.span(trace, 'commit_wait', batch=batch_id):
+                    self._wait_for_batch(
+                        batch_id, wait,
+                        auth_user=auth_user,
+                        auth_password=auth_password)
+
+        return response
+
+    def _send_batch_list(self, batch_list, auth_user=None, auth_password=None):
+        # Cached values of the addresses written are about to change, and
+        # reads of them are not cached until the batches are settled
+        cache = self._read_cache
+        if cache is not None:
+            header = TransactionHeader()
+            for batch in batch_list.batches:
+                outputs = []
+                for transaction in batch.transactions:
+                    header.ParseFromString(transaction.header)
+                    outputs.extend(header.outputs)
+                cache.mark_pending(batch.header_signature, outputs)
+
+        # A failed submit may still have reached the validator, so the
+        # addresses stay pending until the batches are seen settled or
+        # expire
         return self._send_request(
-            "batches", 
+            "batches",
             batch_list.SerializeToString(),
             'application/octet-stream',
             auth_user=auth_user,
             auth_password=auth_password)
 
-    def _create_batch_list(self, transactions):
-
-        # transaction_signatures must be in the same order that is listed
-        # in transactions
-        transaction_signatures = [t.header_signature for t in transactions]
-
-        header_bytes = BatchHeader(
-            # Public key of the signer of this batch
-            signer_public_key=self._signer.get_public_key().as_hex(),
-            transaction_ids=transaction_signatures
-        ).SerializeToString()
-
-        # Signing the batch
-        signature = self._signer.sign(header_bytes)
-
-        batch = Batch(
-            header=header_bytes,
-            transactions=transactions,
-            header_signature=signature
-        )
+    def _get_identity_addresses(self, action, name, new_name=''):
+        # In this example, input and output addresses are the same.
+        # A rename reads and writes both the old and the new address.
+        addresses = [self._get_address(name)]
+        if action == 'rename':
+            addresses.append(self._get_address(new_name))
+        return addresses
+
+    def _create_identity_txn(self,
+                             action,
+                             name,
+                             date_of_birth='',
+                             gender='',
+                             new_name='',
+                             expected_version=None,
+                             dependencies=None,
+                             nonce=None):
+
+        # Payload is a pickled dict of the action, the name, the date of
+        # birth and the gender, signed with a header whose inputs and
+        # outputs are the addresses of the names
+        return self._get_builder().build(
+            action,
+            name,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            new_name=new_name,
+            expected_version=expected_version,
+            dependencies=dependencies,
+            nonce=nonce)
 
+    def _create_batch_list(self, transactions):
         # In order to submit batches to validator, they must be in a BatchList
-        # Multiple (optionally dependent) batches for 1 BatchList
-        return BatchList(batches=[batch])
+        return self._get_builder().build_batch_list(transactions)
+
+    def _get_builder(self):
+        # The builder encodes what is constant for the signer only once
+        if self._builder is None:
+            self._builder = IdentityTransactionBuilder(
+                self._signer, family_version=self._family_version)
+        return self._builder
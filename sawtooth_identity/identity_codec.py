@@ -0,0 +1,231 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Encoding of the identity buckets stored in state and of transaction
+payloads, shared by the transaction processor and every client read path.
+
+Transactions of family version 0.1 carry a pickled dict payload and write
+buckets as a pickled list of Identity objects. Version 0.2 transactions
+carry a compact payload and write compact buckets: a 0x02 header byte
+followed by length prefixed fields, with signer public keys stored as raw
+bytes. Both versions read buckets of either encoding, and a bucket that is
+compact stays compact whichever version writes it next.
+
+No pickle starts with the 0x02 flag (the pickles in state start with the
+PROTO opcode 0x80), so values without it, written before the compact
+encoding existed, decode as they always have.
+"""
+
+import binascii
+import pickle
+
+
+LEGACY_FAMILY_VERSION = '0.1'
+COMPACT_FAMILY_VERSION = '0.2'
+FAMILY_VERSIONS = (LEGACY_FAMILY_VERSION, COMPACT_FAMILY_VERSION)
+
+_FLAG_COMPACT = 0x02
+
+# Owners that are hex strings, i.e. public keys, are stored as raw bytes
+_OWNER_TEXT = 0
+_OWNER_HEX = 1
+
+# Actions of compact payloads, by their one byte code
+_ACTIONS = ('create', 'update', 'delete', 'rename', 'migrate')
+_ACTION_CODES = {action: code for code, action in enumerate(_ACTIONS, 1)}
+
+
+def encode_identities(identities, compact=False):
+    """Serializes a list of Identity objects for state.
+
+    Args:
+        identities (list of Identity): The bucket.
+        compact (bool): Use the compact encoding instead of pickle.
+
+    Returns:
+        (bytes): The state value.
+    """
+    if compact:
+        return bytes((_FLAG_COMPACT,)) + _encode_compact(identities)
+    return pickle.dumps(identities, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_identities(data):
+    """Deserializes a state value into a list of Identity objects.
+
+    Raises:
+        ValueError: The value is not an identity bucket.
+    """
+    if not data:
+        raise ValueError('Empty identity state value')
+
+    # Values without the flag are plain pickles
+    if data[0] == _FLAG_COMPACT:
+        return _decode_compact(data[1:])
+
+    try:
+        return pickle.loads(data)
+    except (pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError) as err:
+        raise ValueError('Corrupt identity state: {}'.format(err))
+
+
+def is_compact(data):
+    """Returns whether a state value is a compact bucket."""
+    return bool(data) and data[0] == _FLAG_COMPACT
+
+
+def encode_payload(action, name, date_of_birth='', gender='', new_name='',
+                   expected_version=None):
+    """Serializes a compact, family version 0.2, payload."""
+    out = bytearray((_ACTION_CODES[action],))
+    for value in (name, date_of_birth, gender, new_name):
+        _write_bytes(out, value.encode('utf-8'))
+    # 0 means no expected version
+    _write_varint(
+        out, 0 if expected_version is None else expected_version + 1)
+    return bytes(out)
+
+
+def decode_payload(data):
+    """Deserializes a compact payload into the dict a 0.1 payload pickles.
+
+    Raises:
+        ValueError: The payload is not a compact payload.
+    """
+    reader = _Reader(data)
+    code = reader.byte()
+    if not 0 < code <= len(_ACTIONS):
+        raise ValueError('Unknown action code: {}'.format(code))
+    payload = {
+        'Action': _ACTIONS[code - 1],
+        'Name': reader.text(),
+        'Date_of_birth': reader.text(),
+        'Gender': reader.text(),
+        'New_name': reader.text(),
+    }
+    expected_version = reader.varint()
+    if expected_version:
+        payload['Expected_version'] = expected_version - 1
+    reader.finish()
+    return payload
+
+
+def _encode_compact(identities):
+    out = bytearray()
+    _write_varint(out, len(identities))
+    for identity in identities:
+        for value in (identity.name, identity.date_of_birth,
+                      identity.gender):
+            _write_bytes(out, value.encode('utf-8'))
+        _write_owner(out, identity.owner)
+        _write_varint(out, identity.version)
+    return bytes(out)
+
+
+def _decode_compact(data):
+    # Imported here, the processor's state module imports this one
+    from sawtooth_identity.processor.identity_state import Identity
+
+    reader = _Reader(data)
+    identities = [
+        Identity(
+            name=reader.text(),
+            date_of_birth=reader.text(),
+            gender=reader.text(),
+            owner=reader.owner(),
+            version=reader.varint())
+        for _ in range(reader.varint())
+    ]
+    reader.finish()
+    return identities
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_bytes(out, value):
+    _write_varint(out, len(value))
+    out += value
+
+
+def _write_owner(out, owner):
+    try:
+        raw = binascii.unhexlify(owner)
+    except (binascii.Error, ValueError):
+        raw = None
+    # Only lowercase hex round trips through the raw bytes
+    if raw is not None and binascii.hexlify(raw).decode() == owner:
+        out.append(_OWNER_HEX)
+        _write_bytes(out, raw)
+    else:
+        out.append(_OWNER_TEXT)
+        _write_bytes(out, owner.encode('utf-8'))
+
+
+class _Reader(object):
+    __slots__ = ('_data', '_offset')
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def byte(self):
+        try:
+            value = self._data[self._offset]
+        except IndexError:
+            raise ValueError('Truncated compact value')
+        self._offset += 1
+        return value
+
+    def varint(self):
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def raw(self):
+        length = self.varint()
+        end = self._offset + length
+        if end > len(self._data):
+            raise ValueError('Truncated compact value')
+        value = self._data[self._offset:end]
+        self._offset = end
+        return bytes(value)
+
+    def text(self):
+        try:
+            return self.raw().decode('utf-8')
+        except UnicodeDecodeError as err:
+            raise ValueError('Invalid text in compact value: {}'.format(err))
+
+    def owner(self):
+        kind = self.byte()
+        if kind == _OWNER_HEX:
+            return binascii.hexlify(self.raw()).decode()
+        if kind == _OWNER_TEXT:
+            return self.text()
+        raise ValueError('Unknown owner encoding: {}'.format(kind))
+
+    def finish(self):
+        if self._offset != len(self._data):
+            raise ValueError('Trailing bytes in compact value')
@@ -0,0 +1,168 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import logging
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.processor.exceptions import InternalError
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.state_context_pb2 import TpStateEntry
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.processor.audit import AuditLog
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LocalStateContext(object):
+    """An in-memory stand-in for sawtooth_sdk.processor.context.Context.
+
+    Writes made while applying a transaction are buffered, and only become
+    visible to later transactions once commit() is called, the same way the
+    validator only keeps the state changes of valid transactions.
+    """
+
+    def __init__(self, entries=None):
+        """Constructor.
+
+        Args:
+            entries (dict): address (str) keys, serialized state (bytes)
+                values to start from, e.g. a cache or replica of state.
+        """
+        self._state = dict(entries) if entries else {}
+        self._pending = {}
+
+    @property
+    def entries(self):
+        return self._state
+
+    def get_state(self, addresses, timeout=None):
+        results = []
+        for address in addresses:
+            if address in self._pending:
+                data = self._pending[address]
+            else:
+                data = self._state.get(address)
+            if data:
+                results.append(TpStateEntry(address=address, data=data))
+        return results
+
+    def set_state(self, entries, timeout=None):
+        self._pending.update(entries)
+        return list(entries)
+
+    def delete_state(self, addresses, timeout=None):
+        for address in addresses:
+            self._pending[address] = None
+        return list(addresses)
+
+    def add_receipt_data(self, data, timeout=None):
+        pass
+
+    def add_event(self, event_type, attributes=None, data=None, timeout=None):
+        pass
+
+    def commit(self):
+        for address, data in self._pending.items():
+            if data is None:
+                self._state.pop(address, None)
+            else:
+                self._state[address] = data
+        self._pending = {}
+
+    def rollback(self):
+        self._pending = {}
+
+
+class IdentityDryRun(object):
+    """Runs identity transactions through the transaction processor's own
+    validation and IdentityTransactionHandler.apply against a local view of
+    state, so that transactions the validator would reject can be dropped
+    before they are submitted.
+    """
+
+    def __init__(self, entries=None, handler=None):
+        """Constructor.
+
+        Args:
+            entries (dict): address (str) keys, serialized state (bytes)
+                values, e.g. from IdentityClient.get_state_entries().
+            handler (IdentityTransactionHandler): The handler to apply
+                transactions with. A new one that audits nothing is
+                created if not given.
+        """
+        self._context = LocalStateContext(entries)
+        if handler is None:
+            # Checks are not transactions applied to the chain, and the CLI
+            # logs at DEBUG, which would audit every one of them
+            handler = IdentityTransactionHandler(
+                audit_log=AuditLog(sample_rate=0))
+        self._handler = handler
+        self._accepted = 0
+        self._rejected = 0
+
+    @property
+    def accepted(self):
+        return self._accepted
+
+    @property
+    def rejected(self):
+        return self._rejected
+
+    @property
+    def entries(self):
+        return self._context.entries
+
+    def check(self, transaction):
+        """Apply transaction to the local state view.
+
+        Args:
+            transaction (Transaction): A signed identity transaction.
+
+        Returns:
+            (str): None if the transaction is valid, and its state changes
+                are kept for the transactions that follow. Otherwise the
+                reason it would be rejected.
+        """
+        header = TransactionHeader()
+        header.ParseFromString(transaction.header)
+
+        request = TpProcessRequest(
+            header=header,
+            payload=transaction.payload,
+            signature=transaction.header_signature)
+
+        try:
+            self._handler.apply(request, self._context)
+        except (InvalidTransaction, InternalError) as err:
+            self._context.rollback()
+            self._rejected += 1
+            LOGGER.debug(
+                "Dry run rejected transaction %s: %s",
+                transaction.header_signature[:8], err)
+            return str(err)
+
+        self._context.commit()
+        self._accepted += 1
+        return None
+
+    def filter(self, transactions):
+        """Returns the transactions that would be accepted, in order."""
+        return [
+            transaction for transaction in transactions
+            if self.check(transaction) is None
+        ]
@@ -0,0 +1,288 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from sawtooth_identity.identity_codec import decode_identities
+from sawtooth_identity.identity_exceptions import IdentityException
+
+
+LOGGER = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+EXPORT_FIELDS = ('address', 'owner', 'name', 'date_of_birth', 'gender')
+
+# Pages fetched ahead of the writer. Bounds memory to a few pages no
+# matter how large the namespace is.
+_QUEUE_PAGES = 4
+
+
+class ExportResult(object):
+    def __init__(self, records, seconds):
+        self.records = records
+        self.seconds = seconds
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+
+class IdentityExporter(object):
+    """Streams the identity namespace to a gzip compressed JSONL or CSV file.
+
+    Pages are fetched from the REST API on the calling thread and decoded
+    and written on a worker thread. Every page is written as a complete
+    gzip member, after which the paging cursor is saved; an interrupted
+    export resumes from the cursor, truncating anything written after it.
+    An export is only resumed in the format it was started in, and starts
+    over if the output file is missing or shorter than the cursor says.
+    """
+
+    def __init__(self, client, output, export_format='jsonl',
+                 cursor_file=None, page_size=1000):
+        """Constructor.
+
+        Args:
+            client (IdentityClient): Client to read state with.
+            output (str): Path of the gzip file to write.
+            export_format (str): 'jsonl' or 'csv'.
+            cursor_file (str): Where the paging cursor is saved. If it
+                exists, the export resumes from it.
+            page_size (int): Number of state entries per page.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise IdentityException(
+                'Invalid export format: {}'.format(export_format))
+
+        self._client = client
+        self._output = output
+        self._format = export_format
+        self._cursor_file = cursor_file
+        self._page_size = page_size
+
+    def run(self, auth_user=None, auth_password=None):
+        """Run the export.
+
+        Returns:
+            (ExportResult): The number of records written by this run and
+                how long it took.
+        """
+        cursor = self._load_cursor()
+        if cursor is not None:
+            if cursor.get('format') != self._format:
+                raise IdentityException(
+                    'Export cursor {} is for a {} export, not {}; remove it '
+                    'to start over'.format(
+                        self._cursor_file, cursor.get('format'),
+                        self._format))
+            if _file_size(self._output) < cursor['offset']:
+                LOGGER.warning(
+                    "Export file %s is missing or truncated, starting over",
+                    self._output)
+                cursor = None
+
+        if cursor is None:
+            cursor = {
+                'format': self._format,
+                'head': None,
+                'start': None,
+                'records': 0,
+                'offset': 0,
+            }
+            with open(self._output, 'wb'):
+                pass
+        elif cursor.get('done'):
+            LOGGER.info("Export to %s is already complete", self._output)
+            return ExportResult(0, 0.0)
+        else:
+            LOGGER.info(
+                "Resuming export to %s after %s records",
+                self._output, cursor['records'])
+            with open(self._output, 'r+b') as fd:
+                fd.truncate(cursor['offset'])
+
+        pages = queue.Queue(maxsize=_QUEUE_PAGES)
+        writer = _PageWriter(self, pages, cursor)
+        writer.start()
+
+        start_time = time.time()
+        try:
+            for page in self._client.iter_state_pages(
+                    start=cursor['start'],
+                    head=cursor['head'],
+                    limit=self._page_size,
+                    auth_user=auth_user,
+                    auth_password=auth_password):
+                if writer.error is not None:
+                    break
+                pages.put(page)
+        finally:
+            pages.put(None)
+            writer.join()
+
+        if writer.error is not None:
+            raise IdentityException(
+                'Export failed: {}'.format(writer.error))
+
+        elapsed = time.time() - start_time
+        result = ExportResult(writer.records, elapsed)
+        LOGGER.info(
+            "Exported %s records in %.1fs (%.0f records/s)",
+            result.records, elapsed, result.records_per_second)
+
+        return result
+
+    def _load_cursor(self):
+        if self._cursor_file is None or \
+                not os.path.exists(self._cursor_file):
+            return None
+
+        try:
+            with open(self._cursor_file) as fd:
+                return json.load(fd)
+        except (OSError, ValueError) as err:
+            raise IdentityException(
+                'Unable to read export cursor {}: {}'.format(
+                    self._cursor_file, err))
+
+    def _save_cursor(self, cursor):
+        if self._cursor_file is None:
+            return
+
+        # Write then rename, so a crash never leaves a partial cursor
+        temp_file = self._cursor_file + '.tmp'
+        with open(temp_file, 'w') as fd:
+            json.dump(cursor, fd)
+        os.replace(temp_file, self._cursor_file)
+
+    def _encode_page(self, page, with_header):
+        buf = io.StringIO()
+        count = 0
+
+        if self._format == 'csv':
+            writer = csv.writer(buf)
+            if with_header:
+                writer.writerow(EXPORT_FIELDS)
+            for record in _decode_records(page):
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in _decode_records(page):
+                buf.write(json.dumps(dict(zip(EXPORT_FIELDS, record))))
+                buf.write('\n')
+                count += 1
+
+        return gzip.compress(buf.getvalue().encode('utf-8')), count
+
+
+class _PageWriter(threading.Thread):
+    def __init__(self, exporter, pages, cursor):
+        super().__init__(name='identity-export-writer', daemon=True)
+        self._exporter = exporter
+        self._pages = pages
+        self._cursor = cursor
+        self.records = 0
+        self.error = None
+
+    def run(self):
+        try:
+            with open(self._exporter._output, 'ab') as fd:
+                while True:
+                    page = self._pages.get()
+                    if page is None:
+                        return
+                    if self.error is None:
+                        self._write(fd, page)
+        except BaseException as err:  # pylint: disable=broad-except
+            self.error = err
+            # Keep draining so the fetching thread is never blocked
+            while self._pages.get() is not None:
+                pass
+
+    def _write(self, fd, page):
+        data, count = self._exporter._encode_page(
+            page, with_header=self._cursor['offset'] == 0)
+        fd.write(data)
+        fd.flush()
+        os.fsync(fd.fileno())
+
+        self.records += count
+        self._cursor = {
+            'format': self._cursor['format'],
+            'head': page.head,
+            'start': page.next_position,
+            'records': self._cursor['records'] + count,
+            'offset': fd.tell(),
+            'done': page.next_position is None,
+        }
+        self._exporter._save_cursor(self._cursor)
+
+
+def read_export(path, export_format=None):
+    """Yields the records of an export file as tuples of EXPORT_FIELDS.
+
+    Args:
+        path (str): Path of a file written by IdentityExporter.
+        export_format (str): 'jsonl' or 'csv'. Guessed from the file name
+            if not given.
+    """
+    if export_format is None:
+        export_format = 'csv' if '.csv' in os.path.basename(path) \
+            else 'jsonl'
+    if export_format not in EXPORT_FORMATS:
+        raise IdentityException(
+            'Invalid export format: {}'.format(export_format))
+
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as fd:
+        if export_format == 'csv':
+            reader = csv.reader(fd)
+            if tuple(next(reader, ())) != EXPORT_FIELDS:
+                raise IdentityException(
+                    'Not an identity CSV export: {}'.format(path))
+            for row in reader:
+                yield tuple(row)
+        else:
+            for line in fd:
+                record = json.loads(line)
+                yield tuple(record[field] for field in EXPORT_FIELDS)
+
+
+def _file_size(path):
+    # -1 if path does not exist
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return -1
+
+
+def _decode_records(page):
+    for address, data in page.entries:
+        for identity in decode_identities(data):
+            yield (
+                address,
+                identity.owner,
+                identity.name,
+                identity.date_of_birth,
+                identity.gender,
+            )
@@ -52,28 +52,39 @@ class IdentityMessageFactory:
         return pickle.loads(data)
 
     # done
-    def _create_txn(self, txn_function, action, name, date_of_birth='', gender=''):
+    def _create_txn(self, txn_function, action, name, date_of_birth='', gender='',
+                    new_name=''):
         payload = {
-            'Action': action
+            'Action': action,
             'Name': name,
             'Date_of_birth': date_of_birth,
             'Gender': gender
         }
 
-        payload_bytes = self._dumps(payload)
         addresses = [self._name_to_address(name)]
 
+        # A rename moves the identity to the address of the new name
+        if action == 'rename':
+            payload['New_name'] = new_name
+            addresses.append(self._name_to_address(new_name))
+
+        payload_bytes = self._dumps(payload)
+
         return txn_function(payload_bytes, addresses, addresses, [])
 
     # done
-    def create_tp_process_request(self, action, name, date_of_birth='', gender=''):
+    def create_tp_process_request(self, action, name, date_of_birth='', gender='',
+                                  new_name=''):
         txn_function = self._factory.create_tp_process_request
-        return self._create_txn(txn_function, action, name, date_of_birth, gender)
+        return self._create_txn(
+            txn_function, action, name, date_of_birth, gender, new_name)
 
     # done
-    def create_transaction(self, action, name, date_of_birth='', gender=''):
+    def create_transaction(self, action, name, date_of_birth='', gender='',
+                           new_name=''):
         txn_function = self._factory.create_transaction
-        return self._create_txn(txn_function, action, name, date_of_birth, gender)
+        return self._create_txn(
+            txn_function, action, name, date_of_birth, gender, new_name)
 
     # done
     def create_get_request(self, name):
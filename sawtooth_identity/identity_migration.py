@@ -0,0 +1,187 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Migrates identity state from pickled buckets to the compact encoding,
+while the network keeps serving transactions.
+
+The namespace is walked page by page, and every bucket still pickled is
+rewritten by a family version 0.2 migrate transaction, which any signer may
+send and which leaves the identities as they are. Transactions are sent at
+a bounded rate, in small BatchLists, and the rate is halved for a while
+whenever the REST API answers 429 Too Many Requests, so the migration
+takes a small share of the validator's throughput.
+
+Every transaction processor must register family version 0.2 before the
+migration starts. Buckets written by 0.1 transactions after their page was
+read are picked up by running the migration again; compact buckets are
+skipped, so it can be run until it finds none left.
+"""
+
+import logging
+import time
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import decode_identities
+from sawtooth_identity.identity_codec import is_compact
+from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_txn_builder import IdentityTransactionBuilder
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MIGRATION_RATE = 20.0
+DEFAULT_MIGRATION_BATCH_SIZE = 10
+
+_THROTTLED = 429
+
+
+class MigrationResult(object):
+    def __init__(self, scanned, legacy, submitted, failed, seconds):
+        self.scanned = scanned
+        self.legacy = legacy
+        self.submitted = submitted
+        self.failed = failed
+        self.seconds = seconds
+
+
+class IdentityMigrator(object):
+    def __init__(self, client, rate=DEFAULT_MIGRATION_RATE,
+                 batch_size=DEFAULT_MIGRATION_BATCH_SIZE, page_size=1000,
+                 max_retries=5, clock=time.monotonic, sleep=time.sleep):
+        """Constructor.
+
+        Args:
+            client (IdentityClient): Reads state and sends the
+                transactions; must have a signer.
+            rate (float): Most migrate transactions sent per second.
+            batch_size (int): Transactions per BatchList, one batch each
+                so a bucket deleted meanwhile fails alone.
+            page_size (int): Entries read per page of state.
+            max_retries (int): Attempts for a throttled BatchList before
+                it counts as failed.
+        """
+        if client._signer is None:
+            raise IdentityException('Migrating state requires a signer')
+
+        self._client = client
+        self._builder = IdentityTransactionBuilder(
+            client._signer, family_version=COMPACT_FAMILY_VERSION)
+        self._rate = rate
+        self._batch_size = batch_size
+        self._page_size = page_size
+        self._max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+
+        # Throttling halves the rate until this time
+        self._slow_until = 0.0
+        self._next_send = 0.0
+
+    def run(self, dry_run=False, auth_user=None, auth_password=None):
+        """Walks the namespace once, migrating the legacy buckets.
+
+        Args:
+            dry_run (bool): Only count the legacy buckets.
+
+        Returns:
+            (MigrationResult): What was scanned and sent.
+        """
+        start = time.time()
+        scanned = legacy = submitted = failed = 0
+        pending = []
+
+        for page in self._client.iter_state_pages(
+                limit=self._page_size,
+                auth_user=auth_user,
+                auth_password=auth_password):
+            for _, data in page.entries:
+                scanned += 1
+                if is_compact(data):
+                    continue
+                legacy += 1
+                if dry_run:
+                    continue
+
+                try:
+                    identities = decode_identities(data)
+                except ValueError as err:
+                    LOGGER.warning("Skipping undecodable bucket: %s", err)
+                    failed += 1
+                    continue
+
+                # Any name in the bucket leads to its address
+                pending.append(
+                    self._builder.build('migrate', identities[0].name))
+                if len(pending) >= self._batch_size:
+                    sent = self._send(pending, auth_user, auth_password)
+                    submitted += sent
+                    failed += len(pending) - sent
+                    pending = []
+
+            LOGGER.info(
+                "Scanned %s buckets, %s legacy, %s migrations sent",
+                scanned, legacy, submitted)
+
+        if pending:
+            sent = self._send(pending, auth_user, auth_password)
+            submitted += sent
+            failed += len(pending) - sent
+
+        return MigrationResult(
+            scanned=scanned,
+            legacy=legacy,
+            submitted=submitted,
+            failed=failed,
+            seconds=time.time() - start)
+
+    def _send(self, transactions, auth_user, auth_password):
+        # Returns how many of transactions were accepted by the REST API
+        batch_list = BatchList(batches=[
+            self._builder.build_batch([transaction])
+            for transaction in transactions
+        ])
+
+        for attempt in range(self._max_retries):
+            self._wait_for_slot(len(transactions))
+            try:
+                self._client._send_batch_list(
+                    batch_list,
+                    auth_user=auth_user,
+                    auth_password=auth_password)
+                return len(transactions)
+            except IdentityException as err:
+                if getattr(err, 'status_code', None) != _THROTTLED:
+                    LOGGER.warning("Migration batch rejected: %s", err)
+                    return 0
+                # Back off harder the longer the validator stays busy
+                self._slow_until = self._clock() + 2 ** attempt
+                LOGGER.debug("Throttled, slowing down migration")
+
+        LOGGER.warning(
+            "Migration batch still throttled after %s attempts",
+            self._max_retries)
+        return 0
+
+    def _wait_for_slot(self, count):
+        rate = self._rate
+        now = self._clock()
+        if now < self._slow_until:
+            rate /= 2
+        if now < self._next_send:
+            self._sleep(self._next_send - now)
+            now = self._next_send
+        self._next_send = now + count / rate
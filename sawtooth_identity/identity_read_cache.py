@@ -0,0 +1,253 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import collections
+import threading
+import time
+
+
+DEFAULT_READ_CACHE_SIZE = 1024
+DEFAULT_READ_CACHE_TTL = 5.0
+DEFAULT_READ_CACHE_PENDING_TTL = 60.0
+
+
+class CachedState(object):
+    __slots__ = ('data', 'head', 'read_at')
+
+    def __init__(self, data, head, read_at):
+        self.data = data
+        self.head = head
+        self.read_at = read_at
+
+
+class IdentityReadCache(object):
+    """A bounded LRU of state values read through the REST API, keyed by
+    address, each with the block head it was read at.
+
+    An entry is served as is for ttl seconds after it was read. After that
+    it is stale: it may be revalidated, which keeps it if the chain head
+    has not moved since it was read, or replaced by a new read.
+    apply_delta() brings the cache up to date from the changes between two
+    heads.
+
+    Local writes mark the addresses they touch as pending until their
+    batch is settled: committed or rejected as seen by the client, or
+    pending_ttl seconds after it was sent. Pending addresses are neither
+    served nor cached, as a read between submit and commit returns the
+    value from before the write.
+    """
+
+    def __init__(self, size=DEFAULT_READ_CACHE_SIZE,
+                 ttl=DEFAULT_READ_CACHE_TTL, clock=time.monotonic,
+                 pending_ttl=DEFAULT_READ_CACHE_PENDING_TTL):
+        """Constructor.
+
+        Args:
+            size (int): Maximum number of addresses kept.
+            ttl (float): Seconds an entry is served without revalidation.
+            clock (callable): Returns the current time in seconds.
+            pending_ttl (float): Seconds after which the addresses of a
+                batch that was never seen settled are no longer pending.
+        """
+        self._size = size
+        self._ttl = ttl
+        self._pending_ttl = pending_ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._head = None
+
+        # Batch id: (addresses, expiry) of the batches in flight, and how
+        # many of them write each address
+        self._pending_batches = collections.OrderedDict()
+        self._pending = collections.Counter()
+
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._invalidations = 0
+
+    @property
+    def head(self):
+        """The most recent head a value was read at."""
+        return self._head
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def stats(self):
+        with self._lock:
+            return collections.OrderedDict([
+                ('size', len(self._entries)),
+                ('hits', self._hits),
+                ('misses', self._misses),
+                ('revalidations', self._revalidations),
+                ('invalidations', self._invalidations),
+                ('pending', len(self._pending)),
+                ('head', self._head),
+            ])
+
+    def get(self, address):
+        """Returns the CachedState of address if it is within its ttl,
+        otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is None or self._clock() - entry.read_at > self._ttl:
+                return None
+            self._entries.move_to_end(address)
+            self._hits += 1
+            return entry
+
+    def get_stale(self, address):
+        """Returns the CachedState of address past its ttl, or None."""
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is None or self._clock() - entry.read_at <= self._ttl:
+                return None
+            return entry
+
+    def revalidate(self, address, head):
+        """Keeps the stale entry of address for another ttl if it was read
+        at head, the current chain head, and drops it otherwise.
+
+        Returns:
+            (CachedState): The revalidated entry, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is None:
+                return None
+            if entry.head is None or entry.head != head:
+                del self._entries[address]
+                return None
+            entry.read_at = self._clock()
+            self._entries.move_to_end(address)
+            self._revalidations += 1
+            return entry
+
+    def put(self, address, data, head):
+        """Stores a value just read from the REST API, unless address is
+        pending.
+        """
+        with self._lock:
+            self._misses += 1
+            self._expire_pending()
+            if address not in self._pending:
+                self._store(address, data, head)
+            if head is not None:
+                self._head = head
+
+    def is_pending(self, address):
+        with self._lock:
+            self._expire_pending()
+            return address in self._pending
+
+    def mark_pending(self, batch_id, addresses):
+        """Invalidates addresses, and keeps them out of the cache until
+        the batch batch_id writing them is settled.
+        """
+        addresses = tuple(addresses)
+        self.invalidate(addresses)
+        with self._lock:
+            if batch_id in self._pending_batches:
+                return
+            self._pending_batches[batch_id] = (
+                addresses, self._clock() + self._pending_ttl)
+            self._pending.update(addresses)
+
+    def settle(self, batch_ids):
+        """Ends the pending state of the batches that committed or were
+        rejected. Their addresses are invalidated again, in case they were
+        read just before the change was visible.
+        """
+        with self._lock:
+            for batch_id in batch_ids:
+                pending = self._pending_batches.pop(batch_id, None)
+                if pending is not None:
+                    self._unmark(pending[0])
+                    self._drop(pending[0])
+
+    def invalidate(self, addresses):
+        with self._lock:
+            self._drop(addresses)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def apply_delta(self, delta):
+        """Updates the cache with a StateDelta, e.g. from
+        IdentityClient.list_changes(since=cache.head).
+
+        Cached addresses that changed take their new value. Entries read at
+        delta.since did not change otherwise, so they are now valid at
+        delta.head.
+        """
+        now = self._clock()
+        with self._lock:
+            for address, data in delta.changes.items():
+                if address not in self._entries:
+                    continue
+                if data is None:
+                    del self._entries[address]
+                    self._invalidations += 1
+                else:
+                    self._entries[address] = CachedState(
+                        data, delta.head, now)
+
+            for entry in self._entries.values():
+                if entry.head == delta.since:
+                    entry.head = delta.head
+                    entry.read_at = now
+
+            self._head = delta.head
+
+    def _drop(self, addresses):
+        for address in addresses:
+            if self._entries.pop(address, None) is not None:
+                self._invalidations += 1
+
+    def _unmark(self, addresses):
+        self._pending.subtract(addresses)
+        for address in addresses:
+            if self._pending[address] <= 0:
+                del self._pending[address]
+
+    def _expire_pending(self):
+        # Batches are kept in the order they were sent, so the expired
+        # ones are at the front
+        now = self._clock()
+        while self._pending_batches:
+            batch_id, (addresses, expiry) = next(
+                iter(self._pending_batches.items()))
+            if expiry > now:
+                return
+            del self._pending_batches[batch_id]
+            self._unmark(addresses)
+
+    def _store(self, address, data, head):
+        if self._size <= 0:
+            return
+        self._entries[address] = CachedState(data, head, self._clock())
+        self._entries.move_to_end(address)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,370 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Rebuilds identity state offline from a history of batches, without a
+validator.
+
+    identity-rebuild history.bin -o state.snapshot --processes 8
+
+The history is read in the record format of identity-workload files, as
+written by `identity history` from the committed blocks of a network:
+
+    identity history history.bin --url http://rest-api:8008
+
+Each batch is applied atomically, in order, with IdentityTransactionHandler
+against an in-memory LocalStateContext, so the same validation runs as in
+the transaction processor.
+
+Batches that share no address cannot affect each other. Addresses are
+grouped with union-find, every batch linking the addresses its
+transactions declare as inputs, so a rename joins its old and new
+address. The groups are spread over worker processes, and each worker
+replays its batches in their original order.
+
+A snapshot is a file in the same record format: a JSON header followed by
+one record per address, the 35 byte address then the serialized state.
+"""
+
+from __future__ import print_function
+
+import argparse
+import binascii
+import heapq
+import json
+import logging
+import multiprocessing
+import sys
+import time
+
+from sawtooth_sdk.processor.exceptions import InternalError
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+
+from sawtooth_identity.identity_dry_run import LocalStateContext
+from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_workload import _LENGTH
+from sawtooth_identity.identity_workload import _read_record
+from sawtooth_identity.identity_workload import read_workload
+from sawtooth_identity.processor.audit import AuditLog
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+
+
+LOGGER = logging.getLogger(__name__)
+
+_ADDRESS_BYTES = 35
+
+
+class RebuildResult(object):
+    def __init__(self, entries, applied, rejected, seconds, partitions):
+        self.entries = entries
+        self.applied = applied
+        self.rejected = rejected
+        self.seconds = seconds
+        self.partitions = partitions
+
+    @property
+    def transactions_per_second(self):
+        total = self.applied + self.rejected
+        return total / self.seconds if self.seconds else 0.0
+
+
+class IdentityStateRebuilder(object):
+    def __init__(self, processes=None, entries=None):
+        """Constructor.
+
+        Args:
+            processes (int): Number of worker processes. One per CPU if
+                not given; 1 replays in the calling process.
+            entries (dict): address (str) keys, serialized state (bytes)
+                values to start from, e.g. an earlier snapshot.
+        """
+        self._processes = processes or multiprocessing.cpu_count()
+        self._entries = dict(entries) if entries else {}
+
+    def rebuild(self, path):
+        """Replays the batches in the history file at path.
+
+        Returns:
+            (RebuildResult): The rebuilt state and replay counts.
+        """
+        start = time.time()
+
+        units = []
+        groups = _AddressGroups()
+        for unit in _read_units(path):
+            inputs = [
+                address
+                for request in unit
+                for address in request.header.inputs
+            ]
+            groups.union_all(inputs)
+            units.append((inputs[0] if inputs else None, unit))
+
+        partitions = self._partition(units, groups)
+        LOGGER.info(
+            "Replaying %s batches in %s partitions",
+            len(units), len(partitions))
+
+        results = _replay_partitions(partitions)
+
+        entries = dict(self._entries)
+        applied = rejected = 0
+        for partition, (partition_entries, partition_applied,
+                        partition_rejected) in zip(partitions, results):
+            # A partition may have deleted addresses it started with
+            for address in partition[0]:
+                entries.pop(address, None)
+            entries.update(partition_entries)
+            applied += partition_applied
+            rejected += partition_rejected
+
+        return RebuildResult(
+            entries=entries,
+            applied=applied,
+            rejected=rejected,
+            seconds=time.time() - start,
+            partitions=len(partitions))
+
+    def _partition(self, units, groups):
+        # Weigh each group by its number of batches, and hand the heaviest
+        # groups out first, each to the least loaded partition
+        weights = {}
+        for address, _ in units:
+            root = groups.find(address) if address is not None else None
+            weights[root] = weights.get(root, 0) + 1
+
+        count = max(1, min(self._processes, len(weights)))
+        loads = [(0, index) for index in range(count)]
+        assignment = {}
+        for root, weight in sorted(
+                weights.items(), key=lambda item: -item[1]):
+            load, index = heapq.heappop(loads)
+            assignment[root] = index
+            heapq.heappush(loads, (load + weight, index))
+
+        partitions = [({}, []) for _ in range(count)]
+        for address, unit in units:
+            root = groups.find(address) if address is not None else None
+            partitions[assignment[root]][1].append(unit)
+
+        # Starting state goes with the partition replaying its group
+        for address, data in self._entries.items():
+            if groups.contains(address):
+                index = assignment.get(groups.find(address))
+                if index is not None:
+                    partitions[index][0][address] = data
+
+        return partitions
+
+
+class _AddressGroups(object):
+    """Union-find over addresses."""
+
+    def __init__(self):
+        self._parents = {}
+
+    def contains(self, address):
+        return address in self._parents
+
+    def find(self, address):
+        parents = self._parents
+        parents.setdefault(address, address)
+        while parents[address] != address:
+            # Path halving keeps the trees shallow
+            parents[address] = parents[parents[address]]
+            address = parents[address]
+        return address
+
+    def union_all(self, addresses):
+        if not addresses:
+            return
+        root = self.find(addresses[0])
+        for address in addresses[1:]:
+            other = self.find(address)
+            if other != root:
+                self._parents[other] = root
+
+
+def _read_units(path):
+    # Yields each batch as a list of TpProcessRequests
+    header, messages = read_workload(path)
+
+    if header['format'] == 'batches':
+        for batch in messages:
+            yield [
+                _to_request(transaction)
+                for transaction in batch.transactions
+            ]
+    else:
+        for request in messages:
+            yield [request]
+
+
+def _to_request(transaction):
+    # Parsing straight into the request saves copying a parsed header in,
+    # the header is the costliest part of a transaction to decode
+    request = TpProcessRequest(
+        payload=transaction.payload,
+        signature=transaction.header_signature)
+    request.header.ParseFromString(transaction.header)
+    return request
+
+
+# Partitions handed to forked workers, which inherit them instead of
+# receiving a pickled copy
+_FORKED_PARTITIONS = None
+
+
+def _replay_partitions(partitions):
+    global _FORKED_PARTITIONS
+
+    if len(partitions) == 1:
+        return [_replay(partitions[0])]
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        with multiprocessing.Pool(len(partitions)) as pool:
+            return pool.map(_replay, partitions)
+
+    _FORKED_PARTITIONS = partitions
+    try:
+        with multiprocessing.get_context('fork').Pool(
+                len(partitions)) as pool:
+            return pool.map(_replay_forked, range(len(partitions)))
+    finally:
+        _FORKED_PARTITIONS = None
+
+
+def _replay_forked(index):
+    return _replay(_FORKED_PARTITIONS[index])
+
+
+def _replay(partition):
+    entries, units = partition
+    context = LocalStateContext(entries)
+    # Replayed transactions are not audited, even when logging at DEBUG
+    handler = IdentityTransactionHandler(audit_log=AuditLog(sample_rate=0))
+    applied = rejected = 0
+
+    for unit in units:
+        try:
+            for request in unit:
+                handler.apply(request, context)
+        except (InvalidTransaction, InternalError) as err:
+            LOGGER.debug("Rejected batch: %s", err)
+            context.rollback()
+            rejected += len(unit)
+        else:
+            context.commit()
+            applied += len(unit)
+
+    return context.entries, applied, rejected
+
+
+def write_snapshot(path, entries, info=None):
+    """Writes state entries to path as a snapshot."""
+    header = dict(info or {})
+    header.update({'format': 'snapshot', 'entries': len(entries)})
+    header = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as fd:
+        fd.write(_LENGTH.pack(len(header)) + header)
+        for address in sorted(entries):
+            record = binascii.unhexlify(address) + entries[address]
+            fd.write(_LENGTH.pack(len(record)) + record)
+
+
+def read_snapshot(path):
+    """Reads a snapshot written by write_snapshot.
+
+    Returns:
+        (dict): address (str) keys, serialized state (bytes) values, as
+            taken by LocalStateContext and IdentityDryRun.
+    """
+    with open(path, 'rb') as fd:
+        header = json.loads(_read_record(fd).decode('utf-8'))
+        if header.get('format') != 'snapshot':
+            raise IdentityException('Not a snapshot: {}'.format(path))
+
+        entries = {}
+        while True:
+            record = _read_record(fd)
+            if record is None:
+                return entries
+            entries[binascii.hexlify(
+                record[:_ADDRESS_BYTES]).decode()] = \
+                record[_ADDRESS_BYTES:]
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Rebuild identity state offline from a history of '
+        'batches.')
+
+    parser.add_argument(
+        'history',
+        help='file of batches or requests, in the identity-workload format, '
+        'e.g. written by identity history')
+
+    parser.add_argument(
+        '-o', '--output',
+        required=True,
+        help='file to write the snapshot to')
+
+    parser.add_argument(
+        '--base',
+        metavar='SNAPSHOT',
+        help='snapshot of the state to replay on top of')
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='number of worker processes (default: one per CPU)')
+
+    parser.add_argument(
+        '-v', '--verbose',
+        action='count',
+        default=0,
+        help='enable more verbose output')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    logging.basicConfig(
+        level=logging.DEBUG if opts.verbose > 1 else
+        logging.INFO if opts.verbose else logging.WARNING)
+
+    entries = read_snapshot(opts.base) if opts.base else None
+    result = IdentityStateRebuilder(
+        processes=opts.processes, entries=entries).rebuild(opts.history)
+
+    write_snapshot(opts.output, result.entries, info={
+        'applied': result.applied,
+        'rejected': result.rejected,
+    })
+
+    print('Applied {} and rejected {} transactions in {:.1f}s '
+          '({:.0f} tx/s, {} partitions), wrote {} entries to {}'.format(
+              result.applied, result.rejected, result.seconds,
+              result.transactions_per_second, result.partitions,
+              len(result.entries), opts.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Aggregates over the identity namespace: counts by gender, identities per
+owner and an age histogram.
+
+The aggregates are computed with NumPy over the integer code columns of an
+IdentityTable. NumPy is an optional dependency, install it with the
+'stats' extra.
+"""
+
+import collections
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_export import read_export
+from sawtooth_identity.identity_rebuild import read_snapshot
+from sawtooth_identity.identity_table import IdentityTable
+
+
+def load_table(client=None, export_file=None, snapshot_file=None,
+               auth_user=None, auth_password=None):
+    """Loads the identities needed for stats, without their names.
+
+    Args:
+        client (IdentityClient): Client to stream state from.
+        export_file (str): A local export written by 'identity export',
+            read instead of the REST API.
+        snapshot_file (str): A local snapshot written by identity-rebuild,
+            read instead of the REST API.
+    """
+    if snapshot_file is not None:
+        table = IdentityTable(keep_names=False)
+        for data in read_snapshot(snapshot_file).values():
+            table.add_bucket(data)
+        return table
+
+    if export_file is not None:
+        table = IdentityTable(keep_names=False)
+        for _, owner, name, date_of_birth, gender in read_export(
+                export_file):
+            table.append_values(name, date_of_birth, gender, owner)
+        return table
+
+    return IdentityTable.from_pages(
+        client.iter_state_pages(
+            auth_user=auth_user,
+            auth_password=auth_password),
+        keep_names=False)
+
+
+def compute_stats(table, today=None, bin_width=10, top_owners=10):
+    """Computes the aggregates of an IdentityTable.
+
+    Args:
+        table (IdentityTable): The identities.
+        today (datetime.date): Date ages are computed at, today by default.
+        bin_width (int): Width of the age histogram bins, in years.
+        top_owners (int): Number of owners with the most identities to
+            report.
+
+    Returns:
+        (dict): total, by_gender, owners, top_owners, age_histogram and
+            unknown_date_of_birth.
+    """
+    if numpy is None:
+        raise IdentityException(
+            'identity stats requires numpy, install sawtooth-identity[stats]')
+
+    if today is None:
+        today = datetime.date.today()
+
+    gender_codes, genders = table.column_codes('gender')
+    owner_codes, owners = table.column_codes('owner')
+    date_codes, dates = table.column_codes('date_of_birth')
+
+    # The arrays are viewed in place, not copied
+    gender_counts = numpy.bincount(
+        _as_numpy(gender_codes), minlength=len(genders))
+    owner_counts = numpy.bincount(
+        _as_numpy(owner_codes), minlength=len(owners))
+
+    # Ages are computed once per distinct date, then looked up per row
+    ages_by_code = numpy.fromiter(
+        (_age(date, today) for date in dates),
+        dtype=numpy.int32,
+        count=len(dates))
+    ages = ages_by_code[_as_numpy(date_codes)] if len(dates) \
+        else numpy.empty(0, dtype=numpy.int32)
+    known = ages[ages >= 0]
+    age_bins = numpy.bincount(known // bin_width) if known.size \
+        else numpy.empty(0, dtype=numpy.int64)
+
+    top = numpy.argsort(owner_counts, kind='stable')[::-1][:top_owners]
+
+    return collections.OrderedDict([
+        ('total', len(table)),
+        ('by_gender', collections.OrderedDict(
+            (genders[code], int(count))
+            for code, count in enumerate(gender_counts) if count)),
+        ('owners', int(numpy.count_nonzero(owner_counts))),
+        ('top_owners', collections.OrderedDict(
+            (owners[code], int(owner_counts[code]))
+            for code in top if owner_counts[code])),
+        ('age_histogram', collections.OrderedDict(
+            ('{}-{}'.format(index * bin_width, (index + 1) * bin_width - 1),
+             int(count))
+            for index, count in enumerate(age_bins) if count)),
+        ('unknown_date_of_birth', int(ages.size - known.size)),
+    ])
+
+
+def _as_numpy(codes):
+    # array('I') holds C unsigned ints, which numpy calls uintc
+    return numpy.frombuffer(codes, dtype=numpy.uintc) if len(codes) \
+        else numpy.empty(0, dtype=numpy.uintc)
+
+
+def _age(date_of_birth, today):
+    # -1 marks a date of birth that is missing, malformed or in the future
+    try:
+        born = datetime.datetime.strptime(date_of_birth, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return -1
+    age = today.year - born.year - (
+        (today.month, today.day) < (born.month, born.day))
+    return age if age >= 0 else -1
@@ -0,0 +1,255 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import array
+import bisect
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sawtooth_identity.identity_codec import decode_identities
+
+
+class IdentityRecord(object):
+    __slots__ = ('name', 'date_of_birth', 'gender', 'owner', 'version')
+
+    def __init__(self, name, date_of_birth, gender, owner, version):
+        self.name = name
+        self.date_of_birth = date_of_birth
+        self.gender = gender
+        self.owner = owner
+        self.version = version
+
+    def __repr__(self):
+        return 'IdentityRecord({!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            self.name, self.date_of_birth, self.gender, self.owner,
+            self.version)
+
+
+class _StringPool(object):
+    """Interns repeated strings as small integer codes."""
+
+    def __init__(self):
+        self._values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def code(self, value):
+        try:
+            return self._codes[value]
+        except KeyError:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+            return code
+
+    def find(self, value):
+        return self._codes.get(value)
+
+    def value(self, code):
+        return self._values[code]
+
+    def values(self):
+        return self._values
+
+
+class IdentityTable(object):
+    """A columnar, memory compact table of identities.
+
+    Names are kept as strings, one per row. Genders, dates of birth and
+    owners repeat across rows, so each is interned once and stored per row
+    as an integer code in an array. A row costs a few tens of bytes beyond
+    its name, against several hundred for a dict or an Identity object.
+
+    Tables are built incrementally, e.g. from the pages of
+    IdentityClient.iter_state_pages, and filtered into new tables that
+    share the interned values. Aggregates need no names, and a table built
+    with keep_names=False drops them, leaving a few bytes per row.
+    """
+
+    def __init__(self, keep_names=True, _pools=None):
+        if _pools is None:
+            _pools = (_StringPool(), _StringPool(), _StringPool())
+        self._genders, self._dates, self._owners = _pools
+
+        self._keep_names = keep_names
+        self._names = []
+        self._gender_codes = array.array('I')
+        self._date_codes = array.array('I')
+        self._owner_codes = array.array('I')
+        self._versions = array.array('I')
+
+    @classmethod
+    def from_pages(cls, pages, keep_names=True):
+        """Builds a table from an iterable of StatePages."""
+        table = cls(keep_names=keep_names)
+        for page in pages:
+            table.add_page(page)
+        return table
+
+    def __len__(self):
+        return len(self._gender_codes)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self._record(row)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('IdentityTable index out of range')
+        return self._record(row)
+
+    def add_page(self, page):
+        for _, data in page.entries:
+            self.add_bucket(data)
+
+    def add_bucket(self, data):
+        """Adds the identities of one serialized state entry."""
+        for identity in decode_identities(data):
+            self.append(identity)
+
+    def append(self, identity):
+        self.append_values(
+            identity.name,
+            identity.date_of_birth,
+            identity.gender,
+            identity.owner,
+            identity.version)
+
+    def append_values(self, name, date_of_birth, gender, owner, version=0):
+        if self._keep_names:
+            self._names.append(name)
+        self._gender_codes.append(self._genders.code(gender))
+        self._date_codes.append(self._dates.code(date_of_birth))
+        self._owner_codes.append(self._owners.code(owner))
+        self._versions.append(version)
+
+    def filter(self, owner=None, gender=None, dob_from=None, dob_to=None):
+        """Returns a new table of the rows matching every given criterion.
+
+        Each criterion is resolved against the interned values once, so
+        the scan over the rows only compares integer codes. With NumPy,
+        from the 'stats' extra, each criterion is a vectorized mask over
+        its code column; without it, the rows are scanned in Python.
+
+        Args:
+            owner (str): Public key of the owner.
+            gender (str): Gender.
+            dob_from (str): Earliest date of birth, inclusive, as
+                YYYY-MM-DD.
+            dob_to (str): Latest date of birth, inclusive, as YYYY-MM-DD.
+        """
+        columns = []
+
+        if owner is not None:
+            columns.append((self._owner_codes, self._codes_of(
+                self._owners, owner)))
+
+        if gender is not None:
+            columns.append((self._gender_codes, self._codes_of(
+                self._genders, gender)))
+
+        if dob_from is not None or dob_to is not None:
+            # Dates in YYYY-MM-DD form order the same as strings
+            dates = sorted(
+                (value, code)
+                for code, value in enumerate(self._dates.values()))
+            keys = [value for value, _ in dates]
+            low = 0 if dob_from is None else bisect.bisect_left(
+                keys, dob_from)
+            high = len(keys) if dob_to is None else bisect.bisect_right(
+                keys, dob_to)
+            columns.append((self._date_codes, frozenset(
+                code for _, code in dates[low:high])))
+
+        if any(not codes for _, codes in columns):
+            return self._select(())
+
+        if numpy is None:
+            rows = range(len(self))
+            for column, codes in columns:
+                rows = [row for row in rows if column[row] in codes]
+            return self._select(rows)
+
+        mask = numpy.ones(len(self), dtype=bool)
+        for column, codes in columns:
+            mask &= numpy.isin(
+                _as_numpy(column),
+                numpy.fromiter(codes, dtype=numpy.uintc, count=len(codes)))
+        return self._take(numpy.flatnonzero(mask))
+
+    def column_codes(self, column):
+        """Returns the integer codes of 'gender', 'date_of_birth' or
+        'owner' for every row, and the values they stand for.
+        """
+        codes, pool = {
+            'gender': (self._gender_codes, self._genders),
+            'date_of_birth': (self._date_codes, self._dates),
+            'owner': (self._owner_codes, self._owners),
+        }[column]
+        return codes, pool.values()
+
+    def _codes_of(self, pool, value):
+        code = pool.find(value)
+        return frozenset() if code is None else frozenset((code,))
+
+    def _select(self, rows):
+        table = IdentityTable(
+            keep_names=self._keep_names,
+            _pools=(self._genders, self._dates, self._owners))
+        for row in rows:
+            if self._keep_names:
+                table._names.append(self._names[row])
+            table._gender_codes.append(self._gender_codes[row])
+            table._date_codes.append(self._date_codes[row])
+            table._owner_codes.append(self._owner_codes[row])
+            table._versions.append(self._versions[row])
+        return table
+
+    def _take(self, rows):
+        # _select for a NumPy array of rows, copying the code columns
+        # without a Python loop
+        table = IdentityTable(
+            keep_names=self._keep_names,
+            _pools=(self._genders, self._dates, self._owners))
+        if self._keep_names:
+            names = self._names
+            table._names = [names[row] for row in rows.tolist()]
+        for column, selected in (
+                (self._gender_codes, table._gender_codes),
+                (self._date_codes, table._date_codes),
+                (self._owner_codes, table._owner_codes),
+                (self._versions, table._versions)):
+            selected.frombytes(_as_numpy(column)[rows].tobytes())
+        return table
+
+    def _record(self, row):
+        return IdentityRecord(
+            name=self._names[row] if self._keep_names else None,
+            date_of_birth=self._dates.value(self._date_codes[row]),
+            gender=self._genders.value(self._gender_codes[row]),
+            owner=self._owners.value(self._owner_codes[row]),
+            version=self._versions[row])
+
+
+def _as_numpy(codes):
+    # array('I') holds C unsigned ints, which numpy calls uintc
+    return numpy.frombuffer(codes, dtype=numpy.uintc) if len(codes) \
+        else numpy.empty(0, dtype=numpy.uintc)
@@ -0,0 +1,284 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Latency tracing of identity transactions, keyed by the transaction header
+signature, which the client and the transaction processor both know.
+
+The client and the transaction processor each append spans to a JSON lines
+file, one object per span:
+
+    {"trace": "<header signature>", "source": "client", "span": "sign",
+     "start": 1530000000.123456, "seconds": 0.000412}
+
+The client records build, sign, submit and commit_wait spans; the
+transaction processor records decode, state_read, state_write and apply.
+identity-trace joins the files into a timeline per transaction and a
+breakdown of where the time went:
+
+    identity-trace client.jsonl tp.jsonl --timelines 5
+
+The gap between the end of submit and the start of the first apply is
+reported as validator_queue, and the rest of commit_wait after that apply
+as block_commit. Start times are wall clock times, so both gaps are only
+as accurate as the clocks of the two hosts are in sync.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import contextlib
+import json
+import sys
+import threading
+import time
+
+
+class TraceWriter(object):
+    """Appends spans to a JSON lines file. Safe to share between threads."""
+
+    def __init__(self, path, source):
+        """Constructor.
+
+        Args:
+            path (str): File the spans are appended to.
+            source (str): Recorded with every span, e.g. 'client' or 'tp'.
+        """
+        self._source = source
+        self._lock = threading.Lock()
+        # Line buffered, so spans survive a process that is killed
+        self._fd = open(path, 'a', buffering=1)
+
+    @property
+    def source(self):
+        return self._source
+
+    def record(self, trace, span, start, seconds, **attrs):
+        """Writes a span that began at start, a time.time() value, and
+        lasted seconds.
+        """
+        line = collections.OrderedDict([
+            ('trace', trace),
+            ('source', self._source),
+            ('span', span),
+            ('start', start),
+            ('seconds', seconds),
+        ])
+        line.update(attrs)
+        line = json.dumps(line) + '\n'
+        with self._lock:
+            self._fd.write(line)
+
+    @contextlib.contextmanager
+    def span(self, trace, span, **attrs):
+        """Records the time spent in the with block as a span."""
+        start = time.time()
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(
+                trace, span, start, time.perf_counter() - began, **attrs)
+
+    def close(self):
+        with self._lock:
+            self._fd.close()
+
+
+def read_spans(paths):
+    """Reads the spans of every file in paths; lines that are not valid
+    JSON, e.g. a partly written last line, are skipped.
+    """
+    spans = []
+    for path in paths:
+        with open(path) as fd:
+            for line in fd:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(span, dict) and 'trace' in span:
+                    spans.append(span)
+    return spans
+
+
+def join_traces(spans):
+    """Returns an OrderedDict of trace, list of spans pairs, each list in
+    start order and the traces in the order they started.
+    """
+    traces = collections.defaultdict(list)
+    for span in spans:
+        traces[span['trace']].append(span)
+
+    for trace_spans in traces.values():
+        trace_spans.sort(key=lambda span: span['start'])
+
+    return collections.OrderedDict(sorted(
+        traces.items(), key=lambda item: item[1][0]['start']))
+
+
+def derived_spans(trace_spans):
+    """Returns the validator_queue and block_commit gaps of a trace, for
+    the gaps its spans allow to compute, as (name, seconds) pairs.
+    """
+    submit = _first(trace_spans, 'client', 'submit')
+    wait = _first(trace_spans, 'client', 'commit_wait')
+    apply = _first(trace_spans, 'tp', 'apply')
+    if apply is None:
+        return []
+
+    gaps = []
+    apply_end = apply['start'] + apply['seconds']
+    if submit is not None:
+        gaps.append((
+            'validator_queue',
+            apply['start'] - (submit['start'] + submit['seconds'])))
+    if wait is not None:
+        gaps.append((
+            'block_commit', wait['start'] + wait['seconds'] - apply_end))
+    return gaps
+
+
+def trace_seconds(trace_spans):
+    """Returns the time from the start of the first span of a trace to
+    the end of its last.
+    """
+    start = trace_spans[0]['start']
+    end = max(span['start'] + span['seconds'] for span in trace_spans)
+    return end - start
+
+
+def summarize(traces):
+    """Returns the breakdown of every span and gap over traces: an
+    OrderedDict of name, stats pairs, in the order of a transaction.
+    """
+    durations = collections.defaultdict(list)
+    for trace_spans in traces.values():
+        for span in trace_spans:
+            durations['{}.{}'.format(span['source'], span['span'])].append(
+                span['seconds'])
+        for name, seconds in derived_spans(trace_spans):
+            durations[name].append(seconds)
+        durations['total'].append(trace_seconds(trace_spans))
+
+    order = [
+        'client.build', 'client.sign', 'client.submit', 'validator_queue',
+        'tp.decode', 'tp.state_read', 'tp.state_write', 'tp.apply',
+        'block_commit', 'client.commit_wait', 'total',
+    ]
+    names = [name for name in order if name in durations] + sorted(
+        name for name in durations if name not in order)
+
+    summary = collections.OrderedDict()
+    for name in names:
+        values = sorted(durations[name])
+        summary[name] = collections.OrderedDict([
+            ('count', len(values)),
+            ('mean', sum(values) / len(values)),
+            ('p50', _percentile(values, 0.50)),
+            ('p95', _percentile(values, 0.95)),
+            ('max', values[-1]),
+        ])
+    return summary
+
+
+def _first(trace_spans, source, span):
+    for candidate in trace_spans:
+        if candidate['source'] == source and candidate['span'] == span:
+            return candidate
+    return None
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _print_timeline(trace, trace_spans):
+    print('{} ({:.2f} ms)'.format(trace, trace_seconds(trace_spans) * 1e3))
+    start = trace_spans[0]['start']
+    for span in trace_spans:
+        print('  {:>+10.2f} ms {:>10.2f} ms  {}.{}'.format(
+            (span['start'] - start) * 1e3, span['seconds'] * 1e3,
+            span['source'], span['span']))
+    for name, seconds in derived_spans(trace_spans):
+        print('  {:>13} {:>10.2f} ms  {}'.format('', seconds * 1e3, name))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Join identity client and transaction processor trace '
+        'files into per-transaction timelines and a latency breakdown.')
+
+    parser.add_argument(
+        'files',
+        nargs='+',
+        help='JSON lines trace files, from the client and the transaction '
+        'processor')
+
+    parser.add_argument(
+        '--trace',
+        help='print the timeline of this transaction header signature only')
+
+    parser.add_argument(
+        '--timelines',
+        type=int,
+        default=0,
+        metavar='N',
+        help='also print the timelines of the N slowest transactions')
+
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='print the breakdown as JSON')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    traces = join_traces(read_spans(opts.files))
+
+    if opts.trace is not None:
+        if opts.trace not in traces:
+            print('No spans for {}'.format(opts.trace), file=sys.stderr)
+            sys.exit(1)
+        _print_timeline(opts.trace, traces[opts.trace])
+        return
+
+    summary = summarize(traces)
+    if opts.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print('{} transactions'.format(len(traces)))
+        print('{:<20} {:>7} {:>10} {:>10} {:>10} {:>10}'.format(
+            'span', 'count', 'mean ms', 'p50 ms', 'p95 ms', 'max ms'))
+        for name, stats in summary.items():
+            print('{:<20} {:>7} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}'
+                  .format(name, stats['count'], stats['mean'] * 1e3,
+                          stats['p50'] * 1e3, stats['p95'] * 1e3,
+                          stats['max'] * 1e3))
+
+    slowest = sorted(
+        traces.items(), key=lambda item: -trace_seconds(item[1]))
+    for trace, trace_spans in slowest[:opts.timelines]:
+        print()
+        _print_timeline(trace, trace_spans)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Builds signed identity transactions and batches for one signer.
+
+Everything that is the same for every transaction of a signer, its public
+key and the family name and version, is encoded once. Headers are then
+written field by field in the protobuf wire format, in field number order,
+which gives the same bytes as TransactionHeader.SerializeToString()
+without building a message per transaction.
+
+Nonces are a random per-builder prefix followed by a counter, so they are
+unique within a builder, increase monotonically, and do not collide
+between builders the way clock based nonces do under bulk generation.
+"""
+
+import hashlib
+import itertools
+import os
+import pickle
+import time
+
+from sawtooth_sdk.protobuf.batch_pb2 import Batch
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_sdk.protobuf.transaction_pb2 import Transaction
+
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.identity_codec import encode_payload
+
+FAMILY_NAME = 'identity'
+
+IDENTITY_PREFIX = hashlib.sha512(FAMILY_NAME.encode('utf-8')).hexdigest()[:6]
+
+# Tags of the length delimited TransactionHeader fields
+_BATCHER_PUBLIC_KEY = b'\x0a'
+_DEPENDENCIES = b'\x12'
+_FAMILY_NAME = b'\x1a'
+_FAMILY_VERSION = b'\x22'
+_INPUTS = b'\x2a'
+_NONCE = b'\x32'
+_OUTPUTS = b'\x3a'
+_PAYLOAD_SHA512 = b'\x4a'
+_SIGNER_PUBLIC_KEY = b'\x52'
+
+# Tags of the BatchHeader fields
+_BATCH_SIGNER_PUBLIC_KEY = b'\x0a'
+_BATCH_TRANSACTION_IDS = b'\x12'
+
+
+def identity_address(name):
+    """Returns the state address of the identities named name."""
+    name_hash = hashlib.sha512(name.encode('utf-8')).hexdigest()
+    return IDENTITY_PREFIX + name_hash[0:6] + name_hash[-58:]
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(tag, value):
+    # A length delimited field; value is bytes
+    return tag + _varint(len(value)) + value
+
+
+def _fields(tag, values):
+    return b''.join(_field(tag, value.encode()) for value in values)
+
+
+class IdentityTransactionBuilder(object):
+    def __init__(self, signer, family_version=LEGACY_FAMILY_VERSION,
+                 nonce_prefix=None):
+        """Constructor.
+
+        Args:
+            signer (Signer): Signs the transactions and batches.
+            family_version (str): Version written in every header, which
+                also selects the payload encoding.
+            nonce_prefix (str): Start of every nonce, e.g. to make the
+                nonces of a generated workload reproducible. Random if not
+                given.
+        """
+        self._signer = signer
+        self._public_key = signer.get_public_key().as_hex()
+        self._family_version = family_version
+
+        if nonce_prefix is None:
+            nonce_prefix = os.urandom(8).hex()
+        self._nonce_prefix = nonce_prefix + '-'
+        # next() on a count is atomic, so threads may share a builder
+        self._counter = itertools.count(1)
+
+        public_key = self._public_key.encode()
+        # Fields 1, 3 and 4 are written before the per transaction fields,
+        # field 10 after them
+        self._header_start = _field(_BATCHER_PUBLIC_KEY, public_key)
+        self._header_family = \
+            _field(_FAMILY_NAME, FAMILY_NAME.encode()) + \
+            _field(_FAMILY_VERSION, family_version.encode())
+        self._header_end = _field(_SIGNER_PUBLIC_KEY, public_key)
+        self._batch_header_start = _field(_BATCH_SIGNER_PUBLIC_KEY, public_key)
+
+    @property
+    def public_key(self):
+        return self._public_key
+
+    @property
+    def family_version(self):
+        return self._family_version
+
+    def next_nonce(self):
+        return '{}{:012x}'.format(self._nonce_prefix, next(self._counter))
+
+    def header_bytes(self, payload_bytes, addresses, dependencies=(),
+                     nonce=None):
+        """Returns a serialized TransactionHeader whose inputs and outputs
+        are both addresses.
+        """
+        if nonce is None:
+            nonce = self.next_nonce()
+        # Inputs and outputs differ only in their tags
+        bodies = [
+            _varint(len(address)) + address.encode()
+            for address in addresses
+        ]
+
+        return b''.join((
+            self._header_start,
+            _fields(_DEPENDENCIES, dependencies),
+            self._header_family,
+            b''.join(_INPUTS + body for body in bodies),
+            # proto3 leaves out empty strings
+            _field(_NONCE, nonce.encode()) if nonce else b'',
+            b''.join(_OUTPUTS + body for body in bodies),
+            _field(_PAYLOAD_SHA512,
+                   hashlib.sha512(payload_bytes).hexdigest().encode()),
+            self._header_end,
+        ))
+
+    def build(self, action, name, date_of_birth='', gender='', new_name='',
+              expected_version=None, dependencies=None, nonce=None,
+              timings=None):
+        """Returns a signed identity Transaction.
+
+        Args:
+            timings (dict): If given, receives the (start, seconds) of
+                building the payload and header under 'build', and of
+                signing under 'sign', start being a time.time() value.
+        """
+        if timings is not None:
+            start = time.time()
+            began = time.perf_counter()
+
+        if self._family_version == COMPACT_FAMILY_VERSION:
+            payload_bytes = encode_payload(
+                action, name, date_of_birth, gender,
+                new_name=new_name if action == 'rename' else '',
+                expected_version=expected_version)
+        else:
+            payload = {
+                'Action': action,
+                'Name': name,
+                'Date_of_birth': date_of_birth,
+                'Gender': gender
+            }
+            if action == 'rename':
+                payload['New_name'] = new_name
+            if expected_version is not None:
+                payload['Expected_version'] = expected_version
+            payload_bytes = pickle.dumps(
+                payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # A rename reads and writes both the old and the new address
+        addresses = [identity_address(name)]
+        if action == 'rename':
+            addresses.append(identity_address(new_name))
+
+        header = self.header_bytes(
+            payload_bytes, addresses, dependencies or (), nonce)
+
+        if timings is None:
+            signature = self._signer.sign(header)
+        else:
+            built = time.perf_counter()
+            signature = self._signer.sign(header)
+            timings['build'] = (start, built - began)
+            timings['sign'] = (
+                start + built - began, time.perf_counter() - built)
+
+        return Transaction(
+            header=header,
+            payload=payload_bytes,
+            header_signature=signature)
+
+    def build_batch(self, transactions):
+        """Returns a signed Batch of transactions, in order."""
+        header = self._batch_header_start + _fields(
+            _BATCH_TRANSACTION_IDS,
+            [t.header_signature for t in transactions])
+
+        return Batch(
+            header=header,
+            transactions=transactions,
+            header_signature=self._signer.sign(header))
+
+    def build_batch_list(self, transactions):
+        return BatchList(batches=[self.build_batch(transactions)])
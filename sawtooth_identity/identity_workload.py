@@ -0,0 +1,453 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Generates reproducible streams of identity transactions for capacity
+planning, benchmarks and load tests.
+
+    identity-workload -n 100000 --signers 50 --zipf 1.1 -o workload.bin
+
+A workload file is a sequence of records, each a 4 byte big-endian length
+followed by that many bytes. The first record is a JSON header describing
+the workload; every following record is a serialized Batch (format
+"batches") or TpProcessRequest (format "requests").
+"""
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import collections
+import hashlib
+import itertools
+import json
+import random
+import struct
+import sys
+
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing.secp256k1 import Secp256k1PrivateKey
+
+from sawtooth_sdk.protobuf.batch_pb2 import Batch
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_identity.identity_client import IdentityClient
+from sawtooth_identity.identity_exceptions import IdentityException
+
+
+WORKLOAD_FORMATS = ('batches', 'requests')
+
+DEFAULT_ACTION_MIX = collections.OrderedDict([
+    ('create', 0.4),
+    ('update', 0.4),
+    ('rename', 0.1),
+    ('delete', 0.1),
+])
+
+_GENDERS = ('m', 'f')
+_LENGTH = struct.Struct('>I')
+
+
+class WorkloadConfig(object):
+    def __init__(self,
+                 count=1000,
+                 action_mix=None,
+                 names=10000,
+                 zipf=1.1,
+                 signers=10,
+                 collision_rate=0.0,
+                 name_length=(8, 32),
+                 seed=0):
+        """Constructor.
+
+        Args:
+            count (int): Number of transactions to generate.
+            action_mix (dict): action (str) keys, relative weight values.
+            names (int): Size of the name population that popularity is
+                drawn from.
+            zipf (float): Exponent of the Zipf distribution of name
+                popularity; 0 makes every name equally popular.
+            signers (int): Number of distinct signing keys.
+            collision_rate (float): Fraction of creates that reuse an
+                existing name, and will be rejected as duplicates.
+            name_length ((int, int)): Bounds of the generated name length,
+                which drives the payload size.
+            seed (int): Seed for names, keys and the operation stream.
+        """
+        self.count = count
+        self.action_mix = action_mix or DEFAULT_ACTION_MIX
+        self.names = names
+        self.zipf = zipf
+        self.signers = signers
+        self.collision_rate = collision_rate
+        self.name_length = name_length
+        self.seed = seed
+
+    def to_dict(self):
+        return collections.OrderedDict([
+            ('count', self.count),
+            ('action_mix', dict(self.action_mix)),
+            ('names', self.names),
+            ('zipf', self.zipf),
+            ('signers', self.signers),
+            ('collision_rate', self.collision_rate),
+            ('name_length', list(self.name_length)),
+            ('seed', self.seed),
+        ])
+
+
+class IdentityWorkloadGenerator(object):
+    """Generates signed identity transactions following a WorkloadConfig.
+
+    The generator keeps a model of which identities exist and who owns
+    them, so that updates, renames and deletes are sent by the owner of an
+    existing identity and only collisions produce invalid transactions. The
+    same config always produces the same transactions.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self._rng = random.Random(config.seed)
+
+        self._clients = [
+            IdentityClient(
+                base_url=None,
+                signer=_create_signer(config.seed, index))
+            for index in range(config.signers)
+        ]
+
+        actions = list(config.action_mix)
+        self._actions = actions
+        self._action_weights = list(itertools.accumulate(
+            config.action_mix[action] for action in actions))
+
+        # Rank k is drawn with probability proportional to 1 / k ** zipf
+        self._rank_weights = list(itertools.accumulate(
+            1.0 / (rank ** config.zipf)
+            for rank in range(1, config.names + 1)))
+
+        self._existing = []
+        self._positions = {}
+        self._owners = {}
+        self._sequence = 0
+        self._last_signer = None
+
+    def transactions(self):
+        """Yields the configured number of signed Transactions."""
+        for _ in range(self._config.count):
+            yield self._next_transaction()
+
+    def batches(self):
+        """Yields one signed Batch per transaction."""
+        for transaction in self.transactions():
+            client = self._clients[self._last_signer]
+            yield client._create_batch_list([transaction]).batches[0]
+
+    def requests(self):
+        """Yields one TpProcessRequest per transaction, as the validator
+        would send it to the transaction processor.
+        """
+        for transaction in self.transactions():
+            header = TransactionHeader()
+            header.ParseFromString(transaction.header)
+            yield TpProcessRequest(
+                header=header,
+                payload=transaction.payload,
+                signature=transaction.header_signature)
+
+    def _next_transaction(self):
+        action = self._choose_action()
+
+        if action == 'create' or not self._existing:
+            signer = self._rng.randrange(len(self._clients))
+            if self._existing and \
+                    self._rng.random() < self._config.collision_rate:
+                name = self._popular_name()
+            else:
+                name = self._new_name()
+                self._add(name, signer)
+            return self._build(signer, 'create', name,
+                               date_of_birth=self._date_of_birth(),
+                               gender=self._rng.choice(_GENDERS))
+
+        name = self._popular_name()
+        signer = self._owners[name]
+
+        if action == 'update':
+            return self._build(signer, 'update', name,
+                               date_of_birth=self._date_of_birth())
+
+        if action == 'rename':
+            new_name = self._new_name()
+            self._remove(name)
+            self._add(new_name, signer)
+            return self._build(signer, 'rename', name, new_name=new_name)
+
+        if action == 'delete':
+            self._remove(name)
+            return self._build(signer, 'delete', name)
+
+        raise IdentityException('Unknown workload action: {}'.format(action))
+
+    def _build(self, signer, action, name, **kwargs):
+        self._last_signer = signer
+        self._sequence += 1
+        # Nonces come from the sequence rather than the clock, so the same
+        # seed always gives the same transactions
+        return self._clients[signer]._create_identity_txn(
+            action, name, nonce='{:x}-{:x}'.format(
+                self._config.seed, self._sequence), **kwargs)
+
+    def _choose_action(self):
+        weight = self._rng.random() * self._action_weights[-1]
+        return self._actions[bisect.bisect(self._action_weights, weight)]
+
+    def _popular_name(self):
+        weight = self._rng.random() * self._rank_weights[-1]
+        rank = bisect.bisect(self._rank_weights, weight)
+        return self._existing[rank % len(self._existing)]
+
+    def _new_name(self):
+        low, high = self._config.name_length
+        prefix = '{}-'.format(self._sequence)
+        length = max(0, self._rng.randint(low, high) - len(prefix))
+        return prefix + ''.join(
+            self._rng.choice('abcdefghijklmnopqrstuvwxyz')
+            for _ in range(length))
+
+    def _date_of_birth(self):
+        return '{:04d}-{:02d}-{:02d}'.format(
+            self._rng.randint(1920, 2015),
+            self._rng.randint(1, 12),
+            self._rng.randint(1, 28))
+
+    def _add(self, name, signer):
+        self._positions[name] = len(self._existing)
+        self._existing.append(name)
+        self._owners[name] = signer
+
+    def _remove(self, name):
+        # Swap with the last name to remove in constant time
+        position = self._positions.pop(name)
+        last = self._existing.pop()
+        if last != name:
+            self._existing[position] = last
+            self._positions[last] = position
+        del self._owners[name]
+
+
+def write_workload(path, workload_format, config, messages):
+    """Write messages to path. Returns the number of messages written."""
+    return _write_records(path, {
+        'format': workload_format,
+        'config': config.to_dict(),
+    }, messages)
+
+
+def write_history(path, batches, head, since=None):
+    """Write committed batches, e.g. from
+    IdentityClient.get_committed_batches, to path in the batches format, as
+    read by identity-rebuild. Returns the number of batches written.
+    """
+    return _write_records(path, {
+        'format': 'batches',
+        'head': head,
+        'since': since,
+    }, batches)
+
+
+def _write_records(path, header, messages):
+    header = json.dumps(header).encode('utf-8')
+
+    count = 0
+    with open(path, 'wb') as fd:
+        fd.write(_LENGTH.pack(len(header)) + header)
+        for message in messages:
+            data = message.SerializeToString()
+            fd.write(_LENGTH.pack(len(data)) + data)
+            count += 1
+
+    return count
+
+
+def read_workload(path):
+    """Read a workload file written by write_workload or write_history.
+
+    Returns:
+        (dict, iterator): The header, and an iterator over the Batch or
+            TpProcessRequest messages.
+    """
+    fd = open(path, 'rb')
+    header = json.loads(_read_record(fd).decode('utf-8'))
+    message_class = {
+        'batches': Batch,
+        'requests': TpProcessRequest,
+    }[header['format']]
+
+    def messages():
+        with fd:
+            while True:
+                data = _read_record(fd)
+                if data is None:
+                    return
+                message = message_class()
+                message.ParseFromString(data)
+                yield message
+
+    return header, messages()
+
+
+def _read_record(fd):
+    prefix = fd.read(_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < _LENGTH.size:
+        raise IdentityException('Truncated workload file')
+    (length,) = _LENGTH.unpack(prefix)
+    data = fd.read(length)
+    if len(data) < length:
+        raise IdentityException('Truncated workload file')
+    return data
+
+
+def _create_signer(seed, index):
+    # Derive the keys from the seed so workloads are reproducible
+    private_key = Secp256k1PrivateKey.from_bytes(
+        hashlib.sha256('identity-workload-{}-{}'.format(
+            seed, index).encode()).digest())
+    return CryptoFactory(create_context('secp256k1')).new_signer(private_key)
+
+
+def _parse_action_mix(value):
+    mix = collections.OrderedDict()
+    try:
+        for item in value.split(','):
+            action, weight = item.split('=')
+            mix[action.strip()] = float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected action=weight pairs, e.g. create=0.5,update=0.5')
+
+    unknown = set(mix).difference(DEFAULT_ACTION_MIX)
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            'unknown actions: {}'.format(', '.join(sorted(unknown))))
+
+    return mix
+
+
+def _parse_range(value):
+    try:
+        low, high = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected MIN-MAX, e.g. 8-32')
+    return low, high
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Generate a reproducible identity transaction workload.')
+
+    parser.add_argument(
+        '-o', '--output',
+        required=True,
+        help='file to write the workload to')
+
+    parser.add_argument(
+        '--format',
+        choices=WORKLOAD_FORMATS,
+        default='batches',
+        help='write signed batches or TpProcessRequests (default: batches)')
+
+    parser.add_argument(
+        '-n', '--count',
+        type=int,
+        default=1000,
+        help='number of transactions (default: 1000)')
+
+    parser.add_argument(
+        '--mix',
+        type=_parse_action_mix,
+        default=DEFAULT_ACTION_MIX,
+        help='relative action weights (default: '
+        'create=0.4,update=0.4,rename=0.1,delete=0.1)')
+
+    parser.add_argument(
+        '--names',
+        type=int,
+        default=10000,
+        help='size of the name popularity population (default: 10000)')
+
+    parser.add_argument(
+        '--zipf',
+        type=float,
+        default=1.1,
+        help='Zipf exponent of name popularity (default: 1.1)')
+
+    parser.add_argument(
+        '--signers',
+        type=int,
+        default=10,
+        help='number of signing keys (default: 10)')
+
+    parser.add_argument(
+        '--collision-rate',
+        type=float,
+        default=0.0,
+        help='fraction of creates that reuse an existing name (default: 0)')
+
+    parser.add_argument(
+        '--name-length',
+        type=_parse_range,
+        default=(8, 32),
+        help='MIN-MAX length of generated names (default: 8-32)')
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed (default: 0)')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    config = WorkloadConfig(
+        count=opts.count,
+        action_mix=opts.mix,
+        names=opts.names,
+        zipf=opts.zipf,
+        signers=opts.signers,
+        collision_rate=opts.collision_rate,
+        name_length=opts.name_length,
+        seed=opts.seed)
+    generator = IdentityWorkloadGenerator(config)
+
+    if opts.format == 'batches':
+        messages = generator.batches()
+    else:
+        messages = generator.requests()
+
+    count = write_workload(opts.output, opts.format, config, messages)
+    print('Wrote {} {} to {}'.format(count, opts.format, opts.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+
+AUDIT_LOGGER = logging.getLogger('sawtooth_identity.audit')
+
+DEFAULT_AUDIT_SAMPLE_RATE = 1.0
+DEFAULT_AUDIT_QUEUE_SIZE = 10000
+
+_FIELDS = (
+    'time', 'transaction', 'family_version', 'action', 'name', 'signer',
+    'outcome', 'seconds',
+)
+
+
+class AuditLog(object):
+    """Structured audit events of the transactions the handler applies,
+    one JSON object per log message:
+
+        {"time": 1530000000.123456, "transaction": "<header signature>",
+         "family_version": "0.1", "action": "update", "name": "alice",
+         "signer": "02abab...", "outcome": "applied", "seconds": 0.000412}
+
+    Events are written at DEBUG to the sawtooth_identity.audit logger,
+    whose level and handlers are set in the log configuration like any
+    other logger. The handler only queues the raw fields; a background
+    thread formats and emits them, so neither the JSON encoding nor the
+    log I/O happen while a transaction is applied. If the writer falls
+    behind and the queue is full, events are dropped and counted rather
+    than slowing transactions down.
+    """
+
+    def __init__(self, sample_rate=DEFAULT_AUDIT_SAMPLE_RATE,
+                 queue_size=DEFAULT_AUDIT_QUEUE_SIZE, logger=AUDIT_LOGGER):
+        """Constructor.
+
+        Args:
+            sample_rate (float): Share of transactions audited, from 0 to
+                1.
+            queue_size (int): Most events waiting to be written.
+            logger (logging.Logger): Where events are written.
+        """
+        self._sample_rate = sample_rate
+        self._logger = logger
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+
+    def sampled(self):
+        """Returns whether to audit the next transaction. This is all an
+        unaudited transaction costs, so it is checked before anything is
+        measured or formatted.
+        """
+        if self._sample_rate <= 0 or \
+                not self._logger.isEnabledFor(logging.DEBUG):
+            return False
+        return self._sample_rate >= 1 or random.random() < self._sample_rate
+
+    def record(self, transaction, family_version, action, name, signer,
+               outcome, seconds):
+        """Queues the event of a sampled transaction."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((
+                time.time(), transaction, family_version, action, name,
+                signer, outcome, seconds))
+        except queue.Full:
+            self._dropped += 1
+
+    def stats(self):
+        """Returns the writer counters as a dict, suitable for logging or
+        exporting as metrics.
+        """
+        return collections.OrderedDict([
+            ('sample_rate', self._sample_rate),
+            ('queued', self._queue.qsize()),
+            ('written', self._written),
+            ('dropped', self._dropped),
+        ])
+
+    def close(self, timeout=None):
+        """Writes the queued events and stops the writer thread."""
+        if self._thread is None:
+            return
+        # Blocks if the queue is full, the writer is still draining it
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(
+                    target=self._run, name='IdentityAuditWriter')
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            self._logger.debug(
+                '%s', json.dumps(collections.OrderedDict(zip(_FIELDS, event))))
+            self._written += 1
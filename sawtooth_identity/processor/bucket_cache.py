@@ -0,0 +1,155 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import hashlib
+import threading
+
+from sawtooth_identity.identity_codec import decode_identities
+
+
+DEFAULT_BUCKET_CACHE_BYTES = 16 * 1024 * 1024
+
+
+class BucketCache(object):
+    """A bounded LRU cache of decoded state buckets, shared by every
+    transaction the processor applies.
+
+    Entries are keyed by a digest of the bucket bytes, not by address:
+    the same bytes always decode to the same identities, so an entry never
+    goes stale, whichever block or fork the bytes were read in.
+
+    The decoded identities are handed out as a tuple shared between
+    transactions. Identity records are read-only, so a handler that
+    changes an identity writes a copy, and a cached entry cannot be
+    changed through the identities it served.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUCKET_CACHE_BYTES):
+        """Constructor.
+
+        Args:
+            max_bytes (int): The most encoded bucket bytes the cached
+                entries may add up to; decoded entries take a few times
+                as much memory. A max_bytes of 0 disables caching.
+        """
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_identities(self, data):
+        """Return the identities encoded in data, decoding it only if the
+        same bytes have not been seen recently.
+
+        Args:
+            data (bytes): A state value.
+
+        Returns:
+            (tuple): The shared, read-only Identity objects.
+
+        Raises:
+            ValueError: data is not a valid bucket. Failures are not
+                cached.
+        """
+        if self._max_bytes <= 0:
+            return tuple(decode_identities(data))
+
+        key = _digest(data)
+        with self._lock:
+            try:
+                entry = self._entries[key]
+            except KeyError:
+                entry = None
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+
+        if entry is None:
+            entry = _Entry(tuple(decode_identities(data)), len(data))
+            self._put(key, entry)
+
+        return entry.identities
+
+    def put(self, data, identities):
+        """Caches identities as the decoded form of data, e.g. of a bucket
+        just written, so the next transaction reading it does not decode
+        it. identities are shared from then on.
+        """
+        if self._max_bytes <= 0:
+            return
+        self._put(_digest(data), _Entry(tuple(identities), len(data)))
+
+    def stats(self):
+        """Returns the cache counters as a dict, suitable for logging or
+        exporting as metrics.
+        """
+        with self._lock:
+            return collections.OrderedDict([
+                ('size', len(self._entries)),
+                ('bytes', self._bytes),
+                ('max_bytes', self._max_bytes),
+                ('hits', self._hits),
+                ('misses', self._misses),
+                ('evictions', self._evictions),
+            ])
+
+    def _put(self, key, entry):
+        # Buckets larger than the whole cache are decoded every time
+        if entry.size > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._evictions += 1
+
+
+def _digest(data):
+    # Collisions of a 128 bit digest are not a practical concern, and the
+    # bucket bytes themselves need not be kept
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class _Entry(object):
+    __slots__ = ('identities', 'size')
+
+    def __init__(self, identities, size):
+        self.identities = identities
+        self.size = size
@@ -15,14 +15,52 @@
 
 import collections
 import logging
+import math
 import os
 
 import toml
 
 from sawtooth_sdk.processor.exceptions import LocalConfigurationError
 
+from sawtooth_identity.processor.profiling import MAX_PROFILE_DURATION
+
 LOGGER = logging.getLogger(__name__)
 
+# The configuration keys and their types, in the order they are printed.
+# Each key can also be set through the environment as IDENTITY_TP_<KEY>,
+# e.g. IDENTITY_TP_STATE_TIMEOUT=5.
+CONFIG_KEYS = collections.OrderedDict([
+    ('connect', str),
+    ('workers', int),
+    ('payload_cache_size', int),
+    ('bucket_cache_bytes', int),
+    ('state_timeout', float),
+    ('state_read_retries', int),
+    ('prefetch', bool),
+    ('drain_timeout', float),
+    ('metrics_port', int),
+    ('profile_duration', int),
+    ('profile_dir', str),
+    ('trace_file', str),
+    ('audit_sample_rate', float),
+])
+
+ENV_PREFIX = 'IDENTITY_TP_'
+
+# The allowed range of numeric keys: (minimum, maximum, whether the
+# minimum itself is allowed), None for no bound
+VALUE_RANGES = {
+    'workers': (1, None, True),
+    'payload_cache_size': (0, None, True),
+    'bucket_cache_bytes': (0, None, True),
+    'state_timeout': (0, None, False),
+    'state_read_retries': (0, None, True),
+    'drain_timeout': (0, None, False),
+    'metrics_port': (0, 65535, True),
+    'profile_duration': (0, MAX_PROFILE_DURATION, False),
+    'audit_sample_rate': (0, 1, True),
+}
+
 
 def load_default_identity_config():
     """
@@ -30,6 +68,16 @@ def load_default_identity_config():
     """
     return IdentityConfig(
         connect='tcp://localhost:4004',
+        workers=1,
+        payload_cache_size=1024,
+        bucket_cache_bytes=16 * 1024 * 1024,
+        state_timeout=3.0,
+        state_read_retries=2,
+        prefetch=True,
+        drain_timeout=10.0,
+        metrics_port=0,
+        profile_duration=30,
+        audit_sample_rate=1.0,
     )
 
 
@@ -65,20 +113,39 @@ def load_toml_identity_config(filename):
             " {}".format(str(e)))
 
     toml_config = toml.loads(raw_config)
-    invalid_keys = set(toml_config.keys()).difference(
-        ['connect'])
+    invalid_keys = set(toml_config.keys()).difference(CONFIG_KEYS)
     if invalid_keys:
         raise LocalConfigurationError(
             "Invalid keys in transaction processor config: "
             "{}".format(", ".join(sorted(list(invalid_keys)))))
 
-    config = IdentityConfig(
-        connect=toml_config.get("connect", None)
-    )
+    config = IdentityConfig(**{
+        key: _check_value(key, value, filename)
+        for key, value in toml_config.items()
+    })
 
     return config
 
 
+def load_env_identity_config(environ=None):
+    """Returns a IdentityConfig created from the IDENTITY_TP_* environment
+    variables.
+
+    Raises:
+        LocalConfigurationError
+    """
+    if environ is None:
+        environ = os.environ
+
+    values = {}
+    for key in CONFIG_KEYS:
+        env_key = ENV_PREFIX + key.upper()
+        if env_key in environ:
+            values[key] = _parse_value(key, environ[env_key], env_key)
+
+    return IdentityConfig(**values)
+
+
 def merge_identity_config(configs):
     """
     Given a list of IdentityConfig objects, merges them into a single
@@ -93,20 +160,109 @@ def merge_identity_config(configs):
         config (IdentityConfig): One IdentityConfig that combines all of the
             passed in configs.
     """
-    connect = None
+    values = {}
 
     for config in reversed(configs):
-        if config.connect is not None:
-            connect = config.connect
+        for key, value in config.to_dict().items():
+            if value is not None:
+                values[key] = value
 
-    return IdentityConfig(
-        connect=connect
-    )
+    # Values from the command line are only checked here
+    for key, value in values.items():
+        _check_range(key, value, 'configuration')
+
+    return IdentityConfig(**values)
+
+
+def _check_value(key, value, source):
+    expected = CONFIG_KEYS[key]
+    if expected is float and isinstance(value, int) \
+            and not isinstance(value, bool):
+        value = float(value)
+
+    if not isinstance(value, expected) or \
+            (expected is int and isinstance(value, bool)):
+        raise LocalConfigurationError(
+            "Invalid value for {} in {}: expected {}, got {!r}".format(
+                key, source, expected.__name__, value))
+
+    return _check_range(key, value, source)
+
+
+def _check_range(key, value, source):
+    # nan fails every comparison and inf passes the open ended ranges
+    if isinstance(value, float) and not math.isfinite(value):
+        raise LocalConfigurationError(
+            "Invalid value for {} in {}: expected a finite number, "
+            "got {!r}".format(key, source, value))
+
+    if key not in VALUE_RANGES:
+        return value
+
+    minimum, maximum, inclusive = VALUE_RANGES[key]
+    if (minimum is not None and
+            (value < minimum or (value == minimum and not inclusive))) or \
+            (maximum is not None and value > maximum):
+        if maximum is None:
+            expected = '{} {}'.format('>=' if inclusive else '>', minimum)
+        else:
+            expected = 'from {} to {}'.format(minimum, maximum)
+        raise LocalConfigurationError(
+            "Invalid value for {} in {}: expected {}, got {!r}".format(
+                key, source, expected, value))
+
+    return value
+
+
+def _parse_value(key, raw_value, source):
+    expected = CONFIG_KEYS[key]
+    if expected is bool:
+        lowered = raw_value.strip().lower()
+        if lowered in ('1', 'true', 'yes', 'on'):
+            return True
+        if lowered in ('0', 'false', 'no', 'off'):
+            return False
+    else:
+        try:
+            value = expected(raw_value)
+        except ValueError:
+            pass
+        else:
+            return _check_range(key, value, source)
+
+    raise LocalConfigurationError(
+        "Invalid value for {}: expected {}, got {!r}".format(
+            source, expected.__name__, raw_value))
 
 # done
 class IdentityConfig:
-    def __init__(self, connect=None):
+    def __init__(self,
+                 connect=None,
+                 workers=None,
+                 payload_cache_size=None,
+                 bucket_cache_bytes=None,
+                 state_timeout=None,
+                 state_read_retries=None,
+                 prefetch=None,
+                 drain_timeout=None,
+                 metrics_port=None,
+                 profile_duration=None,
+                 profile_dir=None,
+                 trace_file=None,
+                 audit_sample_rate=None):
         self._connect = connect
+        self._workers = workers
+        self._payload_cache_size = payload_cache_size
+        self._bucket_cache_bytes = bucket_cache_bytes
+        self._state_timeout = state_timeout
+        self._state_read_retries = state_read_retries
+        self._prefetch = prefetch
+        self._drain_timeout = drain_timeout
+        self._metrics_port = metrics_port
+        self._profile_duration = profile_duration
+        self._profile_dir = profile_dir
+        self._trace_file = trace_file
+        self._audit_sample_rate = audit_sample_rate
 
     # Decorators are synthetic sugar for a function wrapper 
     # i.e. connect = decorator_name(connect)
@@ -116,17 +272,93 @@ class IdentityConfig:
     def connect(self):
         return self._connect
 
+    @property
+    def workers(self):
+        """Number of validator connections handling transactions."""
+        return self._workers
+
+    @property
+    def payload_cache_size(self):
+        """Number of decoded payloads kept, 0 disables the cache."""
+        return self._payload_cache_size
+
+    @property
+    def bucket_cache_bytes(self):
+        """Encoded size of the decoded state buckets kept, 0 disables
+        the cache."""
+        return self._bucket_cache_bytes
+
+    @property
+    def state_timeout(self):
+        """The longest to wait for a validator state call, in seconds."""
+        return self._state_timeout
+
+    @property
+    def state_read_retries(self):
+        """Extra attempts for a timed out state read."""
+        return self._state_read_retries
+
+    @property
+    def prefetch(self):
+        """Whether all of a transaction's inputs are read in one call."""
+        return self._prefetch
+
+    @property
+    def drain_timeout(self):
+        """The longest to wait for in-flight requests on shutdown."""
+        return self._drain_timeout
+
+    @property
+    def metrics_port(self):
+        """Port of the metrics endpoint, 0 disables it."""
+        return self._metrics_port
+
+    @property
+    def profile_duration(self):
+        """Length of an on-demand profile, in seconds."""
+        return self._profile_duration
+
+    @property
+    def profile_dir(self):
+        """Where profiles are written, the log directory if not set."""
+        return self._profile_dir
+
+    @property
+    def trace_file(self):
+        """File transaction spans are appended to, tracing is off if not
+        set."""
+        return self._trace_file
+
+    @property
+    def audit_sample_rate(self):
+        """Share of transactions written to the audit log, 0 to 1."""
+        return self._audit_sample_rate
+
     def __repr__(self):
         # not including  password for opentsdb
         return \
-            "{}(connect={})".format(
+            "{}({})".format(
                 self.__class__.__name__,
-                repr(self._connect),
+                ", ".join(
+                    "{}={}".format(key, repr(value))
+                    for key, value in self.to_dict().items()),
             )
 
     def to_dict(self):
         return collections.OrderedDict([
             ('connect', self._connect),
+            ('workers', self._workers),
+            ('payload_cache_size', self._payload_cache_size),
+            ('bucket_cache_bytes', self._bucket_cache_bytes),
+            ('state_timeout', self._state_timeout),
+            ('state_read_retries', self._state_read_retries),
+            ('prefetch', self._prefetch),
+            ('drain_timeout', self._drain_timeout),
+            ('metrics_port', self._metrics_port),
+            ('profile_duration', self._profile_duration),
+            ('profile_dir', self._profile_dir),
+            ('trace_file', self._trace_file),
+            ('audit_sample_rate', self._audit_sample_rate),
         ])
 
     def to_toml_string(self):
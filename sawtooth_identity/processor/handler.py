@@ -13,14 +13,23 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+import collections
 import logging
 import pickle
+import time
 
 from sawtooth_sdk.processor.handler import TransactionHandler
 from sawtooth_sdk.processor.exceptions import InvalidTransaction
 from sawtooth_sdk.processor.exceptions import InternalError
 
-from sawtooth_identity.processor.identity_payload import IdentityPayload
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import FAMILY_VERSIONS
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.processor.metrics import Counter
+from sawtooth_identity.processor.audit import AuditLog
+from sawtooth_identity.processor.bucket_cache import BucketCache
+from sawtooth_identity.processor.payload_cache import PayloadCache
+from sawtooth_identity.processor.state_deadline import StateCallPolicy
 from sawtooth_identity.processor.identity_state import Identity
 from sawtooth_identity.processor.identity_state import IdentityState
 from sawtooth_identity.processor.identity_state import IDENTITY_NAMESPACE
@@ -28,42 +37,221 @@ from sawtooth_identity.processor.identity_state import IDENTITY_NAMESPACE
 
 LOGGER = logging.getLogger(__name__)
 
+# Inputs shorter than this are namespace prefixes, not single addresses
+_ADDRESS_LENGTH = 70
+
 
 class IdentityTransactionHandler(TransactionHandler):
 
+    def __init__(self, payload_cache=None, state_timeout=None, prefetch=True,
+                 state_read_retries=2, tracer=None, bucket_cache=None,
+                 audit_log=None):
+        """Constructor.
+
+        Args:
+            payload_cache (PayloadCache): Decoded payloads, a new cache of
+                the default size if not given.
+            state_timeout (float): The longest to wait for a validator state
+                call, IdentityState.TIMEOUT if not given. Shorter read
+                deadlines are derived from the observed latency.
+            prefetch (bool): Read all of a transaction's input addresses
+                with a single state call before applying it.
+            state_read_retries (int): Extra attempts for a timed out state
+                read.
+            tracer (TraceWriter): Records decode, state_read, state_write
+                and apply spans for every transaction, keyed by its header
+                signature.
+            bucket_cache (BucketCache): Decoded state buckets, a new cache
+                of the default size if not given.
+            audit_log (AuditLog): Receives an event for every sampled
+                transaction, a new log auditing every transaction if not
+                given.
+        """
+        # Decoded payloads are cached by payload_sha512 so that a
+        # transaction sent again during fork resolution or block
+        # re-validation is not decoded and validated from scratch.
+        if payload_cache is None:
+            payload_cache = PayloadCache()
+        self._payload_cache = payload_cache
+        # Decoded buckets are cached by a digest of their bytes, so a hot
+        # address is decoded once rather than by every transaction
+        if bucket_cache is None:
+            bucket_cache = BucketCache()
+        self._bucket_cache = bucket_cache
+        self._call_policy = StateCallPolicy(
+            max_timeout=IdentityState.TIMEOUT
+            if state_timeout is None else state_timeout,
+            read_retries=state_read_retries)
+        self._prefetch = prefetch
+        self._tracer = tracer
+        if audit_log is None:
+            audit_log = AuditLog()
+        self._audit_log = audit_log
+        self._version_counters = {
+            version: collections.OrderedDict(
+                (outcome, Counter())
+                for outcome in ('applied', 'invalid', 'migrated'))
+            for version in FAMILY_VERSIONS
+        }
+
+    @property
+    def payload_cache(self):
+        return self._payload_cache
+
+    @property
+    def bucket_cache(self):
+        return self._bucket_cache
+
+    @property
+    def audit_log(self):
+        return self._audit_log
+
+    @property
+    def call_policy(self):
+        return self._call_policy
+
     @property
     def family_name(self):
         return 'identity'
 
     @property
     def family_versions(self):
-        return ['0.1']
+        # 0.1 carries pickled payloads and writes pickled buckets, 0.2 the
+        # compact encodings of identity_codec
+        return list(FAMILY_VERSIONS)
+
+    def version_stats(self):
+        """Returns the applied and invalid transactions of each family
+        version, and how many of those applied were migrates.
+        """
+        return collections.OrderedDict(
+            (version, collections.OrderedDict(
+                (outcome, counter.value)
+                for outcome, counter in counters.items()))
+            for version, counters in self._version_counters.items())
 
     @property
     def namespaces(self):
         return [IDENTITY_NAMESPACE]
 
     def apply(self, transaction, context):
+        # The validator only sends the versions registered above
+        version = _family_version(transaction.header)
+        counters = self._version_counters[version]
+
+        # Unsampled transactions are not timed
+        audited = self._audit_log.sampled()
+        if audited:
+            began = time.perf_counter()
+            # Receives the payload once decoded, also when the
+            # transaction is then rejected
+            decoded = []
+        else:
+            decoded = None
+        outcome = 'applied'
+        try:
+            self._apply_traced(transaction, context, decoded)
+        except InvalidTransaction:
+            counters['invalid'].inc()
+            outcome = 'invalid'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            if audited:
+                self._audit(
+                    transaction, version, outcome,
+                    time.perf_counter() - began,
+                    decoded[0] if decoded else None)
+        counters['applied'].inc()
+
+    def _audit(self, transaction, version, outcome, seconds, payload):
+        # payload is None if it could not be decoded
+        if payload is None:
+            action = name = None
+        else:
+            action, name = payload.action, payload.name
+        self._audit_log.record(
+            transaction.signature, version, action, name,
+            transaction.header.signer_public_key, outcome, seconds)
+
+    def _apply_traced(self, transaction, context, decoded=None):
+        if self._tracer is None:
+            self._apply(transaction, context, decoded=decoded)
+            return
+
+        trace = transaction.signature
+        start = time.time()
+        began = time.perf_counter()
+        outcome = 'ok'
+        try:
+            self._apply(
+                transaction,
+                _TracedContext(context, self._tracer, trace),
+                trace=trace,
+                decoded=decoded)
+        except InvalidTransaction:
+            outcome = 'invalid'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self._tracer.record(
+                trace, 'apply', start, time.perf_counter() - began,
+                outcome=outcome)
+
+    def _apply(self, transaction, context, trace=None, decoded=None):
 
         header = transaction.header
         signer = header.signer_public_key
+        version = _family_version(header)
 
         # Unpack transaction
         # returns an IdentityPayload object that contain action, name
         # date_of_birth and gender
-        identity_payload = IdentityPayload.from_bytes(transaction.payload)
+        if trace is None:
+            identity_payload = self._payload_cache.get_payload(
+                header.payload_sha512, transaction.payload, version)
+        else:
+            with self._tracer.span(trace, 'decode'):
+                identity_payload = self._payload_cache.get_payload(
+                    header.payload_sha512, transaction.payload, version)
+        if decoded is not None:
+            decoded.append(identity_payload)
 
         # Retrieve state from context
-        identity_state = IdentityState(context)
+        identity_state = IdentityState(
+            context,
+            call_policy=self._call_policy,
+            bucket_cache=self._bucket_cache,
+            compact=version == COMPACT_FAMILY_VERSION)
+
+        # A rename touches two addresses, fetch them in one round trip
+        if self._prefetch:
+            identity_state.prefetch([
+                address for address in header.inputs
+                if len(address) == _ADDRESS_LENGTH
+            ])
 
         # Process transaction and save updated state data
         action = identity_payload.action
 
         # Checks if it's a valid action
-        if action not in ('create', 'delete', 'update'):
+        if action not in ('create', 'delete', 'update', 'rename', 'migrate'):
             raise InvalidTransaction('Unhandled action: {}'.format(
                 action))
 
+        # Anyone may migrate a bucket, its identities are left as they are
+        if action == 'migrate':
+            if not identity_state.migrate_identities(identity_payload.name):
+                raise InvalidTransaction(
+                    'Invalid action: no identities to migrate at the '
+                    'address of {}'.format(identity_payload.name))
+            self._version_counters[version]['migrated'].inc()
+            return
+
         # could use a variable name = identity_payload.name
         identity = identity_state.get_identity(identity_payload.name)
         
@@ -73,7 +261,12 @@ class IdentityTransactionHandler(TransactionHandler):
                 raise InvalidTransaction(
                     'Invalid action: name does not exist')
 
-            identity_state.delete_identity(identity)
+            if identity.owner != signer:
+                raise InvalidTransaction(
+                    "This identity does not belong to this user:" +
+                    " {}".format(signer[:6]))
+
+            identity_state.delete_identity(identity_payload.name)
 
         elif action == 'create':
 
@@ -87,10 +280,10 @@ class IdentityTransactionHandler(TransactionHandler):
             identity = Identity(
                 name=identity_payload.name,
                 date_of_birth=identity_payload.date_of_birth,
-                gender=identity_payload.gender)
+                gender=identity_payload.gender,
+                owner=signer)
 
             identity_state.set_identity(identity_payload.name, identity)
-            _display("Player {} created a new identity.".format(signer[:6]))
 
         elif action == 'update':
 
@@ -103,33 +296,80 @@ class IdentityTransactionHandler(TransactionHandler):
                     "This identity does not belong to this user:" +
                     " {}".format(signer[:6]))
 
-            # I don't believe there are any other validations required 
-            # as they're all built elsewhere.
-
-            # The update transaction that is received by the CLI has 
-            # already been manipulated, see identity_client.py.
+            expected_version = identity_payload.expected_version
+            if expected_version is not None and \
+                    identity.version != expected_version:
+                raise InvalidTransaction(
+                    'Invalid action: Identity {} is at version {}, '
+                    'expected {}'.format(
+                        identity_payload.name,
+                        identity.version,
+                        expected_version))
+
+            # The payload only carries the changed fields, they are merged
+            # into the identity currently in state.
             identity = _update_identity(identity, identity_payload)
             identity_state.set_identity(identity_payload.name, identity)
-            _display("User {} has updated identity with the name {}."
-                .format(signer[:6], identity_payload.name))
+
+        elif action == 'rename':
+
+            if identity is None:
+                raise InvalidTransaction(
+                    'Invalid action: Rename requires an existing identity')
+
+            if identity.owner != signer:
+                raise InvalidTransaction(
+                    "This identity does not belong to this user:" +
+                    " {}".format(signer[:6]))
+
+            new_name = identity_payload.new_name
+
+            if identity_state.get_identity(new_name) is not None:
+                raise InvalidTransaction(
+                    'Invalid action: Identity already exists: {}'.format(
+                        new_name))
+
+            # The transaction declares both the old and the new address,
+            # so the record is moved within this single apply.
+            identity_state.delete_identity(identity_payload.name)
+            identity_state.set_identity(
+                new_name,
+                identity.replace(name=new_name, version=identity.version + 1))
+
+def _family_version(header):
+    # Requests built by hand, e.g. in benchmarks, may leave it out
+    return header.family_version or LEGACY_FAMILY_VERSION
+
+
+class _TracedContext(object):
+    """Forwards the state calls of one transaction to the context, and
+    records each of them as a span.
+    """
+
+    def __init__(self, context, tracer, trace):
+        self._context = context
+        self._tracer = tracer
+        self._trace = trace
+
+    def get_state(self, addresses, timeout=None):
+        with self._tracer.span(self._trace, 'state_read',
+                               addresses=len(addresses)):
+            return self._context.get_state(addresses, timeout=timeout)
+
+    def set_state(self, entries, timeout=None):
+        with self._tracer.span(self._trace, 'state_write',
+                               addresses=len(entries)):
+            return self._context.set_state(entries, timeout=timeout)
+
+    def delete_state(self, addresses, timeout=None):
+        with self._tracer.span(self._trace, 'state_write',
+                               addresses=len(addresses), delete=True):
+            return self._context.delete_state(addresses, timeout=timeout)
 
 def _update_identity(identity, payload):
-    identity.name = payload.name
-    identity.date_of_birth = payload.date_of_birth
-    identity.gender = payload.gender
-
-def _display(msg):
-    n = msg.count("\n")
-
-    if n > 0:
-        msg = msg.split("\n")
-        length = max(len(line) for line in msg)
-    else:
-        length = len(msg)
-        msg = [msg]
-
-    # pylint: disable=logging-not-lazy
-    LOGGER.debug("+" + (length + 2) * "-" + "+")
-    for line in msg:
-        LOGGER.debug("+ " + line.center(length) + " +")
-    LOGGER.debug("+" + (length + 2) * "-" + "+")
+    # identity is read-only and may be shared through the bucket cache, the
+    # update is written to a copy
+    return identity.replace(
+        date_of_birth=payload.date_of_birth or identity.date_of_birth,
+        gender=payload.gender or identity.gender,
+        version=identity.version + 1)
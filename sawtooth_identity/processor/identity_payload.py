@@ -16,25 +16,48 @@
 import pickle
 from sawtooth_sdk.processor.exceptions import InvalidTransaction
 
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.identity_codec import decode_payload
+
+
+# The actions each family version accepts; a migrate rewrites a bucket in
+# the compact encoding without changing it
+_VERSION_ACTIONS = {
+    LEGACY_FAMILY_VERSION: ('create', 'update', 'delete', 'rename'),
+    COMPACT_FAMILY_VERSION:
+        ('create', 'update', 'delete', 'rename', 'migrate'),
+}
+
 
 class IdentityPayload(object):
 
-    def __init__(self, payload):
+    def __init__(self, payload, family_version=LEGACY_FAMILY_VERSION):
         try:
-            # The payload is pickle encoded dictionary
-            decoded_payload = pickle.loads(payload)
-        except ValueError:
+            if family_version == COMPACT_FAMILY_VERSION:
+                decoded_payload = decode_payload(payload)
+            else:
+                # The payload is pickle encoded dictionary
+                decoded_payload = pickle.loads(payload)
+        except (ValueError, EOFError, pickle.UnpicklingError):
             raise InvalidTransaction("Invalid payload serialization")
         else:
-            action = decoded_payload["Action"]
-            name = decoded_payload["Name"]
-            date_of_birth = decoded_payload["Date_of_birth"]
-            gender = decoded_payload["Gender"]
+            try:
+                action = decoded_payload["Action"]
+                name = decoded_payload["Name"]
+                date_of_birth = decoded_payload["Date_of_birth"]
+                gender = decoded_payload["Gender"]
+                # Only rename payloads carry the new name
+                new_name = decoded_payload.get("New_name", '')
+                # Updates may require the identity to be at a given version
+                expected_version = decoded_payload.get("Expected_version")
+            except (KeyError, TypeError, AttributeError):
+                raise InvalidTransaction("Invalid payload serialization")
 
         if not action:
             raise InvalidTransaction('Action is required')
 
-        if action not in ('create', 'update', 'delete'):
+        if action not in _VERSION_ACTIONS.get(family_version, ()):
             raise InvalidTransaction('Invalid action: {}'.format(action))
 
         # You can add additional validation checks here if necessary e.g.
@@ -57,27 +80,57 @@ class IdentityPayload(object):
         if '|' in name:
             raise InvalidTransaction('Name cannot contain "|"')
 
-        if not date_of_birth:
-            raise InvalidTransaction('Date_of_birth is required')
+        if action == 'rename':
+            if not new_name:
+                raise InvalidTransaction('New_name is required')
+
+            if '|' in new_name:
+                raise InvalidTransaction('New_name cannot contain "|"')
+
+            if new_name == name:
+                raise InvalidTransaction('New_name must differ from Name')
+
+        # Delete and rename only need the name(s) of the identity
+        if action == 'create':
+            if not date_of_birth:
+                raise InvalidTransaction('Date_of_birth is required')
+
+            # Will not be implementing any validation checks to verify that
+            # DOB is a legitimate DOB
 
-        # Will not be implementing any validation checks to verify that
-        # DOB is a legitimate DOB
+            if not gender:
+                raise InvalidTransaction('Gender is required')
+
+        # Updates only carry the fields that change, empty fields are
+        # left as they are in state
+        if action == 'update':
+            if not date_of_birth and not gender:
+                raise InvalidTransaction(
+                    'Update requires Date_of_birth or Gender')
+
+            if expected_version is not None and \
+                    (not isinstance(expected_version, int) or
+                     isinstance(expected_version, bool) or
+                     expected_version < 0):
+                raise InvalidTransaction(
+                    'Invalid Expected_version: {}'.format(expected_version))
 
-        if not gender:
-            raise InvalidTransaction('Gender is required')
-            
         # Maybe gender validation may not really be necessary in this day and age
-        if gender not in ('m', 'f', 'M', 'F', 'male', 'female', 'Male', 'Female'):
-            raise InvalidTransaction('Invalid gender: {}'.format(action))
+        if gender and \
+                gender not in ('m', 'f', 'M', 'F', 'male', 'female', 'Male', 'Female'):
+            raise InvalidTransaction('Invalid gender: {}'.format(gender))
 
         self._action = action
         self._name = name
+        self._new_name = new_name
         self._date_of_birth = date_of_birth
         self._gender = gender
+        self._expected_version = \
+            expected_version if action == 'update' else None
 
     @staticmethod
-    def from_bytes(payload):
-        return IdentityPayload(payload=payload)
+    def from_bytes(payload, family_version=LEGACY_FAMILY_VERSION):
+        return IdentityPayload(payload=payload, family_version=family_version)
 
     @property
     def action(self):
@@ -87,10 +140,18 @@ class IdentityPayload(object):
     def name(self):
         return self._name
 
+    @property
+    def new_name(self):
+        return self._new_name
+
     @property
     def date_of_birth(self):
         return self._date_of_birth
 
     @property
     def gender(self):
-        return self._gender    
+        return self._gender
+
+    @property
+    def expected_version(self):
+        return self._expected_version
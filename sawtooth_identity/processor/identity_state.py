@@ -14,49 +14,131 @@
 # -----------------------------------------------------------------------------
 
 import hashlib
-import pickle
 from sawtooth_sdk.processor.exceptions import InternalError
 
+from sawtooth_identity.identity_codec import decode_identities
+from sawtooth_identity.identity_codec import encode_identities
+from sawtooth_identity.identity_codec import is_compact
+from sawtooth_identity.processor.state_deadline import StateCallPolicy
+
 
 IDENTITY_NAMESPACE = hashlib.sha512('identity'.encode("utf-8")).hexdigest()[0:6]
 
-def _make_identity_address(self, name):
-    return IDENTITY_NAMESPACE + \
-        hashlib.sha512(name.encode('utf-8')).hexdigest()[0:6] + \
-        hashlib.sha512(self._signer.get_public_key().as_hex().encode('utf-8'))[-58:]
+def _make_identity_address(name):
+    # The address only depends on the name, so that anyone can look an
+    # identity up and a rename has to move the record to a new address.
+    name_hash = hashlib.sha512(name.encode('utf-8')).hexdigest()
+    return IDENTITY_NAMESPACE + name_hash[0:6] + name_hash[-58:]
 
 
 class Identity(object):
-    def __init__(self, name, date_of_birth, gender):
-        self.name = name
-        self.date_of_birth = date_of_birth
-        self.gender = gender
-        self._owner = self._signer.get_public_key().as_hex()
+    """An identity record. Records are read-only, as decoded records are
+    shared between transactions through the bucket cache; replace()
+    returns a changed copy.
+    """
+
+    # Records pickled before versions were tracked load as version 0
+    version = 0
+
+    def __init__(self, name, date_of_birth, gender, owner, version=0):
+        # The attributes, and their order, make up the pickled state
+        set_attribute = super().__setattr__
+        set_attribute('name', name)
+        set_attribute('date_of_birth', date_of_birth)
+        set_attribute('gender', gender)
+        set_attribute('_owner', owner)
+        # Incremented by every update, checked against Expected_version
+        set_attribute('version', version)
 
     @property
     def owner(self):
         return self._owner
-    
+
+    def replace(self, **changes):
+        """Returns a copy of the identity with the given fields changed,
+        e.g. replace(gender='f', version=2).
+        """
+        fields = {
+            'name': self.name,
+            'date_of_birth': self.date_of_birth,
+            'gender': self.gender,
+            'owner': self._owner,
+            'version': self.version,
+        }
+        unknown = set(changes) - set(fields)
+        if unknown:
+            raise TypeError('Unknown identity fields: {}'.format(
+                ', '.join(sorted(unknown))))
+        fields.update(changes)
+        return Identity(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Identity records are read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('Identity records are read-only')
+
 
 class IdentityState(object):
 
     TIMEOUT = 3
 
-    def __init__(self, context):
+    def __init__(self, context, timeout=None, call_policy=None,
+                 compact=False, bucket_cache=None):
         """Constructor.
 
         Args:
             context (sawtooth_sdk.processor.context.Context): Access to
                 validator state from within the transaction processor.
+            timeout (float): The longest to wait for a validator state
+                call, TIMEOUT if not given. Ignored if call_policy is given.
+            call_policy (StateCallPolicy): Deadlines and retries for state
+                calls, shared across transactions so read deadlines can
+                adapt to the observed latency.
+            compact (bool): Write buckets in the compact encoding, as
+                family version 0.2 transactions do. Buckets that are
+                compact already are written compact either way.
+            bucket_cache (BucketCache): Decoded buckets shared across
+                transactions, whose identities are then shared as well.
+                Every bucket is decoded if not given.
         """
 
         # context refers to the validator state.
         self._context = context
+        if call_policy is None:
+            call_policy = StateCallPolicy(
+                max_timeout=self.TIMEOUT if timeout is None else timeout)
+        self._call_policy = call_policy
+        self._compact = compact
+        self._bucket_cache = bucket_cache
 
         # The IdentityState has its own cache for optimisation to reduce number
         # of REST api calls. Cache = {Address: serialized state data}
         self._address_cache = {}
 
+    def prefetch(self, addresses):
+        """Load every address in addresses with a single validator call.
+
+        Args:
+            addresses (list of str): Addresses, e.g. the transaction inputs.
+        """
+
+        addresses = [
+            address for address in addresses
+            if address not in self._address_cache
+        ]
+        if not addresses:
+            return
+
+        state_entries = self._call_policy.get_state(
+            self._context, addresses)
+
+        # Addresses without a value are cached as empty
+        for address in addresses:
+            self._address_cache[address] = None
+        for entry in state_entries:
+            self._address_cache[entry.address] = entry.data
+
     # loads the identity with the name name
     def get_identity(self, name):
         """Get the identity associated with name.
@@ -118,34 +200,55 @@ class IdentityState(object):
 
         self._store_identity(name, identities=identities)
 
-    def _store_identity(self, name, identities):
-        address = _make_identity_address(self, name)
+    def migrate_identities(self, name):
+        """Rewrites the bucket holding name in the compact encoding.
 
-        state_data = self._serialize(identities)
+        Returns:
+            (bool): False if there is no such bucket.
+        """
+        identities = self._load_identities(name=name)
+        if not identities:
+            return False
+
+        # Already migrated, leave state untouched
+        if not is_compact(self._address_cache[_make_identity_address(name)]):
+            self._store_identity(name, identities=identities, compact=True)
+        return True
+
+    def _store_identity(self, name, identities, compact=False):
+        address = _make_identity_address(name)
+
+        # A bucket stays compact once migrated, whatever version writes it
+        # next. Only the value at this address counts: which other inputs
+        # were read depends on the node-local prefetch setting, and the
+        # bytes written must be the same on every validator.
+        compact = compact or self._compact or \
+            is_compact(self._address_cache.get(address))
+        state_data = self._serialize(identities, compact=compact)
+        if self._bucket_cache is not None:
+            self._bucket_cache.put(state_data, identities.values())
 
         # add to address cache for the IdentityState object
         self._address_cache[address] = state_data
 
         # add into the validator's state
-        self._context.set_state(
-            {address: state_data},
-            timeout=self.TIMEOUT)
+        self._call_policy.set_state(
+            self._context, {address: state_data})
 
     def _delete_identity(self, name):
-        address = _make_identity_address(self, name)
+        address = _make_identity_address(name)
 
         # remove from address cache for the IdentityState object
         self._address_cache[address] = None
 
         # remove from the validator's state
-        self._context.delete_state(
-            [address],
-            timeout=self.TIMEOUT)
+        self._call_policy.delete_state(
+            self._context, [address])
 
     def _load_identities(self, name):
 
         # gets the address of identity with name name
-        address = _make_identity_address(self, name)
+        address = _make_identity_address(name)
 
         # Checks if address is a valid key the cache (dict)
         if address in self._address_cache:
@@ -153,15 +256,17 @@ class IdentityState(object):
             # retrieve the serialized identities
             serialized_identities = self._address_cache[address]
 
-            # deserialize and return
-            identities = self._deserialize(data=serialized_identities)
+            # deserialize and return, None marks an empty or deleted address
+            if serialized_identities is None:
+                identities = {}
+            else:
+                identities = self._deserialize(data=serialized_identities)
 
         # If address cannot be found in cache, look at context (validator state)
         else:
 
-            state_entries = self._context.get_state(
-                [address],
-                timeout=self.TIMEOUT)
+            state_entries = self._call_policy.get_state(
+                self._context, [address])
 
             # If something was retrieved from validator state, update cache
             if state_entries:
@@ -190,7 +295,7 @@ class IdentityState(object):
         identity objects.
 
         Args:
-            data (bytes): The pickle encoded identity stored in state.
+            data (bytes): The encoded identities stored in state.
 
         Returns:
             (dict): identity name (str) keys, identity values.
@@ -198,7 +303,11 @@ class IdentityState(object):
 
         identities = {}
         try:
-            for identity in pickle.loads(data):
+            if self._bucket_cache is None:
+                decoded = decode_identities(data)
+            else:
+                decoded = self._bucket_cache.get_identities(data)
+            for identity in decoded:
                 name = identity.name
                 identities[name] = identity
         except ValueError:
@@ -206,19 +315,20 @@ class IdentityState(object):
 
         return identities
 
-    def _serialize(self, identities):
+    def _serialize(self, identities, compact=False):
         """Takes a dict of identity objects, convert into an array
         before serializing the entire array into bytes all together.
 
         Args:
             identities (dict): identity name (str) keys, identity values.
+            compact (bool): Use the compact encoding.
 
         Returns:
-            (bytes): The pickle encoded identity stored in state.
+            (bytes): The encoded identities to store in state.
         """
 
         serialized_identities = []
         for _, identity in identities.items():
             serialized_identities.append(identity)
 
-        return pickle.dumps(serialized_identity, protocol=pickle.HIGHEST_PROTOCOL)
+        return encode_identities(serialized_identities, compact=compact)
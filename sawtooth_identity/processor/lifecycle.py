@@ -0,0 +1,319 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+from sawtooth_sdk.processor.core import TransactionProcessor
+
+from sawtooth_identity.processor.metrics import METRICS
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Once unregistered, a connection is closed after receiving nothing for
+# this long, as the SDK does on KeyboardInterrupt: requests the validator
+# sent before it saw the unregistration are still processed
+DRAIN_IDLE_SECONDS = 1.0
+
+
+def sd_notify(state):
+    """Sends state, e.g. 'READY=1', to systemd if it started the process
+    with Type=notify. Returns whether a notification was sent.
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+
+    # A leading @ names a socket in the abstract namespace
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode('utf-8'))
+    except OSError as err:
+        LOGGER.warning("Unable to notify systemd: %s", err)
+        return False
+
+    return True
+
+
+class _SupervisedProcessor(TransactionProcessor):
+    """A TransactionProcessor that reports its registrations and the
+    requests it is processing to its ProcessorSupervisor.
+
+    It hooks into the private _register, _unregister and _process methods
+    and the _stream of the SDK's TransactionProcessor, as of sawtooth-sdk
+    1.2.5; setup.py pins the SDK to that release series.
+    """
+
+    def __init__(self, url, supervisor):
+        super().__init__(url)
+        self._supervisor = supervisor
+        self._in_flight = 0
+        self._last_active = time.monotonic()
+        self._stopped = False
+        self.registered_once = False
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def idle_since(self):
+        """Returns when the last request finished, or None while one is
+        being processed.
+        """
+        if self._in_flight:
+            return None
+        return self._last_active
+
+    @property
+    def connected(self):
+        return self._stream.is_ready()
+
+    def unregister(self):
+        # Unregistering waits for the connection, skip it when there is none
+        if self._stream.is_ready():
+            self._unregister()
+
+    def stop(self):
+        # start() already stops the processor after a failed registration,
+        # and closing the stream a second time may raise
+        if self._stopped:
+            return
+        self._stopped = True
+        try:
+            super().stop()
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.debug("Unable to close the validator stream",
+                         exc_info=True)
+
+    def _register(self):
+        super()._register()
+        self._supervisor._registered(self)
+
+    def _process(self, msg):
+        self._in_flight += 1
+        self._last_active = time.monotonic()
+        try:
+            super()._process(msg)
+        finally:
+            self._last_active = time.monotonic()
+            self._in_flight -= 1
+
+
+class ProcessorSupervisor(object):
+    """Runs the validator connections of the transaction processor.
+
+    A connection whose processor stops, e.g. after a failed registration,
+    is replaced with exponential backoff instead of exiting the process, so
+    the handler, and the payload cache and state deadlines it holds, stay
+    warm. The SDK reconnects a dropped stream by itself; the supervisor
+    times how long the stream was down until it registered again.
+
+    On SIGTERM or SIGINT every connection unregisters, so the validator
+    stops sending requests. Each connection keeps processing the requests
+    already sent to it, and is closed once it has received nothing for
+    DRAIN_IDLE_SECONDS, or when drain_timeout seconds have passed. systemd
+    is notified once the first registration succeeds and when draining
+    starts.
+    """
+
+    def __init__(self, url, handler, workers=1, drain_timeout=10.0,
+                 backoff=0.5, max_backoff=30.0):
+        """Constructor.
+
+        Args:
+            url (str): Endpoint of the validator.
+            handler (TransactionHandler): Shared by every connection.
+            workers (int): Number of validator connections.
+            drain_timeout (float): The longest to process the requests
+                still arriving on shutdown, in seconds.
+            backoff (float): First delay before replacing a stopped
+                connection, doubled on every consecutive failure.
+            max_backoff (float): Longest delay between replacements.
+        """
+        self._url = url
+        self._handler = handler
+        self._workers = workers
+        self._drain_timeout = drain_timeout
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._processors = [None] * workers
+        self._disconnected_at = {}
+        self._ready = False
+
+        self._restarts = METRICS.counter('tp_restarts')
+        self._reconnects = METRICS.counter('tp_reconnects')
+        self._registrations = 0
+        self._last_reconnect_seconds = None
+        self._max_reconnect_seconds = None
+
+    def stats(self):
+        processors = [p for p in self._processors if p is not None]
+        return collections.OrderedDict([
+            ('ready', self._ready),
+            ('draining', self._stopping.is_set()),
+            ('connected', sum(1 for p in processors if p.connected)),
+            ('in_flight', sum(p.in_flight for p in processors)),
+            ('registrations', self._registrations),
+            ('last_reconnect_seconds', self._last_reconnect_seconds),
+            ('max_reconnect_seconds', self._max_reconnect_seconds),
+        ])
+
+    def install_signal_handlers(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+    def run(self, poll_interval=0.1):
+        """Runs the connections until stop() is called or a termination
+        signal arrives, then drains them. Must be called from the main
+        thread when signal handlers are installed.
+        """
+        for slot in range(self._workers):
+            threading.Thread(
+                target=self._run_connection,
+                args=(slot,),
+                name='identity-tp-{}'.format(slot),
+                daemon=True).start()
+
+        # Waiting with a timeout leaves room for signal handlers to run,
+        # and for noticing when a stream drops
+        while not self._stopping.wait(poll_interval):
+            self._watch_connections()
+
+        self._drain()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _handle_signal(self, signum, frame):
+        LOGGER.info(
+            "Received %s, draining", signal.Signals(signum).name)
+        self._stopping.set()
+
+    def _run_connection(self, slot):
+        failures = 0
+        while not self._stopping.is_set():
+            processor = _SupervisedProcessor(self._url, self)
+            processor.add_handler(self._handler)
+            with self._lock:
+                self._processors[slot] = processor
+
+            try:
+                processor.start()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Validator connection %s failed", slot)
+
+            if self._stopping.is_set():
+                return
+
+            processor.stop()
+            self._restarts.inc()
+            with self._lock:
+                if self._disconnected_at.get(slot) is None:
+                    self._disconnected_at[slot] = time.monotonic()
+
+            if processor.registered_once:
+                failures = 0
+            delay = min(self._max_backoff, self._backoff * 2 ** failures)
+            failures += 1
+            delay = random.uniform(delay / 2, delay)
+            LOGGER.warning(
+                "Validator connection %s stopped, reconnecting in %.1fs",
+                slot, delay)
+            self._stopping.wait(delay)
+
+    def _watch_connections(self):
+        now = time.monotonic()
+        with self._lock:
+            for slot, processor in enumerate(self._processors):
+                # A stream that never registered is still connecting
+                if processor is None or processor.connected or \
+                        not processor.registered_once:
+                    continue
+                if self._disconnected_at.get(slot) is None:
+                    LOGGER.warning("Validator connection %s dropped", slot)
+                    self._disconnected_at[slot] = now
+
+    def _registered(self, processor):
+        with self._lock:
+            slot = self._processors.index(processor)
+            disconnected_at = self._disconnected_at.pop(slot, None)
+            self._registrations += 1
+            processor.registered_once = True
+
+            if disconnected_at is not None:
+                seconds = time.monotonic() - disconnected_at
+                self._reconnects.inc()
+                self._last_reconnect_seconds = seconds
+                self._max_reconnect_seconds = max(
+                    seconds, self._max_reconnect_seconds or 0.0)
+                LOGGER.info(
+                    "Validator connection %s registered again after %.2fs",
+                    slot, seconds)
+
+            if self._ready:
+                return
+            self._ready = True
+
+        sd_notify('READY=1')
+        LOGGER.info("Registered with the validator at %s", self._url)
+
+    def _drain(self):
+        sd_notify('STOPPING=1')
+        processors = [p for p in self._processors if p is not None]
+
+        for processor in processors:
+            try:
+                processor.unregister()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Unable to unregister from the validator")
+
+        # The receive loops keep running in the connection threads; each
+        # connection is closed once it has been idle long enough, so
+        # requests queued on its stream are not dropped
+        unregistered_at = time.monotonic()
+        deadline = unregistered_at + self._drain_timeout
+        draining = list(processors)
+        while draining:
+            now = time.monotonic()
+            if now >= deadline:
+                LOGGER.warning(
+                    "Stopping with %s requests still in flight",
+                    sum(p.in_flight for p in draining))
+                break
+            for processor in list(draining):
+                idle_since = processor.idle_since()
+                if idle_since is not None and \
+                        now - max(idle_since, unregistered_at) >= \
+                        DRAIN_IDLE_SECONDS:
+                    processor.stop()
+                    draining.remove(processor)
+            time.sleep(0.05)
+
+        for processor in draining:
+            processor.stop()
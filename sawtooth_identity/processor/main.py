@@ -13,25 +13,37 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+from __future__ import print_function
+
 import sys
 import os
 import argparse
+import logging
 import pkg_resources
 
 # Adding the necessary path to PYTHONPATH
 path = os.path.dirname(os.path.dirname(os.getcwd()))
 sys.path.append(path)
 
-from sawtooth_sdk.processor.core import TransactionProcessor
 from sawtooth_sdk.processor.log import init_console_logging
 from sawtooth_sdk.processor.log import log_configuration
 from sawtooth_sdk.processor.config import get_log_config
 from sawtooth_sdk.processor.config import get_log_dir
 from sawtooth_sdk.processor.config import get_config_dir
+from sawtooth_identity.identity_tracing import TraceWriter
 from sawtooth_identity.processor.handler import IdentityTransactionHandler
+from sawtooth_identity.processor.lifecycle import ProcessorSupervisor
+from sawtooth_identity.processor.metrics import METRICS
+from sawtooth_identity.processor.metrics import MetricsServer
+from sawtooth_identity.processor.audit import AuditLog
+from sawtooth_identity.processor.bucket_cache import BucketCache
+from sawtooth_identity.processor.payload_cache import PayloadCache
+from sawtooth_identity.processor.profiling import ProfilingHooks
 from sawtooth_identity.processor.config.identity import IdentityConfig
 from sawtooth_identity.processor.config.identity import \
     load_default_identity_config
+from sawtooth_identity.processor.config.identity import \
+    load_env_identity_config
 from sawtooth_identity.processor.config.identity import \
     load_toml_identity_config
 from sawtooth_identity.processor.config.identity import \
@@ -40,6 +52,8 @@ from sawtooth_identity.processor.config.identity import \
 
 DISTRIBUTION_NAME = 'sawtooth-identity'
 
+LOGGER = logging.getLogger(__name__)
+
 
 def parse_args(args):
     parser = argparse.ArgumentParser(
@@ -49,6 +63,75 @@ def parse_args(args):
         '-C', '--connect',
         help='Endpoint for the validator connection')
 
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Number of validator connections handling transactions')
+
+    parser.add_argument(
+        '--payload-cache-size',
+        type=int,
+        help='Number of decoded payloads to cache, 0 to disable')
+
+    parser.add_argument(
+        '--bucket-cache-bytes',
+        type=int,
+        help='Encoded size in bytes of the decoded state buckets to cache, '
+        '0 to disable')
+
+    parser.add_argument(
+        '--state-timeout',
+        type=float,
+        help='The longest to wait for a validator state call, in seconds')
+
+    parser.add_argument(
+        '--state-read-retries',
+        type=int,
+        help='Extra attempts for a timed out state read')
+
+    parser.add_argument(
+        '--prefetch',
+        action='store_true',
+        default=None,
+        help='Read all transaction inputs with a single state call')
+
+    parser.add_argument(
+        '--no-prefetch',
+        action='store_false',
+        dest='prefetch',
+        help='Read transaction inputs one address at a time')
+
+    parser.add_argument(
+        '--drain-timeout',
+        type=float,
+        help='The longest to process the requests still arriving on '
+        'shutdown, in seconds')
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help='Port of the local metrics endpoint, 0 to disable')
+
+    parser.add_argument(
+        '--profile-duration',
+        type=int,
+        help='Length of an on-demand profile, in seconds, at most 3600')
+
+    parser.add_argument(
+        '--profile-dir',
+        help='Directory profiles are written to, the log directory '
+        'by default')
+
+    parser.add_argument(
+        '--trace-file',
+        help='File to append the spans of every transaction to, for '
+        'identity-trace')
+
+    parser.add_argument(
+        '--audit-sample-rate',
+        type=float,
+        help='Share of transactions written to the audit log, from 0 to 1')
+
     parser.add_argument('-v', '--verbose',
                         action='count',
                         default=0,
@@ -75,27 +158,42 @@ def load_identity_config(first_config):
     conf_file = os.path.join(get_config_dir(), 'identity.toml')
 
     toml_config = load_toml_identity_config(conf_file)
+    env_config = load_env_identity_config()
 
     return merge_identity_config(
-        configs=[first_config, toml_config, default_identity_config])
+        configs=[first_config, env_config, toml_config,
+                 default_identity_config])
 
 
 def create_identity_config(args):
-    return IdentityConfig(connect=args.connect)
+    return IdentityConfig(
+        connect=args.connect,
+        workers=args.workers,
+        payload_cache_size=args.payload_cache_size,
+        bucket_cache_bytes=args.bucket_cache_bytes,
+        state_timeout=args.state_timeout,
+        state_read_retries=args.state_read_retries,
+        prefetch=args.prefetch,
+        drain_timeout=args.drain_timeout,
+        metrics_port=args.metrics_port,
+        profile_duration=args.profile_duration,
+        profile_dir=args.profile_dir,
+        trace_file=args.trace_file,
+        audit_sample_rate=args.audit_sample_rate)
 
 
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
     opts = parse_args(args)
-    processor = None
+    metrics_server = None
+    tracer = None
+    audit_log = None
     try:
-        print("here 1")
         arg_config = create_identity_config(opts)
         identity_config = load_identity_config(arg_config)
-        processor = TransactionProcessor(url=identity_config.connect)
         log_config = get_log_config(filename="identity_log_config.toml")
-        print("here 2")
+
         # If no toml, try loading yaml
         if log_config is None:
             log_config = get_log_config(filename="identity_log_config.yaml")
@@ -104,26 +202,79 @@ def main(args=None):
             log_configuration(log_config=log_config)
         else:
             log_dir = get_log_dir()
-            # use the transaction processor zmq identity for filename
+            # use the process id for the filename, connections to the
+            # validator come and go over the life of the process
             log_configuration(
                 log_dir=log_dir,
-                name="identity-" + str(processor.zmq_id)[2:-1])
-        print('here 3')
+                name="identity-{}".format(os.getpid()))
+
         init_console_logging(verbose_level=opts.verbose)
-        print('here 4')
-        handler = IdentityTransactionHandler()
-        print('here 5')
-        processor.add_handler(handler)
-        print('here 6')
-        processor.start()
-        print('here 7')
-    except KeyboardInterrupt:
-        pass
+
+        LOGGER.info("Identity transaction processor configuration:")
+        for line in identity_config.to_toml_string():
+            LOGGER.info("  %s", line)
+
+        payload_cache = PayloadCache(
+            size=identity_config.payload_cache_size)
+        METRICS.add_source('payload_cache', payload_cache.stats)
+
+        bucket_cache = BucketCache(
+            max_bytes=identity_config.bucket_cache_bytes)
+        METRICS.add_source('bucket_cache', bucket_cache.stats)
+
+        if identity_config.trace_file:
+            tracer = TraceWriter(identity_config.trace_file, source='tp')
+
+        audit_log = AuditLog(sample_rate=identity_config.audit_sample_rate)
+        METRICS.add_source('audit', audit_log.stats)
+
+        handler = IdentityTransactionHandler(
+            payload_cache=payload_cache,
+            bucket_cache=bucket_cache,
+            state_timeout=identity_config.state_timeout,
+            state_read_retries=identity_config.state_read_retries,
+            prefetch=identity_config.prefetch,
+            tracer=tracer,
+            audit_log=audit_log)
+        METRICS.add_source('state_deadlines', handler.call_policy.stats)
+        METRICS.add_source('family_versions', handler.version_stats)
+
+        profiling = ProfilingHooks(
+            handler,
+            output_dir=identity_config.profile_dir or get_log_dir(),
+            duration=identity_config.profile_duration)
+        profiling.install()
+
+        # Every extra worker is another connection to the validator, which
+        # spreads transactions across all processors registered for the
+        # family.
+        supervisor = ProcessorSupervisor(
+            identity_config.connect,
+            handler,
+            workers=identity_config.workers,
+            drain_timeout=identity_config.drain_timeout)
+        supervisor.install_signal_handlers()
+        METRICS.add_source('lifecycle', supervisor.stats)
+
+        if identity_config.metrics_port:
+            metrics_server = MetricsServer(
+                identity_config.metrics_port, profiling=profiling)
+            metrics_server.start()
+
+        supervisor.run()
     except Exception as e:  # pylint: disable=broad-except
-        print("Error: {}".format(e))
+        LOGGER.exception("Identity transaction processor failed")
+        print("Error: {}".format(e), file=sys.stderr)
+        # A non-zero exit lets systemd restart the processor
+        sys.exit(1)
     finally:
-        if processor is not None:
-            processor.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if tracer is not None:
+            tracer.close()
+        if audit_log is not None:
+            # Events still queued are written before exiting
+            audit_log.close(timeout=5)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import json
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from sawtooth_identity.processor.profiling import MAX_PROFILE_DURATION
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Counter(object):
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        return self._value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+
+class MetricsRegistry(object):
+    """Counters, plus sources that report a dict of values when the metrics
+    are read (e.g. PayloadCache.stats).
+    """
+
+    def __init__(self):
+        self._counters = collections.OrderedDict()
+        self._sources = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def counter(self, name):
+        """Returns the Counter called name, creating it if needed."""
+        with self._lock:
+            try:
+                return self._counters[name]
+            except KeyError:
+                counter = self._counters[name] = Counter()
+                return counter
+
+    def add_source(self, name, stats):
+        """Report the dict returned by calling stats under name."""
+        with self._lock:
+            self._sources[name] = stats
+
+    def snapshot(self):
+        with self._lock:
+            counters = list(self._counters.items())
+            sources = list(self._sources.items())
+
+        metrics = collections.OrderedDict(
+            (name, counter.value) for name, counter in counters)
+        for name, stats in sources:
+            metrics[name] = stats()
+
+        return metrics
+
+
+# The process wide registry
+METRICS = MetricsRegistry()
+
+
+class MetricsServer(object):
+    """Serves the metrics as JSON on GET /metrics. When profiling hooks are
+    given, POST /profile/cpu and POST /profile/memory start a capture; an
+    optional ?duration=<seconds> overrides its length, up to
+    MAX_PROFILE_DURATION.
+    """
+
+    def __init__(self, port, registry=METRICS, profiling=None,
+                 host='127.0.0.1'):
+        self._registry = registry
+        self._profiling = profiling
+        self._server = ThreadingHTTPServer(
+            (host, port), self._create_request_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='identity-metrics',
+            daemon=True)
+        self._thread.start()
+        LOGGER.info("Serving metrics on port %s", self.port)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_request_handler(self):
+        registry = self._registry
+        profiling = self._profiling
+
+        class _MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if urlparse(self.path).path != '/metrics':
+                    self._reply(404, {'error': 'not found'})
+                    return
+                self._reply(200, registry.snapshot())
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                starters = {}
+                if profiling is not None:
+                    starters = {
+                        '/profile/cpu': profiling.start_cpu_profile,
+                        '/profile/memory': profiling.start_memory_profile,
+                    }
+                if url.path not in starters:
+                    self._reply(404, {'error': 'not found'})
+                    return
+
+                duration = parse_qs(url.query).get('duration')
+                try:
+                    duration = float(duration[0]) if duration else None
+                except ValueError:
+                    self._reply(400, {'error': 'invalid duration'})
+                    return
+                # Limited like the configured profile_duration
+                if duration is not None and not (
+                        math.isfinite(duration) and
+                        0 < duration <= MAX_PROFILE_DURATION):
+                    self._reply(400, {
+                        'error': 'duration must be more than 0 and at most '
+                                 '{} seconds'.format(MAX_PROFILE_DURATION)})
+                    return
+
+                if starters[url.path](duration):
+                    self._reply(202, {'status': 'started'})
+                else:
+                    self._reply(409, {'status': 'already running'})
+
+            def _reply(self, status, body):
+                content = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                # pylint: disable=redefined-builtin
+                LOGGER.debug("metrics: " + format, *args)
+
+        return _MetricsRequestHandler
@@ -0,0 +1,130 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import threading
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.processor.identity_payload import IdentityPayload
+
+
+DEFAULT_PAYLOAD_CACHE_SIZE = 1024
+
+
+class PayloadCache(object):
+    """A bounded LRU cache of decoded and validated payloads.
+
+    The validator may send the same transaction to the processor several
+    times (fork resolution, block re-validation). The header's
+    payload_sha512 is checked by the validator against the payload bytes,
+    so it can be used as the key, along with the family version that says
+    how to decode it: the same digest and version always decode to the
+    same IdentityPayload, or are always rejected with the same reason.
+    """
+
+    def __init__(self, size=DEFAULT_PAYLOAD_CACHE_SIZE):
+        """Constructor.
+
+        Args:
+            size (int): The maximum number of entries kept. A size of 0
+                disables caching.
+        """
+        self._size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_payload(self, payload_sha512, payload,
+                    family_version=LEGACY_FAMILY_VERSION):
+        """Return the IdentityPayload for payload, decoding it only if
+        payload_sha512 has not been seen recently.
+
+        Args:
+            payload_sha512 (str): The payload digest from the transaction
+                header.
+            payload (bytes): The serialized payload.
+            family_version (str): Family version of the transaction.
+
+        Returns:
+            (IdentityPayload): The validated payload.
+
+        Raises:
+            InvalidTransaction: The payload is invalid. Cached rejections
+                are raised again with the original reason.
+        """
+        if self._size <= 0 or not payload_sha512:
+            return IdentityPayload.from_bytes(payload, family_version)
+
+        key = (family_version, payload_sha512)
+        with self._lock:
+            try:
+                entry = self._entries[key]
+            except KeyError:
+                entry = None
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+
+        if entry is None:
+            try:
+                entry = IdentityPayload.from_bytes(payload, family_version)
+            except InvalidTransaction as err:
+                entry = _Rejection(str(err))
+            self._put(key, entry)
+
+        if isinstance(entry, _Rejection):
+            raise InvalidTransaction(entry.reason)
+
+        return entry
+
+    def stats(self):
+        """Returns the cache counters as a dict, suitable for logging or
+        exporting as metrics.
+        """
+        return collections.OrderedDict([
+            ('size', len(self._entries)),
+            ('max_size', self._size),
+            ('hits', self._hits),
+            ('misses', self._misses),
+        ])
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+
+class _Rejection(object):
+    __slots__ = ('reason',)
+
+    def __init__(self, reason):
+        self.reason = reason
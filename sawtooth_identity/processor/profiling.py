@@ -0,0 +1,200 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The longest capture, whether configured or requested, in seconds
+MAX_PROFILE_DURATION = 3600
+
+
+class ProfilingHooks(object):
+    """On-demand profiling of a running transaction processor.
+
+    SIGUSR1 starts a time-boxed cProfile capture of every thread that runs
+    the handler's apply, and SIGUSR2 records a tracemalloc snapshot of the
+    top allocation sites. Results are written to output_dir.
+
+    Nothing is hooked while no capture is running: the profiling wrapper is
+    only set on the handler for the duration of a capture, and tracemalloc
+    is only tracing while a memory capture is in progress.
+    """
+
+    def __init__(self, handler, output_dir, duration=30, top=40):
+        """Constructor.
+
+        Args:
+            handler (TransactionHandler): The handler to profile.
+            output_dir (str): The directory profiles are written to.
+            duration (int): Default length of a capture, in seconds.
+            top (int): Number of entries in the text summaries.
+        """
+        self._handler = handler
+        self._output_dir = output_dir
+        self._duration = duration
+        self._top = top
+        self._lock = threading.Lock()
+        self._profilers = None
+        self._capturing = False
+        self._tracing_memory = False
+
+    def install(self):
+        """Register the signal handlers. Must be called from the main
+        thread.
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            LOGGER.warning("Profiling signals are not available on this "
+                           "platform")
+            return
+
+        signal.signal(
+            signal.SIGUSR1, lambda signum, frame: self.start_cpu_profile())
+        signal.signal(
+            signal.SIGUSR2, lambda signum, frame: self.start_memory_profile())
+        LOGGER.info(
+            "Send SIGUSR1 (cpu) or SIGUSR2 (memory) to pid %s to profile "
+            "for %ss, output goes to %s",
+            os.getpid(), self._duration, self._output_dir)
+
+    def start_cpu_profile(self, duration=None):
+        """Start a cProfile capture of the handler.
+
+        Returns:
+            (bool): False if a capture is already running.
+        """
+        with self._lock:
+            if self._capturing:
+                return False
+            self._capturing = True
+            # The closure keeps this capture's list, an apply that started
+            # before the capture finished never touches a later one
+            profilers = self._profilers = []
+
+        local = threading.local()
+        apply = self._handler.apply
+
+        def profiled_apply(transaction, context):
+            profiler = getattr(local, 'profiler', None)
+            if profiler is None:
+                with self._lock:
+                    if self._profilers is not profilers:
+                        # The capture finished while this apply was called
+                        return apply(transaction, context)
+                    profiler = local.profiler = cProfile.Profile()
+                    profilers.append(profiler)
+
+            profiler.enable()
+            try:
+                return apply(transaction, context)
+            finally:
+                profiler.disable()
+
+        # Shadow the bound method for the length of the capture only
+        self._handler.apply = profiled_apply
+        LOGGER.info("Started cpu profile")
+
+        self._start_timer(duration, self._finish_cpu_profile)
+        return True
+
+    def start_memory_profile(self, duration=None):
+        """Start tracing allocations, and write the top allocation sites
+        once duration has elapsed. If tracemalloc was already tracing, the
+        snapshot is taken right away.
+
+        Returns:
+            (bool): False if a capture is already running.
+        """
+        with self._lock:
+            if self._tracing_memory:
+                return False
+
+            if tracemalloc.is_tracing():
+                self._write_memory_snapshot(tracemalloc.take_snapshot())
+                return True
+
+            self._tracing_memory = True
+            tracemalloc.start()
+
+        LOGGER.info("Started memory profile")
+        self._start_timer(duration, self._finish_memory_profile)
+        return True
+
+    def _start_timer(self, duration, function):
+        timer = threading.Timer(
+            self._duration if duration is None else duration, function)
+        timer.daemon = True
+        timer.start()
+
+    def _finish_cpu_profile(self):
+        with self._lock:
+            del self._handler.apply
+            profilers, self._profilers = self._profilers, None
+            self._capturing = False
+
+        if not profilers:
+            LOGGER.info("Cpu profile finished, no transactions were applied")
+            return
+
+        stats = pstats.Stats(*profilers)
+        path = self._output_path('cpu', 'prof')
+        stats.dump_stats(path)
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(self._top)
+        with open(self._output_path('cpu', 'txt'), 'w') as fd:
+            fd.write(summary.getvalue())
+
+        LOGGER.info("Wrote cpu profile to %s", path)
+
+    def _finish_memory_profile(self):
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        with self._lock:
+            self._tracing_memory = False
+
+        self._write_memory_snapshot(snapshot)
+
+    def _write_memory_snapshot(self, snapshot):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+
+        path = self._output_path('memory', 'txt')
+        with open(path, 'w') as fd:
+            for stat in snapshot.statistics('lineno')[:self._top]:
+                fd.write('{}\n'.format(stat))
+
+        LOGGER.info("Wrote memory profile to %s", path)
+
+    def _output_path(self, kind, extension):
+        return os.path.join(
+            self._output_dir,
+            'identity-{}-{}-{}.{}'.format(
+                kind,
+                os.getpid(),
+                time.strftime('%Y%m%d-%H%M%S'),
+                extension))
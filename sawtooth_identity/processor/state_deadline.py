@@ -0,0 +1,174 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+import collections
+import logging
+import random
+import threading
+import time
+
+from sawtooth_sdk.messaging.future import FutureTimeoutError
+from sawtooth_sdk.processor.exceptions import InternalError
+
+from sawtooth_identity.processor.metrics import METRICS
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AdaptiveDeadline(object):
+    """A timeout derived from the recently observed latency of a call.
+
+    Until min_samples latencies have been observed the deadline is
+    max_timeout. After that it is the given percentile of the last window
+    latencies times multiplier, bounded by min_timeout and max_timeout.
+    """
+
+    def __init__(self, max_timeout, min_timeout=0.05, percentile=0.99,
+                 multiplier=3.0, window=512, min_samples=32):
+        self._max_timeout = max_timeout
+        self._min_timeout = min(min_timeout, max_timeout)
+        self._percentile = percentile
+        self._multiplier = multiplier
+        self._min_samples = min_samples
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._timeout = max_timeout
+        self._unsorted = 0
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def max_timeout(self):
+        return self._max_timeout
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._unsorted += 1
+            # Sorting the window on every call is wasted work, the
+            # percentile barely moves between two samples
+            if len(self._samples) >= self._min_samples and \
+                    self._unsorted >= 16:
+                self._unsorted = 0
+                self._timeout = min(
+                    self._max_timeout,
+                    max(self._min_timeout,
+                        self._quantile(self._percentile) * self._multiplier))
+
+    def stats(self):
+        with self._lock:
+            return collections.OrderedDict([
+                ('timeout', self._timeout),
+                ('p50', self._quantile(0.5)),
+                ('p99', self._quantile(0.99)),
+                ('samples', len(self._samples)),
+            ])
+
+    def _quantile(self, fraction):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class StateCallPolicy(object):
+    """Deadlines and retries for the validator state calls made through a
+    Context. It is shared by every IdentityState of a handler, so deadlines
+    adapt across transactions.
+
+    Reads are idempotent: their deadline adapts to the observed latency and
+    they are retried up to read_retries times with jittered backoff.
+
+    Writes and deletes always wait up to max_timeout and are attempted
+    once. On an InternalError the validator sends the transaction again in
+    the same context, so a write that was applied but answered after a
+    short deadline would be seen by the second attempt, e.g. turning a
+    create into "Identity already exists". Their latency is still observed
+    for the stats.
+    """
+
+    KINDS = ('get', 'set', 'delete')
+
+    def __init__(self, max_timeout, read_retries=2, backoff=0.01):
+        """Constructor.
+
+        Args:
+            max_timeout (float): The longest a single call may wait, in
+                seconds.
+            read_retries (int): Extra attempts for a timed out get_state.
+            backoff (float): Base of the exponential backoff between read
+                attempts, in seconds.
+        """
+        self._read_retries = read_retries
+        self._backoff = backoff
+        # A min_timeout of max_timeout keeps the write deadlines fixed
+        self._deadlines = {
+            'get': AdaptiveDeadline(max_timeout),
+            'set': AdaptiveDeadline(max_timeout, min_timeout=max_timeout),
+            'delete': AdaptiveDeadline(max_timeout, min_timeout=max_timeout),
+        }
+        self._timeouts = {
+            kind: METRICS.counter('state_{}_timeouts'.format(kind))
+            for kind in self.KINDS
+        }
+        self._retries = METRICS.counter('state_get_retries')
+
+    def stats(self):
+        return collections.OrderedDict(
+            (kind, self._deadlines[kind].stats()) for kind in self.KINDS)
+
+    def get_state(self, context, addresses):
+        return self._call('get', context.get_state, addresses,
+                          self._read_retries)
+
+    def set_state(self, context, entries):
+        return self._call('set', context.set_state, entries, 0)
+
+    def delete_state(self, context, addresses):
+        return self._call('delete', context.delete_state, addresses, 0)
+
+    def _call(self, kind, function, argument, retries):
+        deadline = self._deadlines[kind]
+        attempt = 0
+        while True:
+            # Each retry waits twice as long as the attempt before it
+            timeout = min(deadline.max_timeout,
+                          deadline.timeout * 2 ** attempt)
+            start = time.perf_counter()
+            try:
+                result = function(argument, timeout=timeout)
+            except FutureTimeoutError:
+                self._timeouts[kind].inc()
+                # The call took at least this long, observing it lets the
+                # deadline grow when the validator slows down
+                deadline.observe(timeout)
+                if attempt >= retries:
+                    raise InternalError(
+                        "State {} timed out after {} attempts".format(
+                            kind, attempt + 1))
+
+                attempt += 1
+                self._retries.inc()
+                LOGGER.debug(
+                    "State %s timed out after %.3fs, retrying",
+                    kind, timeout)
+                time.sleep(random.uniform(0, self._backoff * 2 ** attempt))
+                continue
+
+            deadline.observe(time.perf_counter() - start)
+            return result
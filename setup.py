@@ -32,25 +32,36 @@ if os.path.exists("/lib/systemd/system"):
 
 setup(
     name='sawtooth-identity',
-    version='0.1'
+    version='0.1',
     # version=subprocess.check_output(
     #     ['../../../bin/get_version']).decode('utf-8').strip(),
     description='Sawtooth XO Example',
     author='Simon',
     url='PM author for more details',
     packages=find_packages(),
+    package_data={
+        'sawtooth_identity.benchmark': ['baseline.json'],
+    },
     install_requires=[
         'aiohttp',
         'colorlog',
         'protobuf',
-        'sawtooth-sdk',
+        # The processor's lifecycle hooks private SDK methods
+        'sawtooth-sdk~=1.2.5',
         'sawtooth-signing',
         'PyYAML',
     ],
+    extras_require={
+        'stats': ['numpy'],
+    },
     data_files=data_files,
     entry_points={
         'console_scripts': [
             'identity = sawtooth_identity.identity_cli:main_wrapper',
             'identity-tp-python = sawtooth_identity.processor.main:main',
+            'identity-bench = sawtooth_identity.benchmark.runner:main',
+            'identity-workload = sawtooth_identity.identity_workload:main',
+            'identity-rebuild = sawtooth_identity.identity_rebuild:main',
+            'identity-trace = sawtooth_identity.identity_tracing:main',
         ]
     })
@@ -0,0 +1,113 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_codec import encode_identities
+from sawtooth_identity.identity_dry_run import IdentityDryRun
+from sawtooth_identity.processor.bucket_cache import BucketCache
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+from sawtooth_identity.processor.identity_state import Identity
+
+
+OWNER = '02' + 'ab' * 32
+
+
+def _bucket(name):
+    return encode_identities([Identity(name, '1990', 'f', OWNER)])
+
+
+class TestBucketCache(unittest.TestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        buckets = [_bucket(name) for name in ('alice', 'bob', 'carol')]
+        # Room for two of the three buckets
+        cache = BucketCache(
+            max_bytes=sum(len(data) for data in buckets) - 1)
+
+        cache.get_identities(buckets[0])
+        cache.get_identities(buckets[1])
+        cache.get_identities(buckets[0])
+        cache.get_identities(buckets[2])
+
+        stats = cache.stats()
+        self.assertEqual(2, stats['size'])
+        self.assertEqual(len(buckets[0]) + len(buckets[2]), stats['bytes'])
+        self.assertEqual(1, stats['evictions'])
+
+        cache.get_identities(buckets[0])
+        cache.get_identities(buckets[2])
+        self.assertEqual((3, 3), (cache.hits, cache.misses))
+        cache.get_identities(buckets[1])
+        self.assertEqual(4, cache.misses)
+
+    def test_oversized_and_disabled(self):
+        data = _bucket('alice')
+        for cache in (BucketCache(max_bytes=len(data) - 1),
+                      BucketCache(max_bytes=0)):
+            first, = cache.get_identities(data)
+            second, = cache.get_identities(data)
+            self.assertIsNot(first, second)
+            self.assertEqual('alice', second.name)
+            self.assertEqual(0, len(cache))
+
+    def test_written_buckets_are_cached(self):
+        cache = BucketCache()
+        identity = Identity('alice', '1990', 'f', OWNER)
+        data = encode_identities([identity])
+        cache.put(data, [identity])
+
+        self.assertEqual((identity,), cache.get_identities(data))
+        self.assertEqual((1, 0), (cache.hits, cache.misses))
+
+    def test_served_identities_are_read_only(self):
+        cache = BucketCache()
+        data = encode_identities([Identity('alice', '1990', 'f', OWNER)])
+        identity, = cache.get_identities(data)
+
+        for field in ('name', 'date_of_birth', 'gender', 'owner',
+                      'version', '_owner'):
+            with self.assertRaises(AttributeError):
+                setattr(identity, field, 'changed')
+        with self.assertRaises(AttributeError):
+            del identity.gender
+
+        changed = identity.replace(gender='m', version=1)
+        self.assertEqual(('m', 1), (changed.gender, changed.version))
+
+        cached, = cache.get_identities(data)
+        self.assertIs(identity, cached)
+        self.assertEqual(('f', 0), (cached.gender, cached.version))
+        self.assertEqual(1, cache.hits)
+
+    def test_updates_do_not_leak_into_the_cache(self):
+        cache = BucketCache()
+        client = create_client()
+        dry_run = IdentityDryRun(
+            handler=IdentityTransactionHandler(bucket_cache=cache))
+        dry_run.check(
+            client._create_identity_txn('create', 'alice', '1990', 'f'))
+        before = dict(dry_run.entries)
+        served, = cache.get_identities(next(iter(before.values())))
+
+        dry_run.check(client._create_identity_txn('update', 'alice', '1991'))
+        dry_run.check(client._create_identity_txn(
+            'rename', 'alice', new_name='alicia'))
+
+        self.assertEqual(
+            ('alice', '1990', 0),
+            (served.name, served.date_of_birth, served.version))
+        again, = cache.get_identities(next(iter(before.values())))
+        self.assertIs(served, again)
@@ -0,0 +1,164 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import pickle
+import unittest
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from sawtooth_identity.identity_codec import decode_identities
+from sawtooth_identity.identity_codec import decode_payload
+from sawtooth_identity.identity_codec import encode_identities
+from sawtooth_identity.identity_codec import encode_payload
+from sawtooth_identity.identity_codec import is_compact
+from sawtooth_identity.identity_dry_run import LocalStateContext
+from sawtooth_identity.processor.identity_payload import IdentityPayload
+from sawtooth_identity.processor.identity_state import Identity
+from sawtooth_identity.processor.identity_state import IdentityState
+from sawtooth_identity.processor.identity_state import _make_identity_address
+
+
+OWNER = '02' + 'ab' * 32
+
+
+def _identities(count=2):
+    return [
+        Identity(
+            name='identity-{}-é'.format(i),
+            date_of_birth='1990-01-01',
+            gender='f',
+            # Owners that are not lowercase hex are stored as text
+            owner=OWNER if i % 2 == 0 else 'Not-Hex',
+            version=i * 200)
+        for i in range(count)
+    ]
+
+
+def _fields(identities):
+    return [
+        (identity.name, identity.date_of_birth, identity.gender,
+         identity.owner, identity.version)
+        for identity in identities
+    ]
+
+
+class TestIdentityCodec(unittest.TestCase):
+    def test_round_trips(self):
+        identities = _identities(8)
+        for compact in (False, True):
+            data = encode_identities(identities, compact=compact)
+            self.assertEqual(
+                _fields(identities), _fields(decode_identities(data)))
+            self.assertEqual(compact, is_compact(data))
+
+    def test_flags(self):
+        identities = _identities(32)
+        self.assertEqual(
+            0x80, encode_identities(identities)[0])
+        self.assertEqual(
+            0x02, encode_identities(identities, compact=True)[0])
+
+    def test_legacy_pickle(self):
+        # Buckets written before the codec existed are plain pickles
+        data = pickle.dumps(_identities(), protocol=2)
+        self.assertEqual(
+            _fields(_identities()), _fields(decode_identities(data)))
+        self.assertFalse(is_compact(data))
+
+    def test_corrupt_values(self):
+        data = encode_identities(_identities(), compact=True)
+        for corrupt in (b'', data[:-1], data[:2], data + b'\x00',
+                        b'\x01not a bucket', b'\x02\x01\x05ab'):
+            with self.assertRaises(ValueError):
+                decode_identities(corrupt)
+
+    def test_payload_round_trip(self):
+        data = encode_payload(
+            'rename', 'alice', new_name='álice', expected_version=None)
+        self.assertEqual({
+            'Action': 'rename',
+            'Name': 'alice',
+            'Date_of_birth': '',
+            'Gender': '',
+            'New_name': 'álice',
+        }, decode_payload(data))
+
+        data = encode_payload('update', 'alice', '1991', expected_version=0)
+        self.assertEqual(0, decode_payload(data)['Expected_version'])
+
+    def test_corrupt_payloads(self):
+        data = encode_payload('create', 'alice', '1990', 'f')
+        for corrupt in (b'', data[:-1], data + b'\x00', b'\x09' + data[1:]):
+            with self.assertRaises(ValueError):
+                decode_payload(corrupt)
+            with self.assertRaises(InvalidTransaction):
+                IdentityPayload.from_bytes(corrupt, '0.2')
+
+    def test_actions_by_family_version(self):
+        migrate = encode_payload('migrate', 'alice')
+        self.assertEqual(
+            'migrate', IdentityPayload.from_bytes(migrate, '0.2').action)
+
+        legacy = pickle.dumps({
+            'Action': 'migrate',
+            'Name': 'alice',
+            'Date_of_birth': '',
+            'Gender': '',
+        })
+        with self.assertRaises(InvalidTransaction):
+            IdentityPayload.from_bytes(legacy, '0.1')
+
+        # Each version only decodes its own payload encoding
+        with self.assertRaises(InvalidTransaction):
+            IdentityPayload.from_bytes(legacy, '0.2')
+        with self.assertRaises(InvalidTransaction):
+            IdentityPayload.from_bytes(migrate, '0.1')
+
+
+class TestStateEncoding(unittest.TestCase):
+    def setUp(self):
+        self.context = LocalStateContext()
+        IdentityState(self.context, compact=True).set_identity(
+            'carol', Identity('carol', '1990', 'f', OWNER))
+        self.context.commit()
+
+    def value(self, name):
+        return self.context.entries[_make_identity_address(name)]
+
+    def test_compact_buckets_stay_compact(self):
+        state = IdentityState(self.context)
+        state.set_identity('carol', Identity('carol', '1991', 'f', OWNER))
+        self.context.commit()
+        self.assertTrue(is_compact(self.value('carol')))
+
+    def test_prefetch_does_not_change_the_encoding(self):
+        # A legacy create must write the same bytes whether or not the
+        # compact inputs it declares were prefetched
+        values = []
+        for prefetch in (False, True):
+            context = LocalStateContext(dict(self.context.entries))
+            state = IdentityState(context)
+            if prefetch:
+                state.prefetch([
+                    _make_identity_address('carol'),
+                    _make_identity_address('xavier'),
+                ])
+            state.set_identity(
+                'xavier', Identity('xavier', '1990', 'm', OWNER))
+            context.commit()
+            values.append(context.entries[_make_identity_address('xavier')])
+
+        self.assertEqual(values[0], values[1])
+        self.assertFalse(is_compact(values[0]))
@@ -0,0 +1,57 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from sawtooth_sdk.processor.exceptions import LocalConfigurationError
+
+from sawtooth_identity.processor.config.identity import IdentityConfig
+from sawtooth_identity.processor.config.identity import \
+    load_env_identity_config
+from sawtooth_identity.processor.config.identity import \
+    merge_identity_config
+
+
+class TestIdentityConfig(unittest.TestCase):
+    def test_environment_values(self):
+        config = load_env_identity_config({
+            'IDENTITY_TP_STATE_TIMEOUT': '2.5',
+            'IDENTITY_TP_WORKERS': '4',
+            'IDENTITY_TP_AUDIT_SAMPLE_RATE': '0',
+        })
+        self.assertEqual(
+            (2.5, 4, 0.0),
+            (config.state_timeout, config.workers, config.audit_sample_rate))
+
+    def test_out_of_range_values(self):
+        for key, value in (('STATE_TIMEOUT', '0'),
+                           ('WORKERS', '0'),
+                           ('METRICS_PORT', '65536'),
+                           ('AUDIT_SAMPLE_RATE', '1.5'),
+                           ('STATE_READ_RETRIES', '-1'),
+                           ('PROFILE_DURATION', '3601')):
+            with self.assertRaises(LocalConfigurationError):
+                load_env_identity_config({'IDENTITY_TP_' + key: value})
+
+    def test_non_finite_values(self):
+        for key in ('STATE_TIMEOUT', 'DRAIN_TIMEOUT', 'AUDIT_SAMPLE_RATE'):
+            for value in ('nan', 'inf', '-inf'):
+                with self.assertRaises(LocalConfigurationError):
+                    load_env_identity_config({'IDENTITY_TP_' + key: value})
+
+        # Command line values are checked when merged
+        with self.assertRaises(LocalConfigurationError):
+            merge_identity_config([
+                IdentityConfig(state_timeout=float('nan'))])
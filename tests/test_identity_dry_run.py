@@ -0,0 +1,120 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import logging
+import pickle
+import unittest
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_batch_planner import IdentityBatchPlanner
+from sawtooth_identity.identity_batch_planner import IdentityOperation
+from sawtooth_identity.identity_dry_run import IdentityDryRun
+
+
+class TestIdentityDryRun(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.user_1 = create_client()
+        cls.user_2 = create_client()
+
+    def identities(self, dry_run):
+        return {
+            identity.name: identity
+            for data in dry_run.entries.values()
+            for identity in pickle.loads(data)
+        }
+
+    def check(self, dry_run, client, action, name, date_of_birth='',
+              gender='', **kwargs):
+        return dry_run.check(
+            client._create_identity_txn(
+                action, name, date_of_birth, gender, **kwargs))
+
+    def test_create_update_rename_delete(self):
+        dry_run = IdentityDryRun()
+
+        self.assertIsNone(
+            self.check(dry_run, self.user_1, 'create', 'alice', '1990', 'f'))
+        self.assertIsNone(
+            self.check(dry_run, self.user_1, 'update', 'alice', '1991',
+                       expected_version=0))
+        self.assertIsNone(
+            self.check(dry_run, self.user_1, 'rename', 'alice',
+                       new_name='alicia'))
+
+        identities = self.identities(dry_run)
+        self.assertEqual(['alicia'], list(identities))
+        self.assertEqual('1991', identities['alicia'].date_of_birth)
+        self.assertEqual('f', identities['alicia'].gender)
+        self.assertEqual(2, identities['alicia'].version)
+
+        self.assertIsNone(
+            self.check(dry_run, self.user_1, 'delete', 'alicia'))
+        self.assertEqual({}, dry_run.entries)
+        self.assertEqual((4, 0), (dry_run.accepted, dry_run.rejected))
+
+    def test_rejected_transactions_leave_state_unchanged(self):
+        dry_run = IdentityDryRun()
+        self.check(dry_run, self.user_1, 'create', 'bob', '1980', 'm')
+        entries = dict(dry_run.entries)
+
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_1, 'create', 'bob', '1980', 'm'))
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_1, 'update', 'nobody', '1980'))
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_2, 'update', 'bob', '1981'))
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_2, 'rename', 'bob',
+                       new_name='robert'))
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_2, 'delete', 'bob'))
+        self.assertIsNotNone(
+            self.check(dry_run, self.user_1, 'update', 'bob', '1981',
+                       expected_version=3))
+
+        self.assertEqual(entries, dry_run.entries)
+        self.assertEqual((1, 6), (dry_run.accepted, dry_run.rejected))
+
+    def test_planner_drops_doomed_transactions(self):
+        planner = IdentityBatchPlanner(
+            self.user_1, dry_run=IdentityDryRun())
+
+        plan = planner.plan([
+            IdentityOperation('create', 'carol', '1970', 'f'),
+            IdentityOperation('create', 'carol', '1970', 'f'),
+            IdentityOperation('delete', 'dave'),
+            IdentityOperation('update', 'carol', gender='m'),
+        ])
+
+        self.assertEqual(2, plan.transaction_count)
+        self.assertEqual(2, plan.max_chain_length)
+        self.assertEqual(2, len(plan.rejected))
+
+    def test_checks_are_not_audited(self):
+        # The CLI logs at DEBUG, which enables auditing
+        logger = logging.getLogger('sawtooth_identity.audit')
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            dry_run = IdentityDryRun()
+            self.check(dry_run, self.user_1, 'create', 'erin', '1990', 'f')
+            audit_log = dry_run._handler.audit_log
+            self.assertFalse(audit_log.sampled())
+        finally:
+            logger.setLevel(level)
+
+        self.assertEqual(0, audit_log.stats()['written'])
+        self.assertIsNone(audit_log._thread)
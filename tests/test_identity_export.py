@@ -0,0 +1,100 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sawtooth_identity.identity_client import StatePage
+from sawtooth_identity.identity_codec import encode_identities
+from sawtooth_identity.identity_exceptions import IdentityException
+from sawtooth_identity.identity_export import IdentityExporter
+from sawtooth_identity.identity_export import read_export
+from sawtooth_identity.processor.identity_state import Identity
+from sawtooth_identity.processor.identity_state import _make_identity_address
+
+
+NAMES = ['identity-{}'.format(i) for i in range(6)]
+
+
+class _PagedClient(object):
+    """Serves NAMES in pages of two, and fails after fail_after pages."""
+
+    def __init__(self, fail_after=None):
+        self._fail_after = fail_after
+
+    def iter_state_pages(self, start=None, head=None, limit=1000,
+                         auth_user=None, auth_password=None):
+        position = int(start or 0)
+        served = 0
+        while position < len(NAMES):
+            if served == self._fail_after:
+                raise IdentityException('connection lost')
+            names = NAMES[position:position + 2]
+            position += len(names)
+            yield StatePage(
+                'head',
+                [(_make_identity_address(name), encode_identities(
+                    [Identity(name, '1990', 'f', 'owner')]))
+                 for name in names],
+                str(position) if position < len(NAMES) else None)
+            served += 1
+
+
+class TestIdentityExporter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'identities.jsonl.gz')
+        self.cursor = os.path.join(self.directory, 'cursor.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, client, export_format='jsonl'):
+        return IdentityExporter(
+            client, self.output, export_format=export_format,
+            cursor_file=self.cursor).run()
+
+    def names(self, export_format='jsonl'):
+        return [record[2] for record in read_export(
+            self.output, export_format)]
+
+    def test_resumes_after_an_interruption(self):
+        with self.assertRaises(IdentityException):
+            self.export(_PagedClient(fail_after=2))
+        self.assertEqual(NAMES[:4], self.names())
+
+        self.assertEqual(2, self.export(_PagedClient()).records)
+        self.assertEqual(NAMES, self.names())
+        self.assertEqual(0, self.export(_PagedClient()).records)
+
+    def test_resumes_in_the_same_format_only(self):
+        with self.assertRaises(IdentityException):
+            self.export(_PagedClient(fail_after=1), export_format='csv')
+
+        with self.assertRaises(IdentityException):
+            self.export(_PagedClient(), export_format='jsonl')
+
+        self.export(_PagedClient(), export_format='csv')
+        self.assertEqual(NAMES, self.names('csv'))
+
+    def test_starts_over_without_the_output_file(self):
+        with self.assertRaises(IdentityException):
+            self.export(_PagedClient(fail_after=2))
+        os.remove(self.output)
+
+        self.assertEqual(6, self.export(_PagedClient()).records)
+        self.assertEqual(NAMES, self.names())
@@ -0,0 +1,143 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_codec import decode_identities
+from sawtooth_identity.identity_dry_run import IdentityDryRun
+from sawtooth_identity.processor.identity_state import _make_identity_address
+
+
+class _HandlerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.owner = create_client()
+        cls.other = create_client()
+
+    def setUp(self):
+        self.dry_run = IdentityDryRun()
+        self.assertIsNone(
+            self.check(self.owner, 'create', 'alice', '1990', 'f'))
+
+    def check(self, client, action, name, date_of_birth='', gender='',
+              **kwargs):
+        return self.dry_run.check(
+            client._create_identity_txn(
+                action, name, date_of_birth, gender, **kwargs))
+
+    def identity(self, name):
+        data = self.dry_run.entries.get(_make_identity_address(name))
+        if data is None:
+            return None
+        identities = {
+            identity.name: identity for identity in decode_identities(data)
+        }
+        return identities.get(name)
+
+
+class TestRenameAndDelete(_HandlerTestCase):
+    def test_names_are_global(self):
+        # Addresses depend on the name only, whoever signs
+        self.assertIn(
+            'already exists',
+            self.check(self.other, 'create', 'alice', '1991', 'm'))
+        self.assertEqual(
+            self.owner._signer.get_public_key().as_hex(),
+            self.identity('alice').owner)
+
+    def test_rename_moves_the_record(self):
+        self.assertIsNone(
+            self.check(self.owner, 'rename', 'alice', new_name='alicia'))
+
+        self.assertIsNone(self.identity('alice'))
+        self.assertNotIn(_make_identity_address('alice'), self.dry_run.entries)
+        renamed = self.identity('alicia')
+        self.assertEqual(
+            ('alicia', '1990', 'f', 1),
+            (renamed.name, renamed.date_of_birth, renamed.gender,
+             renamed.version))
+        self.assertEqual(
+            self.owner._signer.get_public_key().as_hex(), renamed.owner)
+
+        # The old name is free again
+        self.assertIsNone(
+            self.check(self.other, 'create', 'alice', '2000', 'm'))
+
+    def test_rejected_renames(self):
+        self.check(self.owner, 'create', 'bob', '1980', 'm')
+        entries = dict(self.dry_run.entries)
+
+        self.assertIn(
+            'already exists',
+            self.check(self.owner, 'rename', 'alice', new_name='bob'))
+        self.assertIn(
+            'requires an existing identity',
+            self.check(self.owner, 'rename', 'nobody', new_name='carol'))
+        self.assertIn(
+            'does not belong',
+            self.check(self.other, 'rename', 'alice', new_name='carol'))
+
+        self.assertEqual(entries, self.dry_run.entries)
+
+    def test_delete(self):
+        self.assertIn(
+            'does not belong', self.check(self.other, 'delete', 'alice'))
+        self.assertIsNotNone(self.identity('alice'))
+
+        self.assertIsNone(self.check(self.owner, 'delete', 'alice'))
+        self.assertEqual({}, self.dry_run.entries)
+
+        self.assertIn(
+            'does not exist', self.check(self.owner, 'delete', 'alice'))
+
+
+class TestUpdate(_HandlerTestCase):
+    def test_partial_updates(self):
+        # Only the changed field is sent, the other is kept from state
+        self.assertIsNone(self.check(self.owner, 'update', 'alice', '1991'))
+        self.assertIsNone(
+            self.check(self.owner, 'update', 'alice', gender='m'))
+
+        identity = self.identity('alice')
+        self.assertEqual(
+            ('1991', 'm', 2),
+            (identity.date_of_birth, identity.gender, identity.version))
+
+    def test_expected_version(self):
+        self.assertIsNone(
+            self.check(self.owner, 'update', 'alice', '1991',
+                       expected_version=0))
+        entries = dict(self.dry_run.entries)
+
+        self.assertIn(
+            'is at version 1, expected 0',
+            self.check(self.owner, 'update', 'alice', '1992',
+                       expected_version=0))
+        self.assertEqual(entries, self.dry_run.entries)
+
+        self.assertIsNone(
+            self.check(self.owner, 'update', 'alice', '1992',
+                       expected_version=1))
+        self.assertEqual('1992', self.identity('alice').date_of_birth)
+
+    def test_rejected_updates(self):
+        self.assertIn(
+            'does not belong',
+            self.check(self.other, 'update', 'alice', '1991'))
+        self.assertIn(
+            'requires an existing identity',
+            self.check(self.owner, 'update', 'nobody', '1991'))
+        self.assertEqual(0, self.identity('alice').version)
@@ -0,0 +1,252 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import base64
+import json
+import unittest
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_client import StateDelta
+from sawtooth_identity.identity_dry_run import IdentityDryRun
+from sawtooth_identity.identity_read_cache import IdentityReadCache
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _DryRunRestApi(object):
+    """Answers the REST API requests of an IdentityClient from an
+    IdentityDryRun. Submitted batches stay pending until commit(), which
+    applies them in a new block.
+    """
+
+    def __init__(self):
+        self.dry_run = IdentityDryRun()
+        self.submitted = []
+        self.statuses = {}
+        self.blocks = [{'header_signature': 'genesis', 'batches': []}]
+        self.receipts = {}
+        self.state_reads = 0
+
+    @property
+    def head(self):
+        return self.blocks[-1]['header_signature']
+
+    def commit(self):
+        batches = []
+        for batch in self.submitted:
+            transactions = []
+            for transaction in batch.transactions:
+                before = dict(self.dry_run.entries)
+                self.dry_run.check(transaction)
+                after = self.dry_run.entries
+                self.receipts[transaction.header_signature] = [
+                    {'address': address, 'type': 'DELETE'}
+                    if address not in after else
+                    {'address': address, 'type': 'SET',
+                     'value': base64.b64encode(after[address]).decode()}
+                    for address in set(before) | set(after)
+                    if before.get(address) != after.get(address)
+                ]
+                transactions.append({
+                    'header_signature': transaction.header_signature,
+                    'header': {'family_name': 'identity'},
+                })
+            batches.append({
+                'header_signature': batch.header_signature,
+                'transactions': transactions,
+            })
+            self.statuses[batch.header_signature] = 'COMMITTED'
+        self.submitted = []
+        self.blocks.append({
+            'header_signature': 'block-{}'.format(len(self.blocks)),
+            'batches': batches,
+        })
+
+    def send(self, suffix, data=None, content_type=None, auth_user=None,
+             auth_password=None, session=None):
+        path, _, query = suffix.partition('?')
+        params = dict(
+            param.split('=', 1) for param in query.split('&') if param)
+
+        if path == 'batches':
+            batch_list = BatchList()
+            batch_list.ParseFromString(data)
+            for batch in batch_list.batches:
+                self.submitted.append(batch)
+                self.statuses[batch.header_signature] = 'PENDING'
+            return json.dumps({'link': 'batch_statuses'})
+
+        if path == 'batch_statuses':
+            return json.dumps({'data': [
+                {'id': params['id'], 'status': self.statuses[params['id']]}
+            ]})
+
+        if path.startswith('state/'):
+            self.state_reads += 1
+            data = self.dry_run.entries[path[len('state/'):]]
+            return json.dumps({
+                'data': base64.b64encode(data).decode(),
+                'head': self.head,
+            })
+
+        if path == 'blocks':
+            return json.dumps({
+                'head': self.head,
+                'data': list(reversed(self.blocks)),
+                'paging': {},
+            })
+
+        if path == 'receipts':
+            return json.dumps({'data': [
+                {'id': txn_id, 'state_changes': self.receipts[txn_id]}
+                for txn_id in params['id'].split(',')
+            ]})
+
+        raise AssertionError('Unexpected request {}'.format(suffix))
+
+
+class TestIdentityReadCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.cache = IdentityReadCache(ttl=5, pending_ttl=60,
+                                       clock=self.clock)
+
+    def test_ttl_and_revalidation(self):
+        self.cache.put('a', b'1', 'head-1')
+        self.assertEqual(b'1', self.cache.get('a').data)
+
+        self.clock.now = 6
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get_stale('a'))
+        self.assertEqual(b'1', self.cache.revalidate('a', 'head-1').data)
+        self.assertEqual(b'1', self.cache.get('a').data)
+
+        self.clock.now = 12
+        self.assertIsNone(self.cache.revalidate('a', 'head-2'))
+        self.assertIsNone(self.cache.get_stale('a'))
+
+    def test_pending_addresses_are_not_cached(self):
+        self.cache.put('a', b'1', 'head-1')
+        self.cache.mark_pending('batch-1', ['a', 'b'])
+        self.cache.mark_pending('batch-2', ['a'])
+
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', b'1', 'head-1')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(2, self.cache.stats()['pending'])
+
+        # Pending until every batch writing the address is settled
+        self.cache.settle(['batch-1'])
+        self.assertTrue(self.cache.is_pending('a'))
+        self.assertFalse(self.cache.is_pending('b'))
+        self.cache.settle(['batch-2', 'unknown'])
+        self.assertFalse(self.cache.is_pending('a'))
+
+        self.cache.put('a', b'2', 'head-2')
+        self.assertEqual(b'2', self.cache.get('a').data)
+
+    def test_pending_batches_expire(self):
+        self.cache.mark_pending('batch-1', ['a'])
+        self.clock.now = 30
+        self.cache.mark_pending('batch-2', ['b'])
+
+        self.clock.now = 61
+        self.assertFalse(self.cache.is_pending('a'))
+        self.assertTrue(self.cache.is_pending('b'))
+        self.clock.now = 91
+        self.assertFalse(self.cache.is_pending('b'))
+
+    def test_apply_delta(self):
+        self.cache.put('a', b'1', 'head-1')
+        self.cache.put('b', b'1', 'head-1')
+        self.cache.put('c', b'1', 'head-1')
+        self.cache.put('d', b'1', 'head-0')
+
+        self.clock.now = 6
+        self.cache.apply_delta(StateDelta(
+            since='head-1', head='head-2',
+            changes={'a': b'2', 'b': None, 'e': b'1'}))
+
+        self.assertEqual(b'2', self.cache.get('a').data)
+        self.assertIsNone(self.cache.get_stale('b'))
+        self.assertIsNone(self.cache.get('b'))
+        # Unchanged since head-1, so still current at head-2
+        self.assertEqual('head-2', self.cache.get('c').head)
+        # Read at another head, it may have changed
+        self.assertIsNone(self.cache.get('d'))
+        self.assertIsNone(self.cache.get('e'))
+        self.assertEqual('head-2', self.cache.head)
+
+
+class TestClientReadCache(unittest.TestCase):
+    def setUp(self):
+        self.api = _DryRunRestApi()
+        self.client = create_client(read_cache=IdentityReadCache())
+        self.client._send_request = self.api.send
+
+        self.client.create('alice', '1990', 'f')
+        self.commit()
+
+    def commit(self):
+        # Commits the submitted batches, and waits for them like
+        # --wait does
+        self.api.commit()
+        for batch in self.api.blocks[-1]['batches']:
+            self.client._wait_for_batch(batch['header_signature'], 1)
+
+    def show(self):
+        return self.client.show('alice').date_of_birth
+
+    def test_reads_between_submit_and_commit_are_not_cached(self):
+        self.assertEqual('1990', self.show())
+        self.assertEqual('1990', self.show())
+        self.assertEqual(1, self.api.state_reads)
+
+        self.client.update('alice', 'date_of_birth', '1991')
+        self.assertEqual('1990', self.show())
+        self.assertEqual('1990', self.show())
+        self.assertEqual(3, self.api.state_reads)
+
+        # The client sees the commit while waiting for it
+        self.commit()
+        self.assertEqual('1991', self.show())
+        self.assertEqual('1991', self.show())
+        self.assertEqual(4, self.api.state_reads)
+
+    def test_list_changes_settles_committed_batches(self):
+        self.show()
+        head = self.api.head
+
+        # Committed, but not waited for
+        self.client.update('alice', 'gender', 'm')
+        self.api.commit()
+        self.assertTrue(self.client.read_cache.is_pending(
+            self.client._get_address('alice')))
+
+        delta = self.client.list_changes(head)
+
+        self.assertEqual([self.client._get_address('alice')],
+                         list(delta.changes))
+        self.assertFalse(self.client.read_cache.is_pending(
+            self.client._get_address('alice')))
+        self.assertEqual('m', self.client.show('alice').gender)
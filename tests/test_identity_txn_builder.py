@@ -0,0 +1,126 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import unittest
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing import create_context
+
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.identity_txn_builder import FAMILY_NAME
+from sawtooth_identity.identity_txn_builder import \
+    IdentityTransactionBuilder
+from sawtooth_identity.identity_txn_builder import identity_address
+
+
+def _signer():
+    context = create_context('secp256k1')
+    return CryptoFactory(context).new_signer(
+        context.new_random_private_key())
+
+
+class TestIdentityTransactionBuilder(unittest.TestCase):
+    """The headers are written by hand in the protobuf wire format, and
+    must be the bytes the SDK messages serialize to: the validator checks
+    signatures over the header bytes, and other clients re-serialize
+    headers they parse.
+    """
+
+    def setUp(self):
+        self.signer = _signer()
+        self.public_key = self.signer.get_public_key().as_hex()
+
+    def expected_header(self, payload, addresses, dependencies=(),
+                        nonce='', family_version=LEGACY_FAMILY_VERSION):
+        return TransactionHeader(
+            batcher_public_key=self.public_key,
+            dependencies=list(dependencies),
+            family_name=FAMILY_NAME,
+            family_version=family_version,
+            inputs=list(addresses),
+            nonce=nonce,
+            outputs=list(addresses),
+            payload_sha512=hashlib.sha512(payload).hexdigest(),
+            signer_public_key=self.public_key,
+        ).SerializeToString()
+
+    def test_header_bytes(self):
+        dependency = 'ab' * 64
+        addresses = [identity_address('álice'), identity_address('bob')]
+        for family_version in (LEGACY_FAMILY_VERSION, COMPACT_FAMILY_VERSION):
+            builder = IdentityTransactionBuilder(
+                self.signer, family_version=family_version)
+            cases = [
+                (b'payload', addresses[:1], (), 'nonce-1'),
+                # A rename writes two addresses
+                (b'', addresses, (dependency,), 'é-nonce'),
+                # proto3 leaves out the empty nonce
+                (b'\x00' * 300, addresses[:1], (dependency, dependency), ''),
+                # Fields longer than 127 bytes have two byte lengths
+                (b'payload', addresses[:1], (), 'n' * 200),
+            ]
+            for payload, addrs, dependencies, nonce in cases:
+                self.assertEqual(
+                    self.expected_header(
+                        payload, addrs, dependencies, nonce, family_version),
+                    builder.header_bytes(
+                        payload, addrs, dependencies, nonce))
+
+    def test_built_transactions(self):
+        for family_version in (LEGACY_FAMILY_VERSION, COMPACT_FAMILY_VERSION):
+            builder = IdentityTransactionBuilder(
+                self.signer, family_version=family_version)
+            transactions = [
+                builder.build('create', 'álice', '1990-01-01', 'f'),
+                builder.build(
+                    'rename', 'álice', new_name='bob',
+                    dependencies=['cd' * 64], expected_version=0),
+            ]
+            for transaction in transactions:
+                header = TransactionHeader()
+                header.ParseFromString(transaction.header)
+                self.assertEqual(
+                    header.SerializeToString(), transaction.header)
+                self.assertEqual(family_version, header.family_version)
+                self.assertEqual(
+                    hashlib.sha512(transaction.payload).hexdigest(),
+                    header.payload_sha512)
+                self.assertEqual(list(header.inputs), list(header.outputs))
+
+            header.ParseFromString(transactions[1].header)
+            self.assertEqual(
+                [identity_address('álice'), identity_address('bob')],
+                list(header.inputs))
+            self.assertEqual(['cd' * 64], list(header.dependencies))
+
+            batch = builder.build_batch(transactions)
+            self.assertEqual(
+                BatchHeader(
+                    signer_public_key=self.public_key,
+                    transaction_ids=[
+                        t.header_signature for t in transactions],
+                ).SerializeToString(),
+                batch.header)
+
+    def test_empty_batch(self):
+        batch = IdentityTransactionBuilder(self.signer).build_batch([])
+        self.assertEqual(
+            BatchHeader(signer_public_key=self.public_key)
+            .SerializeToString(),
+            batch.header)
@@ -0,0 +1,185 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import threading
+import time
+import unittest
+
+from sawtooth_identity.processor import lifecycle
+from sawtooth_identity.processor.lifecycle import ProcessorSupervisor
+
+
+class _ScriptedProcessor(object):
+    """Stands in for a validator connection. start() returns at once, as
+    when a registration fails or the stream stops, having registered if
+    the next entry of registrations says so.
+    """
+
+    registrations = []
+    started = []
+
+    def __init__(self, url, supervisor):
+        self.registered_once = False
+        self.stopped = 0
+
+    def add_handler(self, handler):
+        pass
+
+    def start(self):
+        self.started.append(self)
+        if self.registrations and self.registrations.pop(0):
+            self.registered_once = True
+
+    def stop(self):
+        self.stopped += 1
+
+
+class _DrainingProcessor(object):
+    """A registered connection that receives requests for a while after
+    unregistering.
+    """
+
+    def __init__(self, requests=0, seconds=0.0):
+        self._requests = requests
+        self._seconds = seconds
+        self._in_flight = 0
+        self._last_active = time.monotonic()
+        self.unregistered = False
+        self.stopped_at = None
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def connected(self):
+        return self.stopped_at is None
+
+    def idle_since(self):
+        if self._in_flight:
+            return None
+        return self._last_active
+
+    def unregister(self):
+        self.unregistered = True
+        if self._requests:
+            threading.Thread(target=self._process, daemon=True).start()
+
+    def stop(self):
+        self.stopped_at = time.monotonic()
+
+    def _process(self):
+        for _ in range(self._requests):
+            self._in_flight = 1
+            time.sleep(self._seconds)
+            self._last_active = time.monotonic()
+            self._in_flight = 0
+            # The next request arrives before the connection goes idle
+            time.sleep(self._seconds)
+
+
+class _CountedEvent(threading.Event):
+    """Records the waits of a reconnecting connection, and is set after
+    the given number of them.
+    """
+
+    def __init__(self, waits):
+        super().__init__()
+        self._waits = waits
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        if len(self.delays) >= self._waits:
+            self.set()
+        return self.is_set()
+
+
+class TestProcessorSupervisor(unittest.TestCase):
+    def setUp(self):
+        self._processor_class = lifecycle._SupervisedProcessor
+        self._drain_idle = lifecycle.DRAIN_IDLE_SECONDS
+        lifecycle._SupervisedProcessor = _ScriptedProcessor
+        lifecycle.DRAIN_IDLE_SECONDS = 0.2
+        _ScriptedProcessor.registrations = []
+        _ScriptedProcessor.started = []
+
+    def tearDown(self):
+        lifecycle._SupervisedProcessor = self._processor_class
+        lifecycle.DRAIN_IDLE_SECONDS = self._drain_idle
+
+    def run_connection(self, supervisor, waits):
+        supervisor._stopping = _CountedEvent(waits)
+        supervisor._run_connection(0)
+        return supervisor._stopping.delays
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        supervisor = ProcessorSupervisor(
+            'tcp://validator:4004', handler=None, backoff=0.5,
+            max_backoff=3.0)
+        restarts = supervisor._restarts.value
+
+        delays = self.run_connection(supervisor, waits=6)
+
+        self.assertEqual(6, len(_ScriptedProcessor.started))
+        for delay, longest in zip(delays, (0.5, 1.0, 2.0, 3.0, 3.0, 3.0)):
+            self.assertGreaterEqual(delay, longest / 2)
+            self.assertLessEqual(delay, longest)
+        self.assertEqual(
+            [1] * 6, [p.stopped for p in _ScriptedProcessor.started])
+        self.assertEqual(6, supervisor._restarts.value - restarts)
+
+    def test_registering_resets_the_backoff(self):
+        supervisor = ProcessorSupervisor(
+            'tcp://validator:4004', handler=None, backoff=1.0,
+            max_backoff=30.0)
+        _ScriptedProcessor.registrations = [False, False, True, False]
+
+        delays = self.run_connection(supervisor, waits=4)
+
+        for delay, longest in zip(delays, (1.0, 2.0, 1.0, 2.0)):
+            self.assertGreaterEqual(delay, longest / 2)
+            self.assertLessEqual(delay, longest)
+
+    def test_drain_waits_until_connections_are_idle(self):
+        supervisor = ProcessorSupervisor(
+            'tcp://validator:4004', handler=None, workers=2,
+            drain_timeout=5.0)
+        quiet = _DrainingProcessor()
+        busy = _DrainingProcessor(requests=3, seconds=0.1)
+        supervisor._processors = [quiet, busy]
+
+        start = time.monotonic()
+        supervisor._drain()
+
+        self.assertTrue(quiet.unregistered and busy.unregistered)
+        # The quiet connection is closed once idle, the busy one only
+        # after its last request
+        self.assertLess(quiet.stopped_at - start, 0.5)
+        self.assertGreaterEqual(busy.stopped_at - start, 0.6)
+        self.assertLess(busy.stopped_at - start, 2.0)
+        self.assertEqual(0, busy.in_flight)
+
+    def test_drain_timeout(self):
+        supervisor = ProcessorSupervisor(
+            'tcp://validator:4004', handler=None, drain_timeout=0.3)
+        busy = _DrainingProcessor(requests=1, seconds=2.0)
+        supervisor._processors = [busy]
+
+        start = time.monotonic()
+        supervisor._drain()
+
+        self.assertLess(busy.stopped_at - start, 1.0)
+        self.assertEqual(1, busy.in_flight)
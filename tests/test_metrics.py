@@ -0,0 +1,75 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from sawtooth_identity.processor.metrics import MetricsRegistry
+from sawtooth_identity.processor.metrics import MetricsServer
+
+
+class _StartedProfiles(object):
+    def __init__(self):
+        self.durations = []
+
+    def start_cpu_profile(self, duration=None):
+        self.durations.append(duration)
+        return True
+
+    start_memory_profile = start_cpu_profile
+
+
+class TestMetricsServer(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.profiles = _StartedProfiles()
+        self.server = MetricsServer(
+            0, registry=self.registry, profiling=self.profiles)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def request(self, path, method='GET'):
+        request = urllib.request.Request(
+            'http://127.0.0.1:{}{}'.format(self.server.port, path),
+            method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as err:
+            return err.code, json.loads(err.read())
+
+    def test_metrics(self):
+        self.registry.counter('applied').inc(3)
+        status, body = self.request('/metrics')
+        self.assertEqual(200, status)
+        self.assertEqual(3, body['applied'])
+
+    def test_profile_durations(self):
+        for duration in ('2.5', '3600'):
+            self.assertEqual(
+                202,
+                self.request('/profile/cpu?duration=' + duration, 'POST')[0])
+        self.assertEqual(202, self.request('/profile/memory', 'POST')[0])
+
+        for duration in ('abc', 'nan', 'inf', '0', '-1', '3601'):
+            self.assertEqual(
+                400,
+                self.request('/profile/cpu?duration=' + duration, 'POST')[0])
+
+        self.assertEqual([2.5, 3600.0, None], self.profiles.durations)
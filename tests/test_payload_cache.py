@@ -0,0 +1,145 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import logging
+import pickle
+import unittest
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from sawtooth_identity.benchmark.batch_planner import create_client
+from sawtooth_identity.identity_codec import COMPACT_FAMILY_VERSION
+from sawtooth_identity.identity_codec import LEGACY_FAMILY_VERSION
+from sawtooth_identity.identity_codec import encode_payload
+from sawtooth_identity.identity_dry_run import IdentityDryRun
+from sawtooth_identity.processor.audit import AuditLog
+from sawtooth_identity.processor.handler import IdentityTransactionHandler
+from sawtooth_identity.processor.payload_cache import PayloadCache
+
+
+def _pickled(name):
+    return pickle.dumps({
+        'Action': 'create',
+        'Name': name,
+        'Date_of_birth': '1990',
+        'Gender': 'f',
+    })
+
+
+def _sha512(payload):
+    return hashlib.sha512(payload).hexdigest()
+
+
+class _RecordedAuditLog(AuditLog):
+    def __init__(self):
+        super().__init__(logger=logging.getLogger('test.audit'))
+        self.events = []
+
+    def sampled(self):
+        return True
+
+    def record(self, *event):
+        self.events.append(event)
+
+
+class TestPayloadCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = PayloadCache()
+        payload = _pickled('alice')
+
+        first = cache.get_payload(_sha512(payload), payload)
+        second = cache.get_payload(_sha512(payload), payload)
+
+        self.assertIs(first, second)
+        self.assertEqual('alice', first.name)
+        self.assertEqual(
+            [('size', 1), ('max_size', 1024), ('hits', 1), ('misses', 1)],
+            list(cache.stats().items()))
+
+    def test_keyed_by_digest_and_family_version(self):
+        cache = PayloadCache()
+        payload = _pickled('alice')
+        digest = _sha512(payload)
+        cache.get_payload(digest, payload, LEGACY_FAMILY_VERSION)
+
+        # The validator checks payload_sha512, so the digest stands for
+        # the bytes: a hit does not look at them again
+        self.assertEqual(
+            'alice',
+            cache.get_payload(digest, _pickled('bob'),
+                              LEGACY_FAMILY_VERSION).name)
+
+        # The same bytes are a 0.2 payload of another encoding
+        with self.assertRaises(InvalidTransaction):
+            cache.get_payload(digest, payload, COMPACT_FAMILY_VERSION)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+        compact = encode_payload('create', 'carol', '1990', 'f')
+        self.assertEqual(
+            'carol',
+            cache.get_payload(
+                _sha512(compact), compact, COMPACT_FAMILY_VERSION).name)
+
+    def test_rejections_are_cached(self):
+        cache = PayloadCache()
+        payload = b'not a payload'
+
+        reasons = []
+        for _ in range(2):
+            with self.assertRaises(InvalidTransaction) as context:
+                cache.get_payload(_sha512(payload), payload)
+            reasons.append(str(context.exception))
+
+        self.assertEqual(reasons[0], reasons[1])
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_least_recently_used_are_evicted(self):
+        cache = PayloadCache(size=2)
+        payloads = [_pickled(name) for name in ('alice', 'bob', 'carol')]
+        cache.get_payload(_sha512(payloads[0]), payloads[0])
+        cache.get_payload(_sha512(payloads[1]), payloads[1])
+        cache.get_payload(_sha512(payloads[0]), payloads[0])
+        cache.get_payload(_sha512(payloads[2]), payloads[2])
+
+        self.assertEqual(2, len(cache))
+        cache.get_payload(_sha512(payloads[0]), payloads[0])
+        cache.get_payload(_sha512(payloads[1]), payloads[1])
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+    def test_disabled(self):
+        cache = PayloadCache(size=0)
+        payload = _pickled('alice')
+        for _ in range(2):
+            self.assertEqual(
+                'alice', cache.get_payload(_sha512(payload), payload).name)
+        self.assertEqual((0, 0, 0), (len(cache), cache.hits, cache.misses))
+
+    def test_transactions_sent_again_are_hits(self):
+        # Audited transactions must not count as extra hits
+        audit_log = _RecordedAuditLog()
+        handler = IdentityTransactionHandler(audit_log=audit_log)
+        dry_run = IdentityDryRun(handler=handler)
+        transaction = create_client()._create_identity_txn(
+            'create', 'alice', '1990', 'f')
+
+        self.assertIsNone(dry_run.check(transaction))
+        self.assertIsNotNone(dry_run.check(transaction))
+
+        cache = handler.payload_cache
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        self.assertEqual(
+            [('create', 'alice', 'applied'), ('create', 'alice', 'invalid')],
+            [(event[2], event[3], event[5]) for event in audit_log.events])
@@ -0,0 +1,131 @@
+# Copyright 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from sawtooth_sdk.messaging.future import FutureTimeoutError
+from sawtooth_sdk.processor.exceptions import InternalError
+
+from sawtooth_identity.identity_dry_run import LocalStateContext
+from sawtooth_identity.processor.state_deadline import AdaptiveDeadline
+from sawtooth_identity.processor.state_deadline import StateCallPolicy
+
+
+class _SlowContext(LocalStateContext):
+    """Times out the first calls of each kind, and records the timeout
+    every call was given.
+    """
+
+    def __init__(self, timeouts=0):
+        super().__init__({'ab': b'value'})
+        self.remaining = {'get': timeouts, 'set': timeouts,
+                          'delete': timeouts}
+        self.calls = []
+
+    def _maybe_time_out(self, kind, timeout):
+        self.calls.append((kind, timeout))
+        if self.remaining[kind]:
+            self.remaining[kind] -= 1
+            raise FutureTimeoutError('timed out')
+
+    def get_state(self, addresses, timeout=None):
+        self._maybe_time_out('get', timeout)
+        return super().get_state(addresses, timeout)
+
+    def set_state(self, entries, timeout=None):
+        self._maybe_time_out('set', timeout)
+        return super().set_state(entries, timeout)
+
+    def delete_state(self, addresses, timeout=None):
+        self._maybe_time_out('delete', timeout)
+        return super().delete_state(addresses, timeout)
+
+
+class TestAdaptiveDeadline(unittest.TestCase):
+    def test_max_timeout_until_enough_samples(self):
+        deadline = AdaptiveDeadline(2.0, min_samples=32)
+        for _ in range(31):
+            deadline.observe(0.01)
+        self.assertEqual(2.0, deadline.timeout)
+
+        deadline.observe(0.01)
+        self.assertAlmostEqual(0.05, deadline.timeout)
+
+    def test_follows_the_observed_latency(self):
+        deadline = AdaptiveDeadline(
+            2.0, min_timeout=0.01, min_samples=16, window=32)
+        for _ in range(32):
+            deadline.observe(0.1)
+        self.assertAlmostEqual(0.3, deadline.timeout)
+
+        # A slower validator pushes the deadline up to max_timeout
+        for _ in range(32):
+            deadline.observe(1.0)
+        self.assertEqual(2.0, deadline.timeout)
+        self.assertEqual(32, deadline.stats()['samples'])
+
+    def test_fixed_deadline(self):
+        deadline = AdaptiveDeadline(2.0, min_timeout=2.0)
+        for _ in range(64):
+            deadline.observe(0.001)
+        self.assertEqual(2.0, deadline.timeout)
+
+
+class TestStateCallPolicy(unittest.TestCase):
+    def adapted_policy(self, read_retries=2):
+        policy = StateCallPolicy(
+            max_timeout=1.0, read_retries=read_retries, backoff=0)
+        context = LocalStateContext()
+        # Fast reads and writes bring the adaptive deadlines down
+        for _ in range(64):
+            policy.get_state(context, ['ab'])
+            policy.set_state(context, {'ab': b'value'})
+        return policy
+
+    def test_reads_are_retried_with_growing_timeouts(self):
+        policy = self.adapted_policy()
+        context = _SlowContext(timeouts=2)
+
+        entries = policy.get_state(context, ['ab'])
+
+        self.assertEqual([b'value'], [entry.data for entry in entries])
+        timeouts = [timeout for _, timeout in context.calls]
+        self.assertEqual(3, len(timeouts))
+        self.assertLess(timeouts[0], 1.0)
+        self.assertLessEqual(timeouts[0] * 2, timeouts[1])
+        self.assertLessEqual(timeouts[1], timeouts[2])
+        self.assertLessEqual(timeouts[2], 1.0)
+
+    def test_reads_give_up_after_the_retries(self):
+        policy = self.adapted_policy(read_retries=1)
+        context = _SlowContext(timeouts=2)
+
+        with self.assertRaises(InternalError):
+            policy.get_state(context, ['ab'])
+        self.assertEqual(2, len(context.calls))
+
+    def test_writes_wait_the_full_timeout_once(self):
+        policy = self.adapted_policy()
+        context = _SlowContext(timeouts=1)
+
+        with self.assertRaises(InternalError):
+            policy.set_state(context, {'ab': b'other'})
+        with self.assertRaises(InternalError):
+            policy.delete_state(context, ['ab'])
+        self.assertEqual(
+            [('set', 1.0), ('delete', 1.0)], context.calls)
+
+        self.assertEqual(['ab'], policy.delete_state(context, ['ab']))
+        self.assertEqual(1.0, policy.stats()['set']['timeout'])